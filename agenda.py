@@ -0,0 +1,317 @@
+# agenda.py
+import datetime
+import hmac
+import os
+import secrets
+import threading
+import time
+import uuid
+
+from api_executor import execute
+from calendar_utils import get_calendar_service, refresh_event_mirror
+from datetime_utils import get_user_timezone
+from metrics import incr, span
+from mirror import get_mirror, to_utc_string
+from task_utils import refresh_task_mirror
+from user_context import get_user_context
+
+# Public HTTPS address Google posts Calendar change notifications to; server.py
+# serves it at /notifications/calendar. Without it, event views are refreshed
+# in the background once they are AGENDA_REFRESH_SECONDS old.
+CALENDAR_WEBHOOK_URL = os.getenv("CALENDAR_WEBHOOK_URL")
+AGENDA_REFRESH_SECONDS = float(os.getenv("AGENDA_REFRESH_SECONDS", "60"))
+# Tasks have no push API, so they are always refreshed on an interval.
+TASKS_REFRESH_SECONDS = float(os.getenv("TASKS_REFRESH_SECONDS", "60"))
+# Even with a live channel, resync now and then in case a notification was lost.
+PUSH_SAFETY_SECONDS = 60 * 60
+CHANNEL_TTL_SECONDS = 7 * 24 * 60 * 60
+CHANNEL_RENEW_SECONDS = 24 * 60 * 60
+# A failed renewal is tried again this much later.
+CHANNEL_RETRY_SECONDS = 15 * 60
+MAX_CACHED_DAYS = 62
+WEEK_DAYS = 7
+
+_agendas = {}
+_agendas_lock = threading.Lock()
+# channel id -> AgendaStore, for routing webhook calls
+_channels = {}
+
+
+class AgendaStore:
+    # Materialized day views for one user, in their timezone. Reads are a dict
+    # lookup; mirror writes (sync deltas, local creates/patches/deletes) drop
+    # only the days they touch, and refreshes run in the background.
+    def __init__(self, context):
+        self.context = context
+        self.tz = get_user_timezone(context.user_id)
+        self.mirror = get_mirror(context.user_id)
+        self.channel = None
+        self._renewal = None
+        self._events = {}
+        self._event_days = {}
+        self._tasks = {}
+        self._synced_at = {'events': None, 'tasks': None}
+        self._events_changed = False
+        self._refreshing = set()
+        self._lock = threading.RLock()
+        self.mirror.add_listener(self._on_mirror_change)
+
+    # Reads
+
+    def today(self):
+        return datetime.datetime.now(self.tz).date()
+
+    def day(self, date=None):
+        self._ensure_fresh()
+        date = date or self.today()
+        with self._lock:
+            events = self._events.get(date)
+            tasks = self._tasks.get(date)
+            incr('agenda.reads', result='hit' if events is not None and tasks is not None else 'miss')
+            if events is None:
+                events = self._build_events(date)
+            if tasks is None:
+                tasks = self._build_tasks(date)
+        return {'date': date.isoformat(), 'timezone': self.tz.zone, 'events': events, 'tasks': tasks}
+
+    def week(self, start=None):
+        # Seven day views; the days from today on are the ones _prebuild keeps warm.
+        start = start or self.today()
+        return [self.day(start + datetime.timedelta(days=i)) for i in range(WEEK_DAYS)]
+
+    # Materialization
+
+    def bounds(self, date):
+        start = self.tz.localize(datetime.datetime.combine(date, datetime.time.min))
+        end = self.tz.localize(datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time.min))
+        return to_utc_string(start.isoformat()), to_utc_string(end.isoformat())
+
+    def _build_events(self, date):
+        start, end = self.bounds(date)
+        events = self.mirror.events_between(start, end, self.context.calendar_id)
+        self._events[date] = events
+        for event in events:
+            self._event_days.setdefault(event['id'], set()).add(date)
+        self._prune()
+        return events
+
+    def _build_tasks(self, date):
+        # Open tasks due by the end of that day, overdue ones included.
+        tasks = self.mirror.tasks(due_max=f"{date.isoformat()}T23:59:59Z")
+        self._tasks[date] = tasks
+        return tasks
+
+    def _prune(self):
+        today = self.today()
+        for date in [d for d in self._events if d < today - datetime.timedelta(days=1)]:
+            self._drop_day(date)
+        while len(self._events) > MAX_CACHED_DAYS:
+            self._drop_day(max(self._events))
+
+    def _drop_day(self, date):
+        for event in self._events.pop(date, []):
+            days = self._event_days.get(event['id'])
+            if days is not None:
+                days.discard(date)
+                if not days:
+                    del self._event_days[event['id']]
+        self._tasks.pop(date, None)
+
+    def _prebuild(self):
+        today = self.today()
+        with self._lock:
+            for i in range(WEEK_DAYS):
+                date = today + datetime.timedelta(days=i)
+                if date not in self._events:
+                    self._build_events(date)
+                if date not in self._tasks:
+                    self._build_tasks(date)
+
+    # Invalidation
+
+    def _days_overlapping(self, event):
+        start = to_utc_string(event.get('start', {}).get('dateTime', event.get('start', {}).get('date')), self.tz)
+        end = to_utc_string(event.get('end', {}).get('dateTime', event.get('end', {}).get('date')), self.tz)
+        if not start or not end:
+            return set()
+        days = set()
+        for date in self._events:
+            day_start, day_end = self.bounds(date)
+            if start < day_end and end > day_start:
+                days.add(date)
+        return days
+
+    def _on_mirror_change(self, kind, container_id, changed, removed):
+        with self._lock:
+            if kind.startswith('tasks'):
+                self._tasks.clear()
+                return
+            if container_id != self.context.calendar_id:
+                return
+            if kind == 'events_reset':
+                self._events.clear()
+                self._event_days.clear()
+                return
+            stale = set()
+            for event in changed:
+                stale |= self._event_days.get(event['id'], set())
+                stale |= self._days_overlapping(event)
+            for event_id in removed:
+                stale |= self._event_days.get(event_id, set())
+            for date in stale:
+                events = self._events.pop(date, [])
+                for event in events:
+                    days = self._event_days.get(event['id'])
+                    if days is not None:
+                        days.discard(date)
+                        if not days:
+                            del self._event_days[event['id']]
+            if stale:
+                incr('agenda.invalidated_days', len(stale))
+
+    # Freshness
+
+    def refresh(self, kinds=('events', 'tasks')):
+        with span('agenda.refresh', kinds=','.join(kinds)):
+            if 'events' in kinds:
+                self._events_changed = False
+                refresh_event_mirror(self.context)
+                self._synced_at['events'] = time.monotonic()
+            if 'tasks' in kinds:
+                refresh_task_mirror(self.context)
+                self._synced_at['tasks'] = time.monotonic()
+            self._prebuild()
+
+    def _refresh_in_background(self, kinds):
+        key = ','.join(kinds)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.refresh(kinds)
+            except Exception as e:
+                incr('agenda.refresh_errors')
+                print(f"⚠️ Agenda refresh failed for {self.context.user_id}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f"agenda-refresh-{self.context.user_id}", daemon=True).start()
+
+    def _ensure_fresh(self):
+        if self._synced_at['events'] is None or self._synced_at['tasks'] is None:
+            # First read for this user: sync inline so the first answer is complete.
+            self.refresh()
+            return
+        now = time.monotonic()
+        push_live = self.channel is not None and self.channel['expires_at'] > time.time()
+        events_max_age = PUSH_SAFETY_SECONDS if push_live else AGENDA_REFRESH_SECONDS
+        stale = []
+        if self._events_changed or now - self._synced_at['events'] > events_max_age:
+            stale.append('events')
+        if now - self._synced_at['tasks'] > TASKS_REFRESH_SECONDS:
+            stale.append('tasks')
+        if stale:
+            # Serve the current view; the next read sees the refreshed one.
+            self._refresh_in_background(tuple(stale))
+
+    # Push notifications
+
+    def watch(self, address=CALENDAR_WEBHOOK_URL):
+        if not address:
+            raise ValueError("CALENDAR_WEBHOOK_URL is not set; cannot register for push notifications.")
+        channel_id = uuid.uuid4().hex
+        token = secrets.token_urlsafe(24)
+        service = get_calendar_service(self.context)
+        response = execute(service.events().watch(
+            calendarId=self.context.calendar_id,
+            body={
+                'id': channel_id,
+                'type': 'web_hook',
+                'address': address,
+                'token': token,
+                'params': {'ttl': str(CHANNEL_TTL_SECONDS)}
+            }
+        ))
+        expiration = int(response.get('expiration') or 0) / 1000 or time.time() + CHANNEL_TTL_SECONDS
+        channel = {
+            'id': channel_id,
+            'token': token,
+            'resource_id': response.get('resourceId'),
+            'address': address,
+            'expires_at': expiration
+        }
+        with _agendas_lock:
+            previous, self.channel = self.channel, channel
+            _channels[channel_id] = self
+            if previous:
+                _channels.pop(previous['id'], None)
+        if previous:
+            self._stop_channel(previous)
+        self._schedule_renewal(channel, expiration - time.time() - CHANNEL_RENEW_SECONDS)
+        return channel
+
+    def _schedule_renewal(self, channel, delay):
+        # Renewed on a timer rather than on reads, so a quiet user's channel
+        # does not lapse.
+        timer = threading.Timer(max(0.0, delay), self._renew_channel, args=(channel['id'],))
+        timer.daemon = True
+        with self._lock:
+            previous, self._renewal = self._renewal, timer
+        if previous:
+            previous.cancel()
+        timer.start()
+
+    def _renew_channel(self, channel_id):
+        channel = self.channel
+        if channel is None or channel['id'] != channel_id:
+            # Replaced since this renewal was scheduled.
+            return
+        try:
+            self.watch(channel['address'])
+        except Exception as e:
+            incr('agenda.channel_renew_errors')
+            print(f"⚠️ Could not renew push channel for {self.context.user_id}: {e}")
+            self._schedule_renewal(channel, CHANNEL_RETRY_SECONDS)
+
+    def _stop_channel(self, channel):
+        try:
+            service = get_calendar_service(self.context)
+            execute(service.channels().stop(body={'id': channel['id'], 'resourceId': channel['resource_id']}))
+        except Exception as e:
+            # It expires on its own; notifications for it are ignored meanwhile.
+            print(f"⚠️ Could not stop push channel {channel['id']}: {e}")
+
+    def notify_changed(self):
+        self._events_changed = True
+        self._refresh_in_background(('events',))
+
+
+def get_agenda(user=None):
+    context = get_user_context(user)
+    agenda = _agendas.get(context.user_id)
+    if agenda is None:
+        with _agendas_lock:
+            agenda = _agendas.get(context.user_id)
+            if agenda is None:
+                agenda = _agendas[context.user_id] = AgendaStore(context)
+    return agenda
+
+
+def handle_calendar_notification(headers):
+    # headers: anything with .get() for X-Goog-* names, e.g. the request's headers.
+    # Returns False for channels we do not know or tokens that do not match.
+    channel_id = headers.get('X-Goog-Channel-ID') or ''
+    agenda = _channels.get(channel_id)
+    if agenda is None or not hmac.compare_digest(headers.get('X-Goog-Channel-Token') or '', agenda.channel['token']):
+        incr('agenda.notifications', result='rejected')
+        return False
+    state = headers.get('X-Goog-Resource-State')
+    incr('agenda.notifications', result=state or 'unknown')
+    # 'sync' only confirms a new channel; anything else means the calendar changed.
+    if state != 'sync':
+        agenda.notify_changed()
+    return True
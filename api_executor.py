@@ -0,0 +1,231 @@
+# api_executor.py
+import datetime
+import os
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from metrics import incr, register_gauge, span
+from user_context import DEFAULT_USER_ID, is_registered
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Statuses that guarantee the request was rejected before it was applied, so
+# even non-idempotent calls (task inserts) may safely be sent again.
+REJECTED_STATUSES = {429}
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 32.0
+
+API_LIMITS = {
+    # api: (requests per second, burst, concurrent requests, daily quota or 0 for unlimited)
+    # Defaults follow Google's per-user quota of 600 queries per minute per
+    # API: a batch is charged per sub-request, so a full minute's allowance
+    # may go out at once and then refills at 10 per second.
+    'calendar': (
+        float(os.getenv("CALENDAR_QPS", "10")),
+        int(os.getenv("CALENDAR_BURST", "600")),
+        int(os.getenv("CALENDAR_CONCURRENCY", "8")),
+        int(os.getenv("CALENDAR_DAILY_QUOTA", "0"))
+    ),
+    'tasks': (
+        float(os.getenv("TASKS_QPS", "10")),
+        int(os.getenv("TASKS_BURST", "600")),
+        int(os.getenv("TASKS_CONCURRENCY", "8")),
+        int(os.getenv("TASKS_DAILY_QUOTA", "0"))
+    ),
+}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        # Requests larger than the bucket (big batches) wait for a full bucket
+        # and then drive the balance negative, which throttles what follows.
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        # The server told us to slow down: drain the bucket for that long.
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return max(0.0, self._tokens)
+
+
+class QuotaBudget:
+    def __init__(self, daily_limit):
+        self.daily_limit = daily_limit
+        self._day = None
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def spend(self, units):
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        with self._lock:
+            if today != self._day:
+                self._day, self._used = today, 0
+            if self.daily_limit and self._used + units > self.daily_limit:
+                raise QuotaExceededError(f"Daily API budget of {self.daily_limit} requests exhausted.")
+            self._used += units
+
+    def status(self):
+        with self._lock:
+            used = self._used if self._day == datetime.datetime.now(datetime.timezone.utc).date() else 0
+        return {
+            'used_today': used,
+            'daily_limit': self.daily_limit or None,
+            'remaining_today': (self.daily_limit - used) if self.daily_limit else None
+        }
+
+
+class QuotaExceededError(Exception):
+    pass
+
+
+_buckets = {}
+_budgets = {}
+_semaphores = {}
+_stats = {}
+_registry_lock = threading.Lock()
+
+
+def _limits(api, user):
+    key = (api, user)
+    with _registry_lock:
+        if key not in _buckets:
+            # Buckets live for the whole process, so only known users get one.
+            if not is_registered(user):
+                raise ValueError(f"Unknown user '{user}'; run `python app.py --login {user}`.")
+            rate, burst, concurrency, daily = API_LIMITS.get(api, API_LIMITS['calendar'])
+            _buckets[key] = TokenBucket(rate, burst)
+            _budgets[key] = QuotaBudget(daily)
+            _stats[key] = {'calls': 0, 'retries': 0, 'failures': 0}
+        if api not in _semaphores:
+            _semaphores[api] = threading.BoundedSemaphore(API_LIMITS.get(api, API_LIMITS['calendar'])[2])
+        return _buckets[key], _budgets[key], _semaphores[api], _stats[key]
+
+
+def api_of(request):
+    uri = getattr(request, 'uri', '') or ''
+    return 'tasks' if '/tasks/' in uri or 'tasks.googleapis.com' in uri else 'calendar'
+
+
+def _error_content(error):
+    return error.content.decode('utf-8', 'ignore') if error.content else ''
+
+
+def is_retryable(error, idempotent=True):
+    if not isinstance(error, HttpError):
+        # Transport failures may or may not have reached the API.
+        return idempotent and isinstance(error, (OSError, TimeoutError))
+    status = error.resp.status
+    rate_limited = status in REJECTED_STATUSES or (
+        status == 403 and 'ateLimitExceeded' in _error_content(error)
+    )
+    if rate_limited:
+        return True
+    return idempotent and status in RETRYABLE_STATUSES
+
+
+def _retry_after(error):
+    if isinstance(error, HttpError):
+        value = error.resp.get('retry-after')
+        if value and value.isdigit():
+            return float(value)
+    return None
+
+
+def _meter_response(request, api):
+    # postproc sees the raw body before it is parsed, so sizes cost nothing extra.
+    postproc = getattr(request, 'postproc', None)
+    if postproc is None or getattr(postproc, 'metered', False):
+        return
+
+    def metered(resp, content):
+        incr('api.bytes_in', len(content or b''), api=api)
+        return postproc(resp, content)
+
+    metered.metered = True
+    request.postproc = metered
+
+
+def execute(request, api=None, user=None, idempotent=True, cost=1, max_attempts=MAX_ATTEMPTS):
+    api = api or api_of(request)
+    user = user or getattr(request, 'user_id', None)
+    bucket, budget, semaphore, stats = _limits(api, user)
+    _meter_response(request, api)
+    method = getattr(request, 'methodId', None) or 'batch'
+    attempt = 0
+    with span('api.execute', api=api, method=method, cost=cost) as s:
+        while True:
+            attempt += 1
+            s.set(attempts=attempt)
+            budget.spend(cost)
+            with span('api.throttle', api=api):
+                bucket.acquire(cost)
+            stats['calls'] += 1
+            incr('api.calls', api=api)
+            incr('api.bytes_out', len(getattr(request, 'body', None) or ''), api=api)
+            try:
+                with semaphore:
+                    return request.execute()
+            except Exception as e:
+                status = e.resp.status if isinstance(e, HttpError) else type(e).__name__
+                incr('api.errors', api=api, status=status)
+                if attempt >= max_attempts or not is_retryable(e, idempotent):
+                    stats['failures'] += 1
+                    raise
+                stats['retries'] += 1
+                incr('api.retries', api=api)
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(MAX_BACKOFF, BASE_BACKOFF * (2 ** (attempt - 1)))
+                    delay = random.uniform(delay / 2, delay)
+                if isinstance(e, HttpError) and e.resp.status in (403, 429):
+                    bucket.penalize(delay)
+                time.sleep(delay)
+
+
+def quota_status(user_id=None):
+    # Every user's buckets, or only user_id's; calls made without a user
+    # count as DEFAULT_USER_ID.
+    with _registry_lock:
+        keys = [key for key in _buckets if user_id is None or (key[1] or DEFAULT_USER_ID) == user_id]
+    status = {}
+    for api, user in keys:
+        bucket, budget, _, stats = _limits(api, user)
+        status[f"{api}:{user or 'default'}"] = {
+            'tokens_available': round(bucket.available(), 2),
+            'rate_per_second': bucket.rate,
+            'burst': bucket.capacity,
+            **budget.status(),
+            **stats
+        }
+    return status
+
+
+register_gauge('api_quota', quota_status)
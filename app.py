@@ -1,194 +1,221 @@
+import argparse
 import datetime
 
-from prompt_parser import extract_meeting_details
-from calendar_utils import (
-    create_event,
-    force_reschedule_by_email_and_purpose,
-    get_calendar_service,
-    get_task_reminder_events
-)
-from task_utils import (
-    create_google_task,
-    add_task_reminder,
-    delete_task,
-    update_task,
-    find_task_id_by_title,
-    mark_task_complete_by_title,
-    get_tasks_service
-)
-
-def main():
+from async_engine import execute_command, parse_command
+
+def format_datetime(value, fallback=None):
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return parsed.strftime("%A, %d %b %Y at %I:%M %p")
+    except Exception:
+        return fallback if fallback is not None else value
+
+def print_daily_summary(result):
+    print("\n🗓️ Here's your schedule for today:\n")
+    events = result['events']
+    tasks = result['tasks']
+
+    if not events and not tasks:
+        print("📭 You have no events or tasks scheduled for today.")
+        return
+
+    if events:
+        print(f"📅 You have {len(events)} meeting(s):")
+        for event in events:
+            summary = event.get('summary', 'No Title')
+            time = event['start'].get('dateTime', event['start'].get('date'))
+            print(f"- {summary} at {format_datetime(time)}")
+
+    if tasks:
+        print(f"\n📝 You have {len(tasks)} task(s):")
+        for task in tasks:
+            title = task.get('title', 'Untitled')
+            due = task.get('due', 'Today')
+            print(f"- {title} (Due: {format_datetime(due)})")
+
+def print_bulk_update(result):
+    items = result.get('events') if result['target'] == 'events' else result.get('tasks')
+    if not result['matched']:
+        print(f"\n📭 No {result['target']} matched.")
+        return
+    print(f"\n🔁 {result['operation'].capitalize()}: {result['applied']} of {result['matched']} {result['target']} updated.")
+    for item in items:
+        name = item.get('summary') or item.get('title') or 'Untitled'
+        old = item.get('start') or item.get('due')
+        new = item.get('new_start') or item.get('new_due')
+        print(f"- {name}: {format_datetime(old)}" + (f" → {format_datetime(new)}" if new else ""))
+    for key, error in result['failed'].items():
+        print(f"❌ {key}: {error}")
+
+def print_plan(result):
+    print(f"\n🧩 {result['confirmation_message']}")
+    for number, step in enumerate(result['steps'], 1):
+        if step.get('text'):
+            print(f"\n{number}. {step['text']}")
+        print_result(step)
+    if result.get('error'):
+        print(f"\n⚠️ {result['error']}")
+
+
+def print_result(result):
+    intent = result.get('intent')
+    status = result.get('status')
+    confirmation_message = result.get('confirmation_message')
+
+    if intent == 'plan':
+        print_plan(result)
+        return
+    if status == 'invalid':
+        print(f"❌ {result['error']}")
+        return
+    if status == 'error':
+        print("\n❌ Failed to process your request:")
+        print(result['error'])
+        return
+    if status == 'ambiguous':
+        if intent == 'reschedule_meeting':
+            print(f"⚠️ Several meetings match '{result['query']}'. Please be more specific:")
+            for event in result['candidates']:
+                start = event.get('start', {})
+                print(f"- {event.get('summary', 'Untitled')} ({start.get('dateTime', start.get('date', ''))})")
+            return
+        print(f"⚠️ Several tasks match '{result['query']}'. Please be more specific:")
+        for task in result['candidates']:
+            print(f"- {task.get('title', 'Untitled')}")
+        return
+    if status == 'not_found':
+        if intent == 'complete_task':
+            print("❌ Task not found to mark as complete.")
+        else:
+            print("❌ Task ID not found or unable to match task title.")
+        return
+
+    if intent == 'daily_summary':
+        print_daily_summary(result)
+    elif intent == 'reschedule_meeting':
+        print("\n🔁 Meeting rescheduled successfully!")
+    elif intent == 'create_meeting':
+        print("\n✅", confirmation_message)
+        if result.get('recurrence'):
+            print(f"🔁 Repeats: {'; '.join(result['recurrence'])}")
+            print("📆 Next: " + ", ".join(format_datetime(start) for start in result['occurrences'][:5]))
+            for conflict in result['conflicts'][:5]:
+                print(f"⚠️ Clashes with '{conflict['summary']}' on {format_datetime(conflict['start'])}")
+    elif intent == 'bulk_update':
+        print_bulk_update(result)
+    elif intent == 'add_task' and result.get('recurrence'):
+        print(f"\n✅ Added {len(result['task_ids'])} recurring task(s).")
+        if result['failed']:
+            print(f"❌ {result['failed']} task(s) could not be created.")
+        if result.get('reminder_link'):
+            print(f"🔔 Recurring reminder scheduled on calendar: {result['reminder_link']}")
+        print("📝", confirmation_message)
+    elif intent == 'add_task' and status == 'queued':
+        print("\n✅ Task queued; it and its calendar reminder are being created in the background.")
+        print("🧾 Job:", result['job'])
+        print("📝", confirmation_message)
+    elif intent == 'add_task':
+        print("\n✅ Task added. ID:", result['task_id'])
+        if result.get('reminder_error'):
+            print(f"❌ Failed to add reminder to calendar: {result['reminder_error']}")
+        elif result.get('reminder_link'):
+            print(f"🔔 Reminder scheduled on calendar: {result['reminder_link']}")
+        else:
+            print("⚠️ Reminder creation failed or returned no link.")
+        print("📝", confirmation_message)
+    elif intent == 'complete_task':
+        print(f"\n✅ Task '{result['task']['title']}' marked as completed.")
+    elif intent == 'update_task':
+        print("\n✏️ Task updated:", result['task']['title'])
+        print("📝", confirmation_message)
+    elif intent == 'delete_task':
+        print("\n🗑️", result['message'])
+        print("📝", confirmation_message)
+    elif intent == 'show':
+        upcoming = result['reminders']
+        if not upcoming:
+            print("\n📭 No upcoming task reminders.")
+        else:
+            print("\n📋 Upcoming Task Reminders from Calendar:")
+            for title, due in upcoming:
+                print(f"- {title} (Reminder: {format_datetime(due)})")
+
+def login(user_id, email=None, timezone=None, calendar_id='primary'):
+    from calendar_utils import SCOPES as CALENDAR_SCOPES
+    from google_clients import authorize_user, evict_user
+    from task_utils import SCOPES as TASKS_SCOPES
+    from user_context import register_user
+
+    register_user(user_id, email=email, calendar_id=calendar_id, timezone=timezone)
+    authorize_user(user_id, 'calendar', CALENDAR_SCOPES)
+    authorize_user(user_id, 'tasks', TASKS_SCOPES)
+    evict_user(user_id)
+    print(f"✅ Stored encrypted credentials for '{user_id}'.")
+
+def main(user=None):
     print("\n📅 Welcome to SmartSchedulerGPT!")
     user_input = input("📝 Describe what you'd like to do (e.g., 'Schedule meeting with John on Friday' or 'Add task to submit report by Monday'): ").strip()
 
-    parsed_response = extract_meeting_details(user_input)
+    parsed_response = parse_command(user_input, user)
 
     if not parsed_response:
         print("❌ Failed to parse input. Please try again.")
         return
 
-    meeting_details = parsed_response.get("meeting_details")
-    print("Parsed meeting details:", meeting_details)
-    task_details = parsed_response.get("task_details")
-    action = parsed_response.get("action")
-    confirmation_message = parsed_response.get("confirmation_message", "Action completed successfully.")
-
-    # ✅ Fallback for "show upcoming tasks" if Gemini missed it
-    if not action and "show" in user_input.lower() and "task" in user_input.lower():
-        action = "show"
-        confirmation_message = "Here are your upcoming tasks!"
-
-    if action == "daily_summary":
-        print("\n🗓️ Here's your schedule for today:\n")
-
-        now = datetime.datetime.utcnow()
-        start = now.replace(hour=0, minute=0, second=0, microsecond=0).isoformat() + 'Z'
-        end = now.replace(hour=23, minute=59, second=59).isoformat() + 'Z'
-
-        calendar_service = get_calendar_service()
-        tasks_service = get_tasks_service()
-
-        events = calendar_service.events().list(
-            calendarId='primary',
-            timeMin=start,
-            timeMax=end,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute().get('items', [])
-
-        tasks = tasks_service.tasks().list(
-            tasklist='@default',
-            showCompleted=False,
-            dueMax=end
-        ).execute().get('items', [])
-
-        if not events and not tasks:
-            print("📭 You have no events or tasks scheduled for today.")
-            return
+    print("Parsed meeting details:", parsed_response.get("meeting_details"))
+    print_result(execute_command(parsed_response, user_input, user))
 
-        if events:
-            print(f"📅 You have {len(events)} meeting(s):")
-            for event in events:
-                summary = event.get('summary', 'No Title')
-                time = event['start'].get('dateTime', event['start'].get('date'))
-                try:
-                    parsed_time = datetime.datetime.fromisoformat(time.replace("Z", "+00:00"))
-                    formatted_time = parsed_time.strftime("%A, %d %b %Y at %I:%M %p")
-                except Exception:
-                    formatted_time = time
-                print(f"- {summary} at {formatted_time}")
-
-        if tasks:
-            print(f"\n📝 You have {len(tasks)} task(s):")
-            for task in tasks:
-                title = task.get('title', 'Untitled')
-                due = task.get('due', 'Today')
-                try:
-                    due_dt = datetime.datetime.fromisoformat(due.replace("Z", "+00:00"))
-                    formatted_due = due_dt.strftime("%A, %d %b %Y at %I:%M %p")
-                except Exception:
-                    formatted_due = due
-                print(f"- {title} (Due: {formatted_due})")
-
-        return
-
-    if not meeting_details and not task_details and not action:
-        print("❌ Could not extract any valid task or meeting information from your input.")
-        return
+def interactive(user=None):
+    from session import Session
 
+    session = Session(user)
+    # Clients, the model and the first reads load while the user types.
+    session.prefetch()
+    print("\n📅 Welcome to SmartSchedulerGPT! Type a command, or 'exit' to quit.")
     try:
-        if meeting_details:
-            is_reschedule = any(keyword in user_input.lower() for keyword in ["reschedule", "postpone", "change", "move"])
-            if is_reschedule:
-                attendee_email = meeting_details.get("attendees", [None])[0]
-                purpose = meeting_details.get("purpose", "")
-                new_datetime = meeting_details.get("date_time", "")
-
-                if not attendee_email or not purpose or not new_datetime:
-                    print("❌ Missing details: attendee, purpose, or new date/time.")
-                    return
-
-                meeting_link = force_reschedule_by_email_and_purpose(attendee_email, purpose, new_datetime)
-                print("\n🔁 Meeting rescheduled successfully!")
-            else:
-                meeting_link = create_event(meeting_details)
-                print("\n✅", confirmation_message)
-
-        elif task_details:
-            action = task_details.get("action")
-
-            if action == "add":
-                task_id = create_google_task(task_details['title'], task_details['due_date'])
-                print("\n✅ Task added. ID:", task_id)
-
-                # ✅ Explicit calendar reminder
-                try:
-                    reminder_link = add_task_reminder(task_details['title'], task_details['due_date'])
-                    if reminder_link:
-                        print(f"🔔 Reminder scheduled on calendar: {reminder_link}")
-                    else:
-                        print("⚠️ Reminder creation failed or returned no link.")
-                except Exception as e:
-                    print(f"❌ Failed to add reminder to calendar: {e}")
-
-                print("📝", confirmation_message)
-
-            elif action == "update":
-                task_title = (
-                    task_details.get("updated_fields", {}).get("title")
-                    or task_details.get("title")
-                )
-
-                if "done" in user_input.lower() or "complete" in user_input.lower():
-                    updated = mark_task_complete_by_title(task_title)
-                    if updated:
-                        print(f"\n✅ Task '{updated['title']}' marked as completed.")
-                    else:
-                        print("❌ Task not found to mark as complete.")
-                    return
-
-                task_id = task_details.get("task_id") or find_task_id_by_title(task_title)
-                if not task_id:
-                    print("❌ Task ID not found or unable to match task title.")
-                    return
-
-                updated = update_task(
-                    task_id,
-                    new_title=task_details.get('updated_fields', {}).get('title'),
-                    new_due_date=task_details.get('updated_fields', {}).get('due_date')
-                )
-                print("\n✏️ Task updated:", updated['title'])
-                print("📝", confirmation_message)
-
-            elif action == "delete":
-                task_id = task_details.get('task_id')
-                if not task_id:
-                    title = task_details.get('title')
-                    task_id = find_task_id_by_title(title)
-                    if not task_id:
-                        print("❌ Task ID not found or unable to match task title.")
-                        return
-                result = delete_task(task_id)
-                print("\n🗑️", result)
-                print("📝", confirmation_message)
-
-        if action == "show":
-            upcoming = get_task_reminder_events()
-            if not upcoming:
-                print("\n📭 No upcoming task reminders.")
-            else:
-                print("\n📋 Upcoming Task Reminders from Calendar:")
-                for title, due in upcoming:
-                    try:
-                        due_dt = datetime.datetime.fromisoformat(due.replace("Z", "+00:00"))
-                        formatted_due = due_dt.strftime("%A, %d %b %Y at %I:%M %p")
-                    except Exception:
-                        formatted_due = due
-                    print(f"- {title} (Reminder: {formatted_due})")
-
-    except Exception as e:
-        print("\n❌ Failed to process your request:")
-        print(e)
+        while True:
+            try:
+                user_input = input("\n📝 > ").strip()
+            except (EOFError, KeyboardInterrupt):
+                print()
+                break
+            if user_input.lower() in ('exit', 'quit'):
+                break
+            if not user_input:
+                continue
+            parsed_response, result = session.handle(user_input)
+            if not parsed_response:
+                print("❌ Failed to parse input. Please try again.")
+                continue
+            print_result(result)
+    finally:
+        session.close()
+
+def cli():
+    parser = argparse.ArgumentParser(description="SmartSchedulerGPT")
+    parser.add_argument('--serve', action='store_true', help="run the long-lived JSON API server")
+    parser.add_argument('-i', '--interactive', action='store_true', help="keep a session open for several commands")
+    parser.add_argument('--host', help="server bind address")
+    parser.add_argument('--port', type=int, help="server port")
+    parser.add_argument('--bulk', metavar='PATH', help="apply commands from a file (or - for stdin), one per line or JSONL")
+    parser.add_argument('--user', help="act as this user (default: DEFAULT_USER_ID)")
+    parser.add_argument('--login', metavar='USER', help="authorize Google access for USER and store it encrypted")
+    parser.add_argument('--email', help="with --login: the user's email, used as the reminder attendee")
+    parser.add_argument('--timezone', help="with --login: the user's IANA timezone")
+    args = parser.parse_args()
+
+    if args.login:
+        login(args.login, email=args.email, timezone=args.timezone)
+    elif args.bulk:
+        import bulk
+        bulk.main([args.bulk] + (['--user', args.user] if args.user else []))
+    elif args.serve:
+        import server
+        server.serve(host=args.host or server.SERVER_HOST, port=args.port or server.SERVER_PORT)
+    elif args.interactive:
+        interactive(args.user)
+    else:
+        main(args.user)
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,467 @@
+# async_engine.py
+import asyncio
+import uuid
+
+from job_queue import DEFER_WRITES
+from metrics import incr, span
+from prompt_parser import extract_meeting_details, fast_parse
+
+# calendar_utils and task_utils pull in the Google client stack, so each
+# intent imports only what it uses, when it first runs.
+
+RESCHEDULE_KEYWORDS = ["reschedule", "postpone", "change", "move"]
+
+
+def run(coro):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    raise RuntimeError("Sync wrappers cannot be called from a running event loop; await the async API instead.")
+
+
+async def _call(func, *args, **kwargs):
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+def _warm_calendar(user=None):
+    from calendar_utils import get_calendar_service
+    return get_calendar_service(user)
+
+
+def _warm_tasks(user=None):
+    from task_utils import get_tasks_service
+    return get_tasks_service(user)
+
+
+WARMERS = {'calendar': _warm_calendar, 'tasks': _warm_tasks}
+
+
+async def warm_clients_async(user=None, services=('calendar', 'tasks')):
+    await asyncio.gather(*(_call(WARMERS[name], user) for name in services), return_exceptions=True)
+
+
+def services_for(parsed):
+    # The Google clients a parsed command will use; task adds also write a
+    # calendar reminder, and the agenda syncs both.
+    services = set()
+    for step in plan_steps(parsed):
+        task_details = step.get('task_details') or {}
+        action = step.get('action')
+        if step.get('meeting_details') or action == 'show':
+            services.add('calendar')
+        if task_details:
+            services.add('tasks')
+            if task_details.get('action') == 'add':
+                services.add('calendar')
+        if action == 'daily_summary':
+            services.update(('calendar', 'tasks'))
+        elif action == 'bulk_update':
+            target = (step.get('bulk_details') or {}).get('target') or 'events'
+            services.add('tasks' if target == 'tasks' else 'calendar')
+    return sorted(services)
+
+
+async def parse_async(prompt, user=None):
+    parsed = fast_parse(prompt)
+    if parsed:
+        # Local commands skip the model.
+        incr('parse.fast_path')
+    else:
+        parsed = await _call(extract_meeting_details, prompt)
+    if parsed:
+        # Build only the clients this command needs, side by side, before it runs.
+        await warm_clients_async(user, services_for(parsed))
+    return parsed
+
+
+async def daily_summary_async(user=None):
+    from agenda import get_agenda
+
+    # Served from the materialized agenda, with day bounds in the user's timezone.
+    view = await _call(lambda: get_agenda(user).day())
+    return {'intent': 'daily_summary', 'status': 'ok', 'date': view['date'], 'events': view['events'], 'tasks': view['tasks']}
+
+
+def _recurrence(details, user_input, user=None):
+    # The model may leave out the rule; "every weekday" in the prompt still counts.
+    from recurrence import parse_recurrence
+    from user_context import get_user_context
+
+    return details.get('recurrence') or parse_recurrence(user_input, get_user_context(user).user_id)
+
+
+async def show_reminders_async(user=None):
+    from calendar_utils import get_task_reminder_events
+
+    reminders = await _call(get_task_reminder_events, user)
+    return {'intent': 'show', 'status': 'ok', 'reminders': reminders}
+
+
+async def add_task_async(title, due_date, user=None, recurrence=None):
+    from task_utils import add_task_reminder, create_google_task, create_recurring_tasks, enqueue_task
+
+    if recurrence:
+        series = await _call(create_recurring_tasks, title, due_date, recurrence, user=user)
+        return {'intent': 'add_task', 'status': 'ok', 'title': title, 'task_id': (series['task_ids'] or [None])[0], **series}
+
+    if DEFER_WRITES:
+        # The task and its reminder are created by a retried background job.
+        job = await _call(enqueue_task, title, due_date, user=user)
+        return {'intent': 'add_task', 'status': 'queued', 'title': title, 'job': job}
+
+    task_id, reminder = await asyncio.gather(
+        _call(create_google_task, title, due_date, add_reminder=False, user=user),
+        _call(add_task_reminder, title, due_date, user),
+        return_exceptions=True
+    )
+    if isinstance(task_id, Exception):
+        raise task_id
+    result = {'intent': 'add_task', 'status': 'ok', 'title': title, 'task_id': task_id, 'reminder_link': None}
+    if isinstance(reminder, Exception):
+        result['reminder_error'] = str(reminder)
+    else:
+        result['reminder_link'] = reminder
+    return result
+
+
+async def _resolve_task_async(task_details, title, user=None, include_completed=True):
+    from task_utils import find_task_candidates, is_ambiguous
+
+    task_id = task_details.get('task_id')
+    if task_id:
+        return {'id': task_id, 'tasklist': task_details.get('tasklist') or '@default'}, None
+
+    candidates = await _call(find_task_candidates, title, include_completed=include_completed, user=user)
+    if is_ambiguous(candidates):
+        return None, {
+            'status': 'ambiguous',
+            'query': title,
+            'candidates': [task for _, task in candidates]
+        }
+    if not candidates:
+        return None, {'status': 'not_found', 'query': title}
+    return candidates[0][1], None
+
+
+async def update_task_async(task_details, user_input, user=None):
+    from task_utils import complete_task, update_task
+
+    updated_fields = task_details.get('updated_fields') or {}
+    task_title = updated_fields.get('title') or task_details.get('title')
+
+    marked_done = updated_fields.get('status') == 'completed'
+    if marked_done or "done" in user_input.lower() or "complete" in user_input.lower():
+        # Only open tasks can be completed; close matches are reported, not guessed.
+        task, failure = await _resolve_task_async(task_details, task_title, user, include_completed=False)
+        if failure:
+            return {'intent': 'complete_task', **failure}
+        updated = await _call(complete_task, task['id'], task['tasklist'], user)
+        return {'intent': 'complete_task', 'status': 'ok', 'task': updated}
+
+    task, failure = await _resolve_task_async(task_details, task_title, user)
+    if failure:
+        return {'intent': 'update_task', **failure}
+
+    updated = await _call(
+        update_task,
+        task['id'],
+        new_title=updated_fields.get('title'),
+        new_due_date=updated_fields.get('due_date'),
+        tasklist=task['tasklist'],
+        user=user
+    )
+    return {'intent': 'update_task', 'status': 'ok', 'task': updated}
+
+
+async def delete_task_async(task_details, user=None):
+    from task_utils import delete_task
+
+    task, failure = await _resolve_task_async(task_details, task_details.get('title'), user)
+    if failure:
+        return {'intent': 'delete_task', **failure}
+    message = await _call(delete_task, task['id'], tasklist=task['tasklist'], user=user)
+    return {'intent': 'delete_task', 'status': 'ok', 'message': message}
+
+
+async def meeting_async(meeting_details, user_input, user=None):
+    from calendar_utils import AmbiguousEventError, create_event, reschedule_event_by_email_and_purpose, reschedule_event_by_id
+
+    is_reschedule = meeting_details.get('reschedule') or any(keyword in user_input.lower() for keyword in RESCHEDULE_KEYWORDS)
+    if not is_reschedule:
+        # Chosen here so the result can name the event for follow-up commands.
+        meeting_details = {**meeting_details, 'event_id': meeting_details.get('event_id') or uuid.uuid4().hex}
+        recurrence = _recurrence(meeting_details, user_input, user)
+        if recurrence:
+            return await meeting_series_async({**meeting_details, 'recurrence': recurrence}, user)
+        link = await _call(create_event, meeting_details, user=user)
+        return {'intent': 'create_meeting', 'status': 'ok', 'link': link, 'event_id': meeting_details['event_id']}
+
+    event_id = meeting_details.get('event_id')
+    if event_id and meeting_details.get('date_time'):
+        link = await _call(reschedule_event_by_id, event_id, meeting_details['date_time'], user=user)
+        return {'intent': 'reschedule_meeting', 'status': 'ok', 'link': link, 'event_id': event_id}
+
+    attendee_email = (meeting_details.get("attendees") or [None])[0]
+    purpose = meeting_details.get("purpose", "")
+    new_datetime = meeting_details.get("date_time", "")
+    if not attendee_email or not purpose or not new_datetime:
+        return {
+            'intent': 'reschedule_meeting',
+            'status': 'invalid',
+            'error': "Missing details: attendee, purpose, or new date/time."
+        }
+
+    try:
+        link = await _call(reschedule_event_by_email_and_purpose, attendee_email, purpose, new_datetime, user=user)
+    except AmbiguousEventError as e:
+        return {'intent': 'reschedule_meeting', 'status': 'ambiguous', 'query': e.query, 'candidates': e.candidates}
+    return {'intent': 'reschedule_meeting', 'status': 'ok', 'link': link}
+
+
+async def meeting_series_async(meeting_details, user=None):
+    from calendar_utils import create_event, preview_series
+
+    # The conflict check runs on the local mirror while the series is inserted.
+    preview, link = await asyncio.gather(
+        _call(preview_series, meeting_details, user=user),
+        _call(create_event, meeting_details, user=user)
+    )
+    return {
+        'intent': 'create_meeting',
+        'status': 'ok',
+        'link': link,
+        'event_id': meeting_details.get('event_id'),
+        'recurrence': preview['recurrence'],
+        'occurrences': preview['occurrences'],
+        'conflicts': preview['conflicts']
+    }
+
+
+async def bulk_update_async(bulk_details, user=None):
+    from calendar_utils import apply_to_events
+    from task_utils import apply_to_tasks
+
+    filters = dict(bulk_details.get('filter') or {})
+    operation = bulk_details.get('operation')
+    preview = bool(bulk_details.get('preview'))
+    if bulk_details.get('target') == 'tasks':
+        filters = {
+            'title': filters.get('title') or filters.get('purpose'),
+            'due_from': filters.get('from'),
+            'due_to': filters.get('to'),
+            'weekday': filters.get('weekday')
+        }
+        shift_days = int(bulk_details.get('shift_days') or 0)
+        if operation == 'extend' and not shift_days and bulk_details.get('extend_minutes'):
+            shift_days = max(1, int(bulk_details['extend_minutes']) // (24 * 60))
+        summary = await _call(
+            apply_to_tasks, operation, {k: v for k, v in filters.items() if v},
+            to_weekday=bulk_details.get('to_weekday'), shift_days=shift_days, preview=preview, user=user
+        )
+    else:
+        filters = {
+            'start': filters.get('from'),
+            'end': filters.get('to'),
+            'weekday': filters.get('weekday'),
+            'purpose': filters.get('purpose') or filters.get('title'),
+            'attendee': filters.get('attendee')
+        }
+        summary = await _call(
+            apply_to_events, operation, {k: v for k, v in filters.items() if v},
+            to_weekday=bulk_details.get('to_weekday'),
+            shift_days=int(bulk_details.get('shift_days') or 0),
+            shift_minutes=int(bulk_details.get('shift_minutes') or 0),
+            extend_minutes=int(bulk_details.get('extend_minutes') or 0),
+            preview=preview,
+            user=user
+        )
+    status = 'ok' if not summary['failed'] else 'partial' if summary['applied'] else 'error'
+    result = {'intent': 'bulk_update', 'status': status, 'target': bulk_details.get('target') or 'events', **summary}
+    if status == 'error':
+        result['error'] = f"{len(summary['failed'])} update(s) failed."
+    return result
+
+
+def is_batchable(parsed, prompt):
+    # Plain creates go into one Google batch; everything else runs on its own.
+    meeting_details = parsed.get('meeting_details')
+    task_details = parsed.get('task_details')
+    if parsed.get('plan') or parsed.get('action') in ('daily_summary', 'bulk_update'):
+        return False
+    # Series expand into many calls (or a conflict check), so they take the pooled path.
+    from recurrence import parse_recurrence
+    if (meeting_details or task_details or {}).get('recurrence') or parse_recurrence(prompt):
+        return False
+    if meeting_details:
+        return not meeting_details.get('reschedule') and not any(keyword in prompt.lower() for keyword in RESCHEDULE_KEYWORDS)
+    return bool(task_details) and task_details.get('action') == 'add'
+
+
+def plan_steps(parsed_response):
+    # A plan, or one answer carrying several commands (meeting_details used
+    # to win over task_details), split into steps in execution order.
+    if parsed_response.get('plan'):
+        return [step for step in parsed_response['plan'] if isinstance(step, dict)] or [parsed_response]
+    steps = []
+    if parsed_response.get('meeting_details'):
+        steps.append({'meeting_details': parsed_response['meeting_details']})
+    if parsed_response.get('task_details'):
+        steps.append({'task_details': parsed_response['task_details']})
+    if parsed_response.get('action') and steps:
+        steps.append({'action': parsed_response['action'], 'bulk_details': parsed_response.get('bulk_details')})
+    return steps if len(steps) > 1 else [parsed_response]
+
+
+def _resource_key(step, index):
+    # Steps naming the same task or meeting must see each other's writes.
+    task_details = step.get('task_details') or {}
+    meeting_details = step.get('meeting_details') or {}
+    if task_details.get('title'):
+        return 'task:' + task_details['title'].strip().lower()
+    if meeting_details.get('purpose'):
+        return 'meeting:' + meeting_details['purpose'].strip().lower()
+    return f"step:{index}"
+
+
+async def execute_plan_async(steps, user_input, user=None, confirmation_message=None):
+    results = [None] * len(steps)
+    keys = [_resource_key(step, i) for i, step in enumerate(steps)]
+    shared = {key for key in keys if keys.count(key) > 1}
+
+    batched = []
+    chains = {}
+    for i, step in enumerate(steps):
+        prompt = step.get('text') or user_input
+        if keys[i] not in shared and is_batchable(step, prompt):
+            batched.append((i, step))
+        else:
+            chains.setdefault(keys[i], []).append(i)
+
+    async def run_batch():
+        # Meeting and task inserts from one plan share a single batch round trip.
+        from batch_utils import create_batched
+
+        try:
+            outcomes = await _call(create_batched, dict(batched), user)
+        except Exception as e:
+            outcomes = {i: {'intent': None, 'status': 'error', 'error': str(e)} for i, _ in batched}
+        for i, outcome in outcomes.items():
+            outcome['confirmation_message'] = steps[i].get('confirmation_message', "Action completed successfully.")
+            results[i] = outcome
+
+    async def run_chain(indices):
+        # Same task or meeting: in plan order. Independent chains run concurrently.
+        for i in indices:
+            results[i] = await execute_async(steps[i], steps[i].get('text') or user_input, user)
+
+    jobs = [run_chain(indices) for indices in chains.values()]
+    if batched:
+        jobs.append(run_batch())
+    await asyncio.gather(*jobs)
+
+    for step, result in zip(steps, results):
+        if step.get('text'):
+            result['text'] = step['text']
+    succeeded = sum(1 for result in results if result.get('status') in ('ok', 'queued'))
+    status = 'ok' if succeeded == len(results) else 'partial' if succeeded else 'error'
+    result = {
+        'intent': 'plan',
+        'status': status,
+        'steps': results,
+        'confirmation_message': confirmation_message or "All done! Here's what I did."
+    }
+    if status != 'ok':
+        result['error'] = f"{len(results) - succeeded} of {len(results)} step(s) did not complete."
+    return result
+
+
+async def execute_async(parsed_response, user_input, user=None):
+    steps = plan_steps(parsed_response)
+    if len(steps) > 1:
+        return await execute_plan_async(steps, user_input, user, parsed_response.get('confirmation_message'))
+    parsed_response = steps[0]
+
+    meeting_details = parsed_response.get("meeting_details")
+    task_details = parsed_response.get("task_details")
+    action = parsed_response.get("action")
+    confirmation_message = parsed_response.get("confirmation_message", "Action completed successfully.")
+
+    # Fallback for "show upcoming tasks" if Gemini missed it
+    if not action and "show" in user_input.lower() and "task" in user_input.lower():
+        action = "show"
+        confirmation_message = "Here are your upcoming tasks!"
+
+    if action == "daily_summary":
+        return await daily_summary_async(user)
+
+    if action == "bulk_update":
+        try:
+            result = await bulk_update_async(parsed_response.get('bulk_details') or {}, user)
+        except ValueError as e:
+            return {'intent': action, 'status': 'invalid', 'error': str(e)}
+        except Exception as e:
+            return {'intent': action, 'status': 'error', 'error': str(e)}
+        result['confirmation_message'] = confirmation_message
+        return result
+
+    if not meeting_details and not task_details and not action:
+        return {
+            'intent': None,
+            'status': 'invalid',
+            'error': "Could not extract any valid task or meeting information from your input."
+        }
+
+    try:
+        result = None
+        if meeting_details:
+            result = await meeting_async(meeting_details, user_input, user)
+        elif task_details:
+            action = task_details.get("action")
+            if action == "add":
+                recurrence = _recurrence(task_details, user_input, user)
+                result = await add_task_async(task_details['title'], task_details['due_date'], user, recurrence)
+            elif action == "update":
+                result = await update_task_async(task_details, user_input, user)
+            elif action == "delete":
+                result = await delete_task_async(task_details, user)
+
+        if action == "show":
+            result = await show_reminders_async(user)
+    except Exception as e:
+        return {'intent': action, 'status': 'error', 'error': str(e)}
+
+    if result is None:
+        return {'intent': action, 'status': 'invalid', 'error': f"Unsupported action: {action}"}
+    result['confirmation_message'] = confirmation_message
+    return result
+
+
+async def _traced_execute_async(parsed_response, user_input, user=None):
+    with span('command') as s:
+        result = await execute_async(parsed_response, user_input, user)
+        s.set(intent=result.get('intent'), status=result.get('status'))
+        if result.get('error'):
+            s.set(error=result['error'])
+    incr('commands', intent=result.get('intent'), status=result.get('status'))
+    return result
+
+
+async def run_command_async(user_input, user=None):
+    with span('request'):
+        parsed_response = await parse_async(user_input, user)
+        if not parsed_response:
+            return parsed_response, {'intent': None, 'status': 'invalid', 'error': "Failed to parse input. Please try again."}
+        return parsed_response, await _traced_execute_async(parsed_response, user_input, user)
+
+
+def parse_command(user_input, user=None):
+    return run(parse_async(user_input, user))
+
+
+def execute_command(parsed_response, user_input, user=None):
+    return run(_traced_execute_async(parsed_response, user_input, user))
+
+
+def run_command(user_input, user=None):
+    return run(run_command_async(user_input, user))
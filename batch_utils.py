@@ -0,0 +1,261 @@
+# batch_utils.py
+import random
+import time
+
+from api_executor import execute, is_retryable
+from datetime_utils import resolve_many
+from calendar_utils import (
+    build_event_body,
+    delete_event_request,
+    get_calendar_service,
+    insert_event_request,
+    patch_event_request
+)
+from mirror import get_mirror
+from task_utils import (
+    build_reminder_details,
+    build_task_body,
+    delete_task_request,
+    get_default_tasklist_id,
+    get_tasks_service,
+    insert_task_request,
+    patch_task_request,
+    task_changes_request
+)
+from user_context import get_user_context
+
+# Google accepts up to 1000 calls per batch but recommends staying far below
+# that; 50 keeps a single failed batch cheap to retry.
+MAX_BATCH_SIZE = 50
+MAX_ATTEMPTS = 4
+
+SERVICES = {
+    'calendar': get_calendar_service,
+    'tasks': get_tasks_service,
+}
+
+
+class _ResourceCache:
+    # service.events() / service.tasks() rebuild every method from the
+    # discovery document on each call; requests in one chunk share one build.
+    def __init__(self, service):
+        self._service = service
+        self._resources = {}
+
+    def __getattr__(self, name):
+        def resource():
+            if name not in self._resources:
+                self._resources[name] = getattr(self._service, name)()
+            return self._resources[name]
+        return resource
+
+
+class BatchResult:
+    def __init__(self, key, response=None, error=None, attempts=0):
+        self.key = key
+        self.response = response
+        self.error = error
+        self.attempts = attempts
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = 'ok' if self.ok else f"error={self.error!r}"
+        return f"BatchResult({self.key!r}, {status}, attempts={self.attempts})"
+
+
+class BatchPipeline:
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, max_attempts=MAX_ATTEMPTS, backoff=1.0, user=None):
+        # A batch authenticates as one user, so a pipeline serves a single user.
+        self.user = get_user_context(user)
+        self.max_batch_size = max_batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.results = {}
+        self._pending = []
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, api, request_factory, key=None):
+        if api not in SERVICES:
+            raise ValueError(f"Unsupported API for batching: '{api}'")
+        if key is None:
+            self._counter += 1
+            key = f"{api}-{self._counter}"
+        self._pending.append((key, api, request_factory))
+        return key
+
+    def create_event(self, details, include_meet=True, key=None):
+        event = build_event_body(details, include_meet, user=self.user)
+        calendar_id = self.user.calendar_id
+        return self.add('calendar', lambda service: insert_event_request(service, event, calendar_id), key)
+
+    def delete_event(self, event_id, key=None):
+        calendar_id = self.user.calendar_id
+        return self.add('calendar', lambda service: delete_event_request(service, event_id, calendar_id), key)
+
+    def patch_event(self, event_id, changes, etag=None, key=None):
+        calendar_id = self.user.calendar_id
+        return self.add(
+            'calendar',
+            lambda service: patch_event_request(service, event_id, changes, etag, calendar_id),
+            key
+        )
+
+    def update_task(self, task_id, new_title=None, new_due_date=None, key=None):
+        return self.add(
+            'tasks',
+            lambda service: patch_task_request(service, task_id, new_title, new_due_date, user=self.user),
+            key
+        )
+
+    def patch_task(self, task_id, changes, tasklist='@default', key=None):
+        return self.add('tasks', lambda service: task_changes_request(service, task_id, changes, tasklist), key)
+
+    def delete_task(self, task_id, tasklist='@default', key=None):
+        return self.add('tasks', lambda service: delete_task_request(service, task_id, tasklist), key)
+
+    def create_google_task(self, title, due_date, add_reminder=True, key=None):
+        task = build_task_body(title, due_date, self.user)
+        key = self.add('tasks', lambda service: insert_task_request(service, task), key)
+        if add_reminder:
+            self.create_event(
+                build_reminder_details(title, due_date, self.user),
+                include_meet=False,
+                key=f"{key}:reminder"
+            )
+        return key
+
+    def execute(self):
+        pending, self._pending = self._pending, []
+        attempt = 0
+        while pending and attempt < self.max_attempts:
+            attempt += 1
+            if attempt > 1:
+                delay = self.backoff * (2 ** (attempt - 2))
+                time.sleep(delay + random.uniform(0, delay))
+            retry = []
+            for api, chunk in self._chunks(pending):
+                retry.extend(self._execute_chunk(api, chunk, attempt))
+            pending = retry
+        return self.results
+
+    def failed(self):
+        return {key: result for key, result in self.results.items() if not result.ok}
+
+    def _chunks(self, operations):
+        by_api = {}
+        for operation in operations:
+            by_api.setdefault(operation[1], []).append(operation)
+        for api, ops in by_api.items():
+            for i in range(0, len(ops), self.max_batch_size):
+                yield api, ops[i:i + self.max_batch_size]
+
+    def _execute_chunk(self, api, chunk, attempt):
+        service = SERVICES[api](self.user)
+        batch = service.new_batch_http_request()
+        resources = _ResourceCache(service)
+        retry = []
+
+        def callback(request_id, response, exception):
+            operation = chunk[int(request_id)]
+            key = operation[0]
+            self.results[key] = BatchResult(key, response=response, error=exception, attempts=attempt)
+            if exception is not None and is_retryable(exception, idempotent=api != 'tasks'):
+                retry.append(operation)
+
+        for i, (key, _, request_factory) in enumerate(chunk):
+            try:
+                batch.add(request_factory(resources), callback=callback, request_id=str(i))
+            except Exception as e:
+                self.results[key] = BatchResult(key, error=e, attempts=attempt)
+
+        try:
+            # Parts are retried individually below, so the executor only rate-limits here.
+            execute(batch, api=api, user=self.user.user_id, cost=len(chunk), max_attempts=1)
+        except Exception as e:
+            # The batch request itself failed; parts without a result were never applied.
+            for operation in chunk:
+                key = operation[0]
+                result = self.results.get(key)
+                if result is not None and result.attempts == attempt:
+                    continue
+                self.results[key] = BatchResult(key, error=e, attempts=attempt)
+                if is_retryable(e, idempotent=api != 'tasks'):
+                    retry.append(operation)
+        return retry
+
+
+def _create_outcome(intent, results, key):
+    result = results.get(key)
+    if result is None or not result.ok:
+        return {'intent': intent, 'status': 'error', 'error': str(result.error) if result else "Not executed"}
+    if intent == 'create_meeting':
+        return {'intent': intent, 'status': 'ok', 'link': result.response.get('htmlLink'), 'event_id': result.response.get('id')}
+    outcome = {'intent': intent, 'status': 'ok', 'task_id': result.response.get('id'), 'reminder_link': None}
+    reminder = results.get(f"{key}:reminder")
+    if reminder is not None and reminder.ok:
+        outcome['reminder_link'] = reminder.response.get('htmlLink')
+    elif reminder is not None:
+        outcome['reminder_error'] = str(reminder.error)
+    return outcome
+
+
+def create_batched(commands, user=None):
+    # Creates the meetings and tasks (with reminders) of several parsed
+    # commands in shared batch round trips. commands maps a key to a command;
+    # returns {key: result} shaped like execute_command's and records what was
+    # created in the mirror.
+    pipeline = BatchPipeline(user=user)
+    outcomes = {}
+    intents = {
+        key: 'create_meeting' if command.get('meeting_details') else 'add_task'
+        for key, command in commands.items()
+    }
+    # All dates in one pass; a task and its reminder then share the resolved time.
+    phrases = [
+        (command['meeting_details'].get('date_time') if command.get('meeting_details') else command['task_details'].get('due_date')) or ''
+        for command in commands.values()
+    ]
+    resolved = resolve_many(phrases, user_id=pipeline.user.user_id, return_exceptions=True)
+    for (key, command), when in zip(commands.items(), resolved):
+        intent = intents[key]
+        try:
+            if isinstance(when, Exception):
+                raise when
+            if intent == 'create_meeting':
+                pipeline.create_event({**command['meeting_details'], 'date_time': when.isoformat()}, key=key)
+            else:
+                task_details = command['task_details']
+                pipeline.create_google_task(task_details['title'], when.isoformat(), key=key)
+        except Exception as e:
+            outcomes[key] = {'intent': intent, 'status': 'error', 'error': str(e)}
+    results = pipeline.execute() if len(pipeline) else {}
+
+    events, tasks = [], []
+    for key, command in commands.items():
+        if key in outcomes:
+            continue
+        outcome = outcomes[key] = _create_outcome(intents[key], results, key)
+        if outcome['status'] != 'ok':
+            continue
+        if intents[key] == 'create_meeting':
+            events.append(results[key].response)
+            continue
+        outcome['title'] = command['task_details']['title']
+        tasks.append(results[key].response)
+        reminder = results.get(f"{key}:reminder")
+        if reminder is not None and reminder.ok:
+            events.append(reminder.response)
+
+    context = pipeline.user
+    mirror = get_mirror(context.user_id)
+    if events:
+        mirror.upsert_events(events, context.calendar_id)
+    if tasks:
+        mirror.upsert_tasks(tasks, get_default_tasklist_id(context))
+    return outcomes
@@ -0,0 +1,502 @@
+# benchmarks/fakes.py
+# Local stand-ins for Google Calendar/Tasks, Gemini and SMTP so workloads run
+# offline. They model the parts of each service this app uses, not the APIs.
+import datetime
+import json
+import re
+import socketserver
+import threading
+import time
+import uuid
+from collections import Counter
+from email.parser import BytesParser, Parser
+from urllib.parse import parse_qs, unquote, urlparse
+from urllib.request import Request, urlopen
+
+import httplib2
+
+REASONS = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found', 409: 'Conflict', 412: 'Precondition Failed'}
+DEFAULT_TASKLIST_ID = 'list-default'
+
+
+def _now_string():
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message=''):
+        super().__init__(message)
+        self.status = status
+
+
+class FakeGoogleBackend:
+    # In-memory Calendar v3 / Tasks v1 state shared by every fake transport.
+    def __init__(self, latency=0.0, max_page_size=2500):
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.events = {}
+        self.tasklists = {DEFAULT_TASKLIST_ID: {'id': DEFAULT_TASKLIST_ID, 'title': 'My Tasks', 'updated': _now_string()}}
+        self.tasks = {DEFAULT_TASKLIST_ID: {}}
+        self.calls = Counter()
+        self.http_requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+        # Push channels from events.watch; changes are POSTed to their address
+        # the way Google does, coalesced per channel over notify_delay.
+        self.channels = {}
+        self.notify_delay = 0.05
+        self.notifications_sent = 0
+        self._pending_notifications = set()
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.http_requests = self.bytes_in = self.bytes_out = 0
+
+    # Seeding
+
+    def _next_seq(self):
+        self._seq += 1
+        return self._seq
+
+    def _store_event(self, calendar_id, event):
+        event['etag'] = f'"{uuid.uuid4().hex}"'
+        event['updated'] = _now_string()
+        event.setdefault('status', 'confirmed')
+        event.setdefault('htmlLink', f"https://calendar.example/event?eid={event['id']}")
+        self.events.setdefault(calendar_id, {})[event['id']] = (self._next_seq(), event)
+        self._notify_channels(calendar_id)
+        return event
+
+    # Push notifications
+
+    def _notify_channels(self, calendar_id, state='exists'):
+        for channel in self.channels.values():
+            if channel['calendar_id'] != calendar_id or channel['id'] in self._pending_notifications:
+                continue
+            self._pending_notifications.add(channel['id'])
+            threading.Thread(target=self._deliver, args=(channel, state), daemon=True).start()
+
+    def _deliver(self, channel, state):
+        time.sleep(self.notify_delay)
+        with self._lock:
+            self._pending_notifications.discard(channel['id'])
+            if channel['id'] not in self.channels:
+                return
+            channel['messages'] += 1
+            number = channel['messages']
+        request = Request(channel['address'], data=b'', method='POST', headers={
+            'X-Goog-Channel-ID': channel['id'],
+            'X-Goog-Channel-Token': channel.get('token') or '',
+            'X-Goog-Resource-ID': channel['resourceId'],
+            'X-Goog-Resource-State': state,
+            'X-Goog-Message-Number': str(number),
+        })
+        try:
+            urlopen(request, timeout=5).close()
+            with self._lock:
+                self.notifications_sent += 1
+        except Exception:
+            pass
+
+    def seed_events(self, count, start, spacing=datetime.timedelta(hours=3), calendar_id='primary', attendees=3):
+        with self._lock:
+            for i in range(count):
+                begin = start + i * spacing
+                self._store_event(calendar_id, {
+                    'id': uuid.uuid4().hex,
+                    'summary': f"Meeting {i} about project {i % 97}",
+                    'start': {'dateTime': begin.isoformat()},
+                    'end': {'dateTime': (begin + datetime.timedelta(minutes=30)).isoformat()},
+                    'attendees': [{'email': f"person{(i + j) % 500}@example.com"} for j in range(attendees)]
+                })
+
+    def seed_tasks(self, count, due_start, tasklist=DEFAULT_TASKLIST_ID):
+        with self._lock:
+            for i in range(count):
+                due = (due_start + datetime.timedelta(days=i % 30)).strftime('%Y-%m-%dT00:00:00.000Z')
+                task_id = uuid.uuid4().hex
+                self.tasks[tasklist][task_id] = {
+                    'id': task_id, 'title': f"Task {i}", 'status': 'needsAction', 'due': due, 'updated': _now_string()
+                }
+
+    # Transport entry points
+
+    def transport(self, user_id=None, api=None):
+        return FakeHttp(self)
+
+    def handle(self, method, uri, body, headers):
+        parsed = urlparse(uri)
+        path = unquote(parsed.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        if path.endswith('/batch') or '/batch/' in path:
+            return self._handle_batch(body, headers)
+        payload = json.loads(body) if body else None
+        try:
+            status, result = self._dispatch(method, path, query, payload, headers or {})
+        except ApiError as e:
+            status, result = e.status, {'error': {'code': e.status, 'message': str(e)}}
+        return status, result
+
+    def _handle_batch(self, body, headers):
+        content_type = headers.get('content-type') or headers.get('Content-Type')
+        raw = body.encode('utf-8') if isinstance(body, str) else body
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode('utf-8') + raw)
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in message.get_payload():
+            request_line, rest = part.get_payload().split('\n', 1)
+            method, target, _ = request_line.split(' ', 2)
+            inner = Parser().parsestr(rest)
+            inner_headers = {k.lower(): v for k, v in inner.items()}
+            status, result = self.handle(method, target, inner.get_payload() or None, inner_headers)
+            content = json.dumps(result) if result is not None else ''
+            content_id = part['Content-ID'].strip('<>')
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\nContent-Type: application/json\r\n\r\n{content}\r\n"
+            )
+        with self._lock:
+            self.calls['batch'] += 1
+        return 200, ''.join(parts) + f"--{boundary}--", f'multipart/mixed; boundary="{boundary}"'
+
+    def _dispatch(self, method, path, query, payload, headers):
+        routes = [
+            (r'/calendar/v3/calendars/([^/]+)/events', {
+                'GET': ('events.list', self._list_events), 'POST': ('events.insert', self._insert_event)
+            }),
+            (r'/calendar/v3/calendars/([^/]+)/events/watch', {'POST': ('events.watch', self._watch_events)}),
+            (r'/calendar/v3/channels/stop', {'POST': ('channels.stop', self._stop_channel)}),
+            (r'/calendar/v3/calendars/([^/]+)/events/([^/]+)', {
+                'GET': ('events.get', self._get_event),
+                'PATCH': ('events.patch', self._patch_event),
+                'DELETE': ('events.delete', self._delete_event)
+            }),
+            (r'/calendar/v3/freeBusy', {'POST': ('freebusy.query', self._free_busy)}),
+            (r'/tasks/v1/users/@me/lists', {'GET': ('tasklists.list', self._list_tasklists)}),
+            (r'/tasks/v1/users/@me/lists/([^/]+)', {'GET': ('tasklists.get', self._get_tasklist)}),
+            (r'/tasks/v1/lists/([^/]+)/tasks', {
+                'GET': ('tasks.list', self._list_tasks), 'POST': ('tasks.insert', self._insert_task)
+            }),
+            (r'/tasks/v1/lists/([^/]+)/tasks/([^/]+)', {
+                'GET': ('tasks.get', self._get_task),
+                'PATCH': ('tasks.patch', self._patch_task),
+                'DELETE': ('tasks.delete', self._delete_task)
+            }),
+        ]
+        for pattern, handlers in routes:
+            match = re.search(pattern + '$', path)
+            if match and method in handlers:
+                name, handler = handlers[method]
+                with self._lock:
+                    self.calls[name] += 1
+                    return handler(*match.groups(), query=query, body=payload, headers=headers)
+        raise ApiError(404, f"No fake route for {method} {path}")
+
+    def _page(self, items, query):
+        start = int(query.get('pageToken') or 0)
+        size = min(int(query.get('maxResults') or 100), self.max_page_size)
+        page = {'items': items[start:start + size]}
+        if start + size < len(items):
+            page['nextPageToken'] = str(start + size)
+        return page
+
+    # Calendar
+
+    def _list_events(self, calendar_id, query, **_):
+        stored = self.events.get(calendar_id, {})
+        since = int(query['syncToken']) if query.get('syncToken') else None
+        items = [
+            event for seq, event in sorted(stored.values(), key=lambda pair: pair[0])
+            if (since is None and event['status'] != 'cancelled') or (since is not None and seq > since)
+        ]
+        page = self._page(items, query)
+        if 'nextPageToken' not in page:
+            page['nextSyncToken'] = str(self._seq)
+        return 200, page
+
+    def _event(self, calendar_id, event_id):
+        entry = self.events.get(calendar_id, {}).get(event_id)
+        if entry is None or entry[1]['status'] == 'cancelled':
+            raise ApiError(404, 'Not Found')
+        return entry[1]
+
+    def _insert_event(self, calendar_id, body, **_):
+        event = dict(body)
+        event.setdefault('id', uuid.uuid4().hex)
+        if event['id'] in self.events.get(calendar_id, {}):
+            raise ApiError(409, 'The requested identifier already exists.')
+        if 'conferenceData' in event:
+            event['hangoutLink'] = f"https://meet.example/{event['id'][:10]}"
+        return 200, self._store_event(calendar_id, event)
+
+    def _get_event(self, calendar_id, event_id, **_):
+        return 200, self._event(calendar_id, event_id)
+
+    def _patch_event(self, calendar_id, event_id, body, headers, **_):
+        event = self._event(calendar_id, event_id)
+        if headers.get('if-match') and headers['if-match'] != event['etag']:
+            raise ApiError(412, 'Precondition Failed')
+        return 200, self._store_event(calendar_id, {**event, **body})
+
+    def _delete_event(self, calendar_id, event_id, **_):
+        event = self._event(calendar_id, event_id)
+        self._store_event(calendar_id, {**event, 'status': 'cancelled'})
+        return 204, None
+
+    def _watch_events(self, calendar_id, body, **_):
+        ttl = int(body.get('params', {}).get('ttl') or 7 * 24 * 3600)
+        channel = {
+            'id': body['id'],
+            'calendar_id': calendar_id,
+            'address': body['address'],
+            'token': body.get('token'),
+            'resourceId': uuid.uuid4().hex,
+            'expiration': str(int((time.time() + ttl) * 1000)),
+            'messages': 0
+        }
+        self.channels[channel['id']] = channel
+        self._pending_notifications.add(channel['id'])
+        threading.Thread(target=self._deliver, args=(channel, 'sync'), daemon=True).start()
+        return 200, {
+            'kind': 'api#channel', 'id': channel['id'], 'resourceId': channel['resourceId'],
+            'resourceUri': f"/calendar/v3/calendars/{calendar_id}/events", 'expiration': channel['expiration']
+        }
+
+    def _stop_channel(self, body, **_):
+        channel = self.channels.get(body.get('id'))
+        if channel is None or channel['resourceId'] != body.get('resourceId'):
+            raise ApiError(404, 'Channel not found')
+        del self.channels[channel['id']]
+        return 204, None
+
+    def _free_busy(self, body, **_):
+        time_min, time_max = body['timeMin'], body['timeMax']
+        calendars = {}
+        for item in body.get('items', []):
+            busy = []
+            for _, event in self.events.get(item['id'], {}).values():
+                start, end = event['start'].get('dateTime'), event['end'].get('dateTime')
+                if event['status'] != 'cancelled' and start and start < time_max and end > time_min:
+                    busy.append({'start': start, 'end': end})
+            calendars[item['id']] = {'busy': busy}
+        return 200, {'calendars': calendars}
+
+    # Tasks
+
+    def _tasklist_id(self, tasklist):
+        tasklist = DEFAULT_TASKLIST_ID if tasklist == '@default' else tasklist
+        if tasklist not in self.tasks:
+            raise ApiError(404, 'Task list not found')
+        return tasklist
+
+    def _list_tasklists(self, query, **_):
+        return 200, self._page(list(self.tasklists.values()), query)
+
+    def _get_tasklist(self, tasklist, **_):
+        return 200, self.tasklists[self._tasklist_id(tasklist)]
+
+    def _list_tasks(self, tasklist, query, **_):
+        tasks = self.tasks[self._tasklist_id(tasklist)].values()
+        updated_min = query.get('updatedMin')
+        show_deleted = query.get('showDeleted') == 'true'
+        items = [
+            task for task in tasks
+            if (not updated_min or task['updated'] >= updated_min) and (show_deleted or not task.get('deleted'))
+        ]
+        return 200, self._page(items, query)
+
+    def _task(self, tasklist, task_id):
+        task = self.tasks[self._tasklist_id(tasklist)].get(task_id)
+        if task is None or task.get('deleted'):
+            raise ApiError(404, 'Task not found')
+        return task
+
+    def _insert_task(self, tasklist, body, **_):
+        task = {**body, 'id': uuid.uuid4().hex, 'updated': _now_string()}
+        self.tasks[self._tasklist_id(tasklist)][task['id']] = task
+        return 200, task
+
+    def _get_task(self, tasklist, task_id, **_):
+        return 200, self._task(tasklist, task_id)
+
+    def _patch_task(self, tasklist, task_id, body, **_):
+        task = self._task(tasklist, task_id)
+        task.update(body, updated=_now_string())
+        return 200, task
+
+    def _delete_task(self, tasklist, task_id, **_):
+        task = self._task(tasklist, task_id)
+        task.update(deleted=True, updated=_now_string())
+        return 204, None
+
+
+class FakeHttp:
+    # Quacks like httplib2.Http, which is all googleapiclient needs from a transport.
+    def __init__(self, backend):
+        self.backend = backend
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        backend = self.backend
+        if backend.latency:
+            time.sleep(backend.latency)
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        result = backend.handle(method, uri, body, headers)
+        status, payload = result[0], result[1]
+        content_type = result[2] if len(result) > 2 else 'application/json'
+        if isinstance(payload, str):
+            content = payload.encode('utf-8')
+        else:
+            content = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        with backend._lock:
+            backend.http_requests += 1
+            backend.bytes_out += len(body or '')
+            backend.bytes_in += len(content)
+        response = httplib2.Response({'status': status, 'content-type': content_type})
+        response.reason = REASONS.get(status, 'Error')
+        return response, content
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    # Answers extraction prompts with canned JSON after a fixed delay, standing in for Gemini.
+    # With a response_schema in generation_config it answers in the structured
+    # format, and stream=True splits the answer into small chunks.
+    CHUNK_SIZE = 24
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.prompt_bytes = 0
+        self._lock = threading.Lock()
+
+    def _answer(self, sentence):
+        emails = re.findall(r'[\w.-]+@[\w.-]+\.\w+', sentence)
+        if emails or 'meet' in sentence.lower():
+            return {
+                'meeting_details': {
+                    'description': sentence,
+                    'attendees': emails or ['guest@example.com'],
+                    'date_time': 'tomorrow at 3pm',
+                    'platform': 'Google Meet',
+                    'purpose': 'Sync'
+                },
+                'confirmation_message': 'Your meeting details have been saved! Looking forward to it.'
+            }
+        return {
+            'task_details': {
+                'title': sentence[:60],
+                'due_date': 'friday',
+                'category': 'work',
+                'action': 'add',
+                'updated_fields': {}
+            },
+            'confirmation_message': 'Your task has been updated successfully!'
+        }
+
+    def _structured_command(self, sentence):
+        legacy = self._answer(sentence)
+        if 'meeting_details' in legacy:
+            return {'intent': 'create_meeting', 'text': sentence, 'meeting': legacy['meeting_details']}
+        task = legacy['task_details']
+        return {'intent': 'add_task', 'text': sentence, 'task': {'title': task['title'], 'due_date': task['due_date']}}
+
+    def _structured_answer(self, sentence):
+        # "X and also Y" stands in for a compound request: one command per part.
+        return {'commands': [self._structured_command(part) for part in sentence.split(' and also ')]}
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            self.prompt_bytes += len(prompt.encode('utf-8'))
+        structured = bool(generation_config and generation_config.get('response_schema'))
+        answer = self._structured_answer if structured else self._answer
+        numbered = re.findall(r'^\s*\d+\. (".*")\s*$', prompt, re.MULTILINE)
+        if numbered:
+            text = json.dumps([answer(json.loads(s)) for s in numbered])
+        else:
+            match = re.search(r'Sentence: "(.*)"', prompt, re.DOTALL)
+            sentence = match.group(1) if match else prompt
+            if structured and match:
+                sentence = json.loads(f'"{sentence}"')
+            text = json.dumps(answer(sentence))
+        if stream:
+            return [StubResponse(text[i:i + self.CHUNK_SIZE]) for i in range(0, len(text), self.CHUNK_SIZE)]
+        return StubResponse(text)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        sink = self.server.sink
+        with sink._lock:
+            sink.connections += 1
+        self._reply("220 sink.local ESMTP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.wfile.write(b"250-sink.local\r\n250-8BITMIME\r\n250 SIZE 52428800\r\n")
+            elif command.startswith('DATA'):
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data_line)
+                if sink.latency:
+                    time.sleep(sink.latency)
+                with sink._lock:
+                    sink.messages += 1
+                    sink.bytes += size
+                self._reply("250 OK queued")
+            elif command.startswith('RCPT') and any(address in command for address in sink.refused):
+                self._reply("550 5.1.1 No such user")
+            elif command.startswith('QUIT'):
+                self._reply("221 Bye")
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP and anything else are accepted as-is.
+                self._reply("250 OK")
+
+
+class SMTPSink:
+    # Plain-SMTP server on localhost that counts and discards messages.
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+        self.bytes = 0
+        # Upper-cased addresses whose RCPT is answered with a permanent 550.
+        self.refused = set()
+        self._lock = threading.Lock()
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((host, port), _SMTPHandler)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.connections = self.messages = self.bytes = 0
@@ -0,0 +1,229 @@
+# benchmarks/run_benchmarks.py
+# Offline workloads against the fakes in fakes.py:
+#   python benchmarks/run_benchmarks.py [--only NAME ...] [--json results.json]
+import argparse
+import datetime
+import gc
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='scheduler-bench-')
+
+# Module-level settings are read at import time, so point every store at a
+# scratch directory and at the local sinks before importing the app.
+os.environ.update({
+    'MIRROR_DB': os.path.join(WORKDIR, 'mirror.db'),
+    'LLM_CACHE_DB': os.path.join(WORKDIR, 'llm_cache.db'),
+    'JOB_QUEUE_DB': os.path.join(WORKDIR, 'jobs.db'),
+    'CREDENTIAL_DIR': os.path.join(WORKDIR, 'credentials'),
+    'GOOGLE_API_KEY': os.environ.get('GOOGLE_API_KEY', 'offline'),
+    'EMAIL_ADDRESS': 'scheduler@example.com',
+    'EMAIL_PASSWORD': '',
+    'EMAIL_HOST': '127.0.0.1',
+    'EMAIL_STARTTLS': 'false',
+    # Executor limits are pinned so runs compare across changes to the
+    # defaults; time spent waiting on them is reported as throttle_ms.
+    'CALENDAR_QPS': os.environ.get('CALENDAR_QPS', '10'),
+    'CALENDAR_BURST': os.environ.get('CALENDAR_BURST', '600'),
+    'TASKS_QPS': os.environ.get('TASKS_QPS', '10'),
+    'TASKS_BURST': os.environ.get('TASKS_BURST', '600'),
+})
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeGoogleBackend, SMTPSink, StubModel  # noqa: E402
+
+SMTP_SINK = SMTPSink().start()
+os.environ['EMAIL_PORT'] = str(SMTP_SINK.port)
+
+import google_clients  # noqa: E402
+import metrics  # noqa: E402
+import prompt_parser  # noqa: E402
+
+BACKEND = FakeGoogleBackend()
+STUB_MODEL = StubModel()
+google_clients.install_transport(BACKEND.transport)
+prompt_parser.model = STUB_MODEL
+
+
+def _reset_state():
+    # Each workload starts from an empty mirror, agenda and fresh clients.
+    import agenda
+    import calendar_utils
+    import mirror
+    import task_utils
+
+    google_clients.reset_services()
+    mirror._mirrors.clear()
+    agenda._agendas.clear()
+    agenda._channels.clear()
+    calendar_utils._event_indexes.clear()
+    task_utils._task_indexes.clear()
+    for name in os.listdir(WORKDIR):
+        if name.startswith('mirror'):
+            os.remove(os.path.join(WORKDIR, name))
+
+
+class Measurement:
+    def __init__(self, name):
+        self.name = name
+        self.samples = {}
+
+    def measure(self, label, func, *args, **kwargs):
+        BACKEND.reset_counters()
+        SMTP_SINK.reset_counters()
+        metrics.metrics.reset()
+        STUB_MODEL.calls = STUB_MODEL.prompt_bytes = 0
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot = metrics.snapshot()
+        counters = snapshot['counters']
+        throttle = snapshot['timers'].get('api.throttle')
+        # Summed over threads, so concurrent waits can exceed the wall time.
+        throttle_ms = throttle['avg_ms'] * throttle['count'] if throttle else 0.0
+        self.samples[label] = {
+            'latency_ms': round(elapsed_ms, 2),
+            'throttle_ms': round(throttle_ms, 2),
+            'unthrottled_ms': round(max(0.0, elapsed_ms - throttle_ms), 2),
+            'http_requests': BACKEND.http_requests,
+            'api_calls': {key: count for key, count in sorted(BACKEND.calls.items())},
+            'api_retries': sum(v for k, v in counters.items() if k.startswith('api.retries')),
+            'bytes_in': BACKEND.bytes_in,
+            'model_calls': STUB_MODEL.calls,
+            'model_prompt_bytes': STUB_MODEL.prompt_bytes,
+            'smtp_connections': SMTP_SINK.connections,
+            'smtp_messages': SMTP_SINK.messages,
+            'peak_alloc_mb': round(peak / 2 ** 20, 2),
+        }
+        return result
+
+
+def bench_daily_summary(events=10_000):
+    from async_engine import daily_summary_async, run
+
+    _reset_state()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    BACKEND.events.clear()
+    # Spread over roughly ±60 days so "today" holds a realistic handful.
+    BACKEND.seed_events(events, now - datetime.timedelta(days=60), spacing=datetime.timedelta(days=120) / events)
+    BACKEND.seed_tasks(500, now - datetime.timedelta(days=5))
+
+    result = Measurement(f"daily_summary_{events}_events")
+    cold = result.measure('cold', lambda: run(daily_summary_async()))
+    result.measure('warm', lambda: run(daily_summary_async()))
+    result.samples['cold']['events_today'] = len(cold['events'])
+    return result
+
+
+def bench_bulk_tasks(count=500):
+    import bulk
+
+    _reset_state()
+    lines = "\n".join(f"add task file expense report {i} by friday" for i in range(count)) + "\n"
+    result = Measurement(f"bulk_import_{count}_tasks")
+    out = io.StringIO()
+    totals = result.measure('apply', bulk.run_bulk, io.StringIO(lines), out)
+    result.samples['apply'].update(totals)
+    return result
+
+
+def bench_large_invite(attendees=200):
+    from calendar_utils import create_event
+    from email_utils import get_mail_queue, send_confirmation_email
+
+    _reset_state()
+    details = {
+        'purpose': 'All hands',
+        'description': 'Quarterly all hands',
+        'platform': 'Google Meet',
+        'date_time': 'tomorrow at 4pm',
+        'attendees': [f"member{i}@example.com" for i in range(attendees)],
+    }
+
+    def invite():
+        link = create_event(details)
+        send_confirmation_email(details, link, wait=True)
+        return link
+
+    result = Measurement(f"invite_{attendees}_attendees")
+    result.measure('create_and_email', invite)
+    get_mail_queue().flush(timeout=30)
+    return result
+
+
+def bench_model_parse(prompts=200, model_latency=0.05):
+    from prompt_parser import extract_meeting_details, extract_meeting_details_batch
+
+    sentences = [f"set up a meet with client{i}@example.com to review launch {i}" for i in range(prompts)]
+    STUB_MODEL.latency = model_latency
+    mode = prompt_parser.EXTRACTOR_MODE
+    result = Measurement(f"parse_{prompts}_prompts")
+    try:
+        result.measure('sequential_cold', lambda: [extract_meeting_details(s) for s in sentences])
+        result.measure('sequential_cached', lambda: [extract_meeting_details(s) for s in sentences])
+        result.measure('batched_uncached', extract_meeting_details_batch, sentences, use_cache=False)
+        # Same uncached batch with the full instruction block in every request.
+        prompt_parser.EXTRACTOR_MODE = 'legacy'
+        result.measure('batched_legacy', extract_meeting_details_batch, sentences, use_cache=False)
+    finally:
+        prompt_parser.EXTRACTOR_MODE = mode
+        STUB_MODEL.latency = 0.0
+    return result
+
+
+WORKLOADS = {
+    'daily_summary': bench_daily_summary,
+    'bulk_tasks': bench_bulk_tasks,
+    'large_invite': bench_large_invite,
+    'model_parse': bench_model_parse,
+}
+
+
+def print_report(results):
+    for result in results:
+        print(f"\n== {result.name}")
+        for label, sample in result.samples.items():
+            calls = ', '.join(f"{k}={v}" for k, v in sample['api_calls'].items()) or '-'
+            print(
+                f"  {label:<18} {sample['latency_ms']:>10.1f} ms  ({sample['unthrottled_ms']:.1f} ms unthrottled)  http={sample['http_requests']:<5} "
+                f"model={sample['model_calls']:<4} prompt={sample['model_prompt_bytes']:<7} smtp={sample['smtp_connections']}/{sample['smtp_messages']}  "
+                f"peak={sample['peak_alloc_mb']} MB"
+            )
+            print(f"  {'':<18} calls: {calls}")
+    print(f"\nmax RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run offline scheduler benchmarks.")
+    parser.add_argument('--only', nargs='*', choices=sorted(WORKLOADS), help="workloads to run (default: all)")
+    parser.add_argument('--latency', type=float, default=0.0, help="simulated Google API round trip, seconds")
+    parser.add_argument('--json', metavar='PATH', help="also write results as JSON")
+    args = parser.parse_args(argv)
+
+    BACKEND.latency = args.latency
+    results = []
+    try:
+        for name in args.only or WORKLOADS:
+            results.append(WORKLOADS[name]())
+    finally:
+        SMTP_SINK.stop()
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({result.name: result.samples for result in results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
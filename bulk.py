@@ -0,0 +1,145 @@
+# bulk.py
+import argparse
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from async_engine import execute_command, is_batchable
+from batch_utils import create_batched
+from prompt_parser import extract_meeting_details_batch
+
+PARSE_WORKERS = 4
+APPLY_WORKERS = 8
+LLM_BATCH_SIZE = 10
+WINDOW_SIZE = 200
+
+
+def read_commands(stream):
+    for line_no, line in enumerate(stream, 1):
+        text = line.strip()
+        if not text or text.startswith('#'):
+            continue
+        if text.startswith('{'):
+            try:
+                record = json.loads(text)
+            except json.JSONDecodeError as e:
+                yield line_no, None, {'_error': f"Invalid JSON: {e}"}
+                continue
+            prompt = record.get('prompt')
+            if prompt is not None and not isinstance(prompt, str):
+                yield line_no, None, {**record, '_error': "'prompt' must be a string"}
+                continue
+            yield line_no, (prompt or '').strip(), record
+        else:
+            yield line_no, text, {}
+
+
+def _windows(commands, size):
+    window = []
+    for command in commands:
+        window.append(command)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def parse_window(window, parse_workers=PARSE_WORKERS, llm_batch_size=LLM_BATCH_SIZE):
+    prompts = [(line_no, prompt) for line_no, prompt, meta in window if prompt and '_error' not in meta]
+    groups = [prompts[i:i + llm_batch_size] for i in range(0, len(prompts), llm_batch_size)]
+    parsed = {}
+    with ThreadPoolExecutor(max_workers=parse_workers) as pool:
+        for group, results in zip(groups, pool.map(lambda g: extract_meeting_details_batch([p for _, p in g]), groups)):
+            for (line_no, _), result in zip(group, results):
+                parsed[line_no] = result
+    return parsed
+
+
+def apply_window(window, parsed, apply_workers=APPLY_WORKERS, user=None):
+    # Yields each line's status as soon as it is known: failed parses first,
+    # then commands as they finish, in no particular order.
+    statuses = {}
+    batched = {}
+    pooled = []
+
+    for line_no, prompt, meta in window:
+        status = {'line': line_no, 'prompt': prompt}
+        if meta.get('id') is not None:
+            status['id'] = meta['id']
+        statuses[line_no] = status
+
+        if '_error' in meta or not prompt:
+            status.update(status='invalid', error=meta.get('_error', "Missing prompt"))
+            yield status
+            continue
+        result = parsed.get(line_no)
+        if isinstance(result, Exception) or not result:
+            status.update(status='error', error=str(result) if result else "Failed to parse input.")
+            yield status
+            continue
+
+        if is_batchable(result, prompt):
+            batched[line_no] = result
+        else:
+            pooled.append((line_no, prompt, result))
+
+    with ThreadPoolExecutor(max_workers=apply_workers) as pool:
+        futures = {
+            pool.submit(execute_command, result, prompt, user): line_no
+            for line_no, prompt, result in pooled
+        }
+        if batched:
+            # The batched creates come back together, when their batch does.
+            futures[pool.submit(create_batched, batched, user)] = None
+        for future in as_completed(futures):
+            line_no = futures[future]
+            if line_no is None:
+                try:
+                    outcomes = future.result()
+                except Exception as e:
+                    outcomes = {line_no: {'status': 'error', 'error': str(e)} for line_no in batched}
+                for line_no, outcome in outcomes.items():
+                    statuses[line_no].update(outcome)
+                    yield statuses[line_no]
+                continue
+            try:
+                statuses[line_no].update(future.result())
+            except Exception as e:
+                statuses[line_no].update(status='error', error=str(e))
+            yield statuses[line_no]
+
+
+def run_bulk(stream, out, parse_workers=PARSE_WORKERS, apply_workers=APPLY_WORKERS,
+             llm_batch_size=LLM_BATCH_SIZE, window_size=WINDOW_SIZE, user=None):
+    totals = {'ok': 0, 'failed': 0}
+    for window in _windows(read_commands(stream), window_size):
+        parsed = parse_window(window, parse_workers, llm_batch_size)
+        for status in apply_window(window, parsed, apply_workers, user):
+            totals['ok' if status.get('status') == 'ok' else 'failed'] += 1
+            out.write(json.dumps(status, default=str) + "\n")
+            out.flush()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply scheduling commands in bulk (one per line, or JSONL with a 'prompt' field).")
+    parser.add_argument('path', nargs='?', default='-', help="input file, or - for stdin")
+    parser.add_argument('--parse-workers', type=int, default=PARSE_WORKERS)
+    parser.add_argument('--apply-workers', type=int, default=APPLY_WORKERS)
+    parser.add_argument('--llm-batch-size', type=int, default=LLM_BATCH_SIZE)
+    parser.add_argument('--window', type=int, default=WINDOW_SIZE)
+    parser.add_argument('--user', help="apply the commands as this user (default: DEFAULT_USER_ID)")
+    args = parser.parse_args(argv)
+
+    stream = sys.stdin if args.path == '-' else open(args.path, encoding='utf-8')
+    try:
+        totals = run_bulk(stream, sys.stdout, args.parse_workers, args.apply_workers, args.llm_batch_size, args.window, args.user)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print(f"✅ {totals['ok']} succeeded, ❌ {totals['failed']} failed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
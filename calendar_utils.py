@@ -1,58 +1,84 @@
-import os
-import pickle
 import datetime
-import parsedatetime as pdt
+import os
 import re
+import uuid
 import pytz
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from datetime_utils import get_user_timezone, resolve_datetime, timezone_name
+from api_executor import execute
+from google_clients import get_service
+from mirror import get_mirror, utc_now_string
+from pagination import EVENT_LIST_FIELDS, iter_items
+from recurrence import (
+    MAX_OCCURRENCES,
+    days_until_weekday,
+    find_conflicts,
+    first_occurrence,
+    occurrences,
+    strip_recurrence,
+    to_rules,
+    weekday_index
+)
+from search_index import EventIndex
+from slot_finder import find_slots, first_available_start
+from user_context import get_user_context
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
-
-def get_calendar_service():
-    creds = None
-    if os.path.exists('token.pkl'):
-        with open('token.pkl', 'rb') as token:
-            creds = pickle.load(token)
-    if not creds or not creds.valid:
-        flow = InstalledAppFlow.from_client_secrets_file('oauth_credentials.json', SCOPES)
-        creds = flow.run_local_server(port=0)
-        with open('token.pkl', 'wb') as token:
-            pickle.dump(creds, token)
-    return build('calendar', 'v3', credentials=creds)
-
-def parse_datetime(natural_datetime):
-    cal = pdt.Calendar()
-    time_struct, parse_status = cal.parse(natural_datetime)
-
-    if not time_struct or time_struct.tm_year == 1900:
-        raise ValueError(f"Could not parse datetime: '{natural_datetime}'")
-
-    dt = datetime.datetime(*time_struct[:6])
-
-    # If no time was provided, default to 10 AM
-    if (time_struct.tm_hour == 0 and time_struct.tm_min == 0) and (
-        'at' not in natural_datetime.lower()
-    ):
-        dt = dt.replace(hour=10, minute=0)
-
-    # Localize to Asia/Kolkata
-    india_tz = pytz.timezone('Asia/Kolkata')
-    localized_dt = india_tz.localize(dt)
-
-    return localized_dt
+# Move new and rescheduled meetings to the first slot every attendee has free.
+AVOID_CONFLICTS = os.getenv("AVOID_CONFLICTS", "false").lower() == "true"
+DEFAULT_DURATION_MINUTES = 60
+# Matches scoring within this of the best one make a lookup ambiguous.
+AMBIGUITY_MARGIN = 0.1
+# Range operations without an explicit end look this far ahead.
+RANGE_HORIZON_DAYS = 28
+BULK_OPERATIONS = ('reschedule', 'cancel', 'extend')
+
+# user_id -> (EventIndex, mirror generation it was built from)
+_event_indexes = {}
+
+def get_calendar_service(user=None):
+    return get_service('calendar', 'v3', SCOPES, get_user_context(user).user_id)
+
+def iter_events(fields=EVENT_LIST_FIELDS, user=None, **params):
+    params.setdefault('calendarId', get_user_context(user).calendar_id)
+    params.setdefault('singleEvents', True)
+    params.setdefault('maxResults', 250)
+    return iter_items(get_calendar_service(user).events(), fields, **params)
+
+def refresh_event_mirror(user=None):
+    context = get_user_context(user)
+    return get_mirror(context.user_id).sync_events(get_calendar_service(context), context.calendar_id)
+
+def get_event_index(user=None):
+    context = get_user_context(user)
+    mirror = get_mirror(context.user_id)
+    changed, removed = refresh_event_mirror(context)
+    generation = mirror.generations.get(f"events:{context.calendar_id}")
+    index, index_generation = _event_indexes.get(context.user_id, (None, None))
+    if index is None or generation != index_generation:
+        index = EventIndex()
+        index.apply(mirror.events_between(calendar_id=context.calendar_id))
+        _event_indexes[context.user_id] = (index, generation)
+    else:
+        index.apply(changed, removed)
+    return index
 
 def extract_email(email_string):
     match = re.search(r'[\w\.-]+@[\w\.-]+', email_string)
     return match.group() if match else None
 
-def create_event(details, include_meet=True):
+def _event_interval(event):
+    start = event['start'].get('dateTime', event['start'].get('date'))
+    end = event['end'].get('dateTime', event['end'].get('date'))
+    return (
+        datetime.datetime.fromisoformat(start.replace('Z', '+00:00')),
+        datetime.datetime.fromisoformat(end.replace('Z', '+00:00'))
+    )
+
+def build_event_body(details, include_meet=True, avoid_conflicts=None, user=None):
     if 'date_time' not in details:
         raise ValueError("Missing 'date_time' in details")
 
-    start_time = parse_datetime(details['date_time'])
-    end_time = start_time + datetime.timedelta(hours=1)
-
     attendees = []
     for attendee in details.get('attendees', []):
         email = extract_email(attendee)
@@ -62,140 +88,422 @@ def create_event(details, include_meet=True):
     if not attendees:
         raise ValueError("No valid attendee emails found.")
 
+    duration_minutes = int(details.get('duration_minutes') or DEFAULT_DURATION_MINUTES)
+    context = get_user_context(user)
+    rules = to_rules(details['recurrence'], context.user_id) if details.get('recurrence') else None
+    if rules:
+        # "every weekday at 9am" -> first weekday at 9am; series conflicts are
+        # reported by preview_series rather than moved around.
+        phrase = strip_recurrence(details['date_time']) or 'today'
+        start_time = first_occurrence(rules, resolve_datetime(phrase, user_id=context.user_id))
+    else:
+        start_time = resolve_datetime(details['date_time'], user_id=context.user_id)
+    if not rules and (AVOID_CONFLICTS if avoid_conflicts is None else avoid_conflicts):
+        start_time = first_available_start(
+            get_calendar_service(context),
+            [a['email'] for a in attendees],
+            start_time,
+            duration_minutes
+        )
+    end_time = start_time + datetime.timedelta(minutes=duration_minutes)
+
     event = {
+        # Client-chosen ID makes the insert idempotent: a retried insert that
+        # already landed fails with 409 instead of creating a duplicate.
+        'id': details.get('event_id') or uuid.uuid4().hex,
         'summary': details['purpose'],
         'description': f"{details['description']}\nPlatform: {details['platform']}",
-        'start': {'dateTime': start_time.isoformat(), 'timeZone': 'Asia/Kolkata'},
-        'end': {'dateTime': end_time.isoformat(), 'timeZone': 'Asia/Kolkata'},
+        'start': {'dateTime': start_time.isoformat(), 'timeZone': timezone_name(start_time)},
+        'end': {'dateTime': end_time.isoformat(), 'timeZone': timezone_name(end_time)},
         'attendees': attendees
     }
+    if rules:
+        event['recurrence'] = rules
 
     if include_meet:
+        # Must be unique per event, including events created in the same batch.
         event['conferenceData'] = {
             'createRequest': {
-                'requestId': f"smart-scheduler-{int(datetime.datetime.now().timestamp())}",
+                'requestId': f"smart-scheduler-{uuid.uuid4().hex}",
                 'conferenceSolutionKey': {'type': 'hangoutsMeet'}
             }
         }
 
-    service = get_calendar_service()
+    return event
 
-    created_event = service.events().insert(
-        calendarId='primary',
+def insert_event_request(service, event, calendar_id='primary'):
+    return service.events().insert(
+        calendarId=calendar_id,
         body=event,
         conferenceDataVersion=1,
         sendUpdates='all'
-    ).execute()
+    )
 
-    return created_event.get('htmlLink')
+def delete_event_request(service, event_id, calendar_id='primary'):
+    return service.events().delete(
+        calendarId=calendar_id,
+        eventId=event_id,
+        sendUpdates='all'
+    )
 
-def find_event_by_email_and_purpose(attendee_email, purpose_keyword):
-    service = get_calendar_service()
-    now = datetime.datetime.utcnow().isoformat() + 'Z'
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=now,
-        maxResults=100,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-
-    for event in events_result.get('items', []):
-        if purpose_keyword.lower() in event.get('summary', '').lower():
-            for a in event.get('attendees', []):
-                if a.get('email') == attendee_email:
-                    return event
-
-    return None
-
-def reschedule_event_by_email_and_purpose(attendee_email, purpose_keyword, new_datetime):
-    service = get_calendar_service()
-
-    old_event = find_event_by_email_and_purpose(attendee_email, purpose_keyword)
-    if not old_event:
-        raise ValueError("No matching event found for the given attendee and purpose.")
+def create_event(details, include_meet=True, avoid_conflicts=None, user=None):
+    context = get_user_context(user)
+    event = build_event_body(details, include_meet, avoid_conflicts, context)
+    service = get_calendar_service(context)
+    try:
+        created_event = execute(insert_event_request(service, event, context.calendar_id))
+    except HttpError as e:
+        if e.resp.status != 409:
+            raise
+        created_event = execute(service.events().get(calendarId=context.calendar_id, eventId=event['id']))
+    if created_event.get('recurrence'):
+        # The mirror holds single instances; a delta sync fetches the new ones.
+        refresh_event_mirror(context)
+    else:
+        get_mirror(context.user_id).upsert_events([created_event], context.calendar_id)
+    return created_event.get('htmlLink')
 
-    new_start = parse_datetime(new_datetime)
-    new_end = new_start + datetime.timedelta(hours=1)
+def search_events(attendee_email, purpose_keyword, limit=5, user=None):
+    email = extract_email(attendee_email or '')
+    return get_event_index(user).search(
+        attendee_email=email,
+        purpose=purpose_keyword,
+        after=utc_now_string(),
+        limit=limit
+    )
+
+class AmbiguousEventError(ValueError):
+    def __init__(self, query, candidates):
+        super().__init__(f"Several meetings match '{query}'; please be more specific.")
+        self.query = query
+        self.candidates = candidates
+
+def _series_id(event):
+    return event.get('recurringEventId') or event['id']
+
+def is_ambiguous(candidates):
+    # Close scores for different meetings; upcoming instances of one series
+    # are not ambiguous, the next one is meant.
+    if len(candidates) < 2:
+        return False
+    best_score, best = candidates[0]
+    return any(
+        best_score - score < AMBIGUITY_MARGIN and _series_id(event) != _series_id(best)
+        for score, event in candidates[1:]
+    )
+
+def find_event_by_email_and_purpose(attendee_email, purpose_keyword, user=None):
+    matches = search_events(attendee_email, purpose_keyword, user=user)
+    if is_ambiguous(matches):
+        raise AmbiguousEventError(purpose_keyword, [event for _, event in matches])
+    return matches[0][1] if matches else None
+
+def patch_event_request(service, event_id, changes, etag=None, calendar_id='primary'):
+    request = service.events().patch(
+        calendarId=calendar_id,
+        eventId=event_id,
+        body=changes,
+        sendUpdates='all'
+    )
+    if etag:
+        # Fail with 412 instead of overwriting someone else's concurrent edit.
+        request.headers['If-Match'] = etag
+    return request
+
+def build_reschedule_changes(event, new_datetime, avoid_conflicts=None, user=None):
+    context = get_user_context(user)
+    old_start, old_end = _event_interval(event)
+    duration = old_end - old_start
+    new_start = resolve_datetime(new_datetime, user_id=context.user_id)
+    if AVOID_CONFLICTS if avoid_conflicts is None else avoid_conflicts:
+        # The meeting being moved must not block its own new slot.
+        new_start = first_available_start(
+            get_calendar_service(context),
+            [a['email'] for a in event.get('attendees', [])],
+            new_start,
+            int(duration.total_seconds() // 60),
+            exclude={(old_start, old_end)}
+        )
+    new_end = new_start + duration
+    return {
+        'start': {'dateTime': new_start.isoformat(), 'timeZone': timezone_name(new_start)},
+        'end': {'dateTime': new_end.isoformat(), 'timeZone': timezone_name(new_end)}
+    }
 
-    event_id = old_event['id']
+def _is_precondition_failure(error):
+    return isinstance(error, HttpError) and error.resp.status == 412
 
-    updated_event = {
-        'summary': old_event['summary'],
-        'description': old_event.get('description', ''),
-        'start': {'dateTime': new_start.isoformat(), 'timeZone': 'Asia/Kolkata'},
-        'end': {'dateTime': new_end.isoformat(), 'timeZone': 'Asia/Kolkata'},
-        'attendees': old_event.get('attendees', []),
-        'conferenceData': old_event.get('conferenceData', {})
-    }
+class EditConflictError(ValueError):
+    pass
 
-    updated = service.events().update(
-        calendarId='primary',
-        eventId=event_id,
-        body=updated_event,
-        sendUpdates='all',
-        conferenceDataVersion=1
-    ).execute()
+def _same_times(event, current):
+    return _event_interval(event) == _event_interval(current)
 
-    return updated.get('htmlLink')
+def _conflict(event_id):
+    return EditConflictError(f"Event {event_id} was moved by someone else; not overwriting their change.")
 
-def delete_event(event_id):
+def reschedule_event(event, new_datetime, avoid_conflicts=None, user=None):
+    context = get_user_context(user)
+    service = get_calendar_service(context)
+    changes = build_reschedule_changes(event, new_datetime, avoid_conflicts, context)
+    calendar_id = context.calendar_id
     try:
-        service = get_calendar_service()
-        service.events().delete(
-            calendarId='primary',
-            eventId=event_id,
-            sendUpdates='all'
-        ).execute()
-        print(f"Deleted event: {event_id}")
-    except Exception as e:
-        print(f"Failed to delete event: {e}")
+        updated = execute(patch_event_request(service, event['id'], changes, event.get('etag'), calendar_id))
+    except HttpError as e:
+        if not _is_precondition_failure(e):
+            raise
+        # Someone edited the event since we mirrored it. Their edit is kept
+        # only if it left the time alone; a concurrent move is reported.
+        current = execute(service.events().get(calendarId=calendar_id, eventId=event['id']))
+        if not _same_times(event, current):
+            get_mirror(context.user_id).upsert_events([current], calendar_id)
+            raise _conflict(event['id'])
+        updated = execute(patch_event_request(service, event['id'], changes, current.get('etag'), calendar_id))
+    get_mirror(context.user_id).upsert_events([updated], calendar_id)
+    return updated
+
+def reschedule_event_by_email_and_purpose(attendee_email, purpose_keyword, new_datetime, avoid_conflicts=None, user=None):
+    old_event = find_event_by_email_and_purpose(attendee_email, purpose_keyword, user)
+    if not old_event:
+        raise ValueError("No matching event found for the given attendee and purpose.")
 
-def force_reschedule_by_email_and_purpose(attendee_email, purpose_keyword, new_datetime):
-    service = get_calendar_service()
+    return reschedule_event(old_event, new_datetime, avoid_conflicts, user).get('htmlLink')
 
-    old_event = find_event_by_email_and_purpose(attendee_email, purpose_keyword)
-    if not old_event:
-        raise ValueError("No matching event found.")
+def reschedule_event_by_id(event_id, new_datetime, avoid_conflicts=None, user=None):
+    # For follow-ups on an event we already know: no search, and the mirror usually has it.
+    context = get_user_context(user)
+    event = get_mirror(context.user_id).get_event(event_id, context.calendar_id)
+    if event is None:
+        event = execute(get_calendar_service(context).events().get(calendarId=context.calendar_id, eventId=event_id))
+    return reschedule_event(event, new_datetime, avoid_conflicts, context).get('htmlLink')
 
+def patch_events(events, changes, user=None):
+    # Applies changes[event_id] to each event in server-side batches. Edits
+    # that lost an ETag race are retried once if the other edit left the
+    # time alone, and reported as conflicts otherwise. Returns {event_id: BatchResult}.
+    from batch_utils import BatchPipeline, BatchResult
+
+    context = get_user_context(user)
+    pipeline = BatchPipeline(user=context)
+    for event in events:
+        pipeline.patch_event(event['id'], changes[event['id']], etag=event.get('etag'), key=event['id'])
+    results = pipeline.execute()
+
+    stale = [key for key, result in results.items() if _is_precondition_failure(result.error)]
+    if stale:
+        by_id = {event['id']: event for event in events}
+        service = get_calendar_service(context)
+        retry = BatchPipeline(user=context)
+        for event_id in stale:
+            current = execute(service.events().get(calendarId=context.calendar_id, eventId=event_id))
+            if _same_times(by_id[event_id], current):
+                retry.patch_event(event_id, changes[event_id], etag=current.get('etag'), key=event_id)
+            else:
+                results[event_id] = BatchResult(event_id, error=_conflict(event_id), attempts=results[event_id].attempts)
+        if len(retry):
+            results.update(retry.execute())
+
+    get_mirror(context.user_id).upsert_events(
+        [result.response for result in results.values() if result.ok],
+        context.calendar_id
+    )
+    return results
+
+def cancel_events(events, user=None):
+    from batch_utils import BatchPipeline
+
+    context = get_user_context(user)
+    pipeline = BatchPipeline(user=context)
+    for event in events:
+        pipeline.delete_event(event['id'], key=event['id'])
+    results = pipeline.execute()
+    # Already gone counts as cancelled.
+    gone = [
+        key for key, result in results.items()
+        if result.ok or (isinstance(result.error, HttpError) and result.error.resp.status in (404, 410))
+    ]
+    get_mirror(context.user_id).remove_events(gone, context.calendar_id)
+    return results
+
+def delete_event(event_id, user=None):
     try:
-        delete_event(old_event['id'])
+        context = get_user_context(user)
+        service = get_calendar_service(context)
+        execute(delete_event_request(service, event_id, context.calendar_id))
+        get_mirror(context.user_id).remove_events([event_id], context.calendar_id)
+        print(f"Deleted event: {event_id}")
     except Exception as e:
-        print(f"Couldn't delete old event: {e}")
-
-    description_lines = old_event.get('description', '').split('\n')
-    details = {
-        'purpose': old_event['summary'],
-        'description': description_lines[0] if description_lines else "",
-        'platform': "Google Meet",
-        'date_time': new_datetime,
-        'attendees': [a['email'] for a in old_event.get('attendees', [])]
-    }
+        print(f"Failed to delete event: {e}")
 
-    link = create_event(details)
-    print(f"Rescheduled event link: {link}")
-    return link
+def find_meeting_slots(attendees, duration_minutes=DEFAULT_DURATION_MINUTES, earliest=None, limit=3, user=None):
+    # The first slots, in working hours, that every attendee has free; one
+    # freeBusy query covers all of them.
+    context = get_user_context(user)
+    emails = [email for email in (extract_email(a) for a in attendees) if email]
+    return find_slots(
+        get_calendar_service(context),
+        emails,
+        duration_minutes,
+        earliest=earliest,
+        limit=limit,
+        tz=get_user_timezone(context.user_id)
+    )
+
+def _upcoming_reminders(context):
+    mirror = get_mirror(context.user_id)
+    if mirror.has_synced(f"events:{context.calendar_id}"):
+        refresh_event_mirror(context)
+        return mirror.upcoming_events(context.calendar_id, summary_prefix="Reminder:")
+    # Not mirrored yet: page through only the matching upcoming events
+    # rather than syncing the whole calendar for one read.
+    events = iter_events(
+        user=context, q="Reminder:", timeMin=utc_now_string(), orderBy='startTime'
+    )
+    return (event for event in events if event.get('summary', '').startswith("Reminder:"))
+
+def get_task_reminder_events(user=None):
+    context = get_user_context(user)
+    task_reminders = []
+    for event in _upcoming_reminders(context):
+        summary = event.get("summary", "")
+        title = summary.replace("Reminder:", "").strip()
+        start_time = event['start'].get('dateTime', event['start'].get('date'))
+        task_reminders.append((title, start_time))
 
-def get_task_reminder_events():
-    service = get_calendar_service()
-    now = datetime.datetime.utcnow().isoformat() + 'Z'
+    return task_reminders
 
-    events_result = service.events().list(
-        calendarId='primary',
-        timeMin=now,
-        maxResults=20,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
 
-    events = events_result.get('items', [])
+def preview_series(details, limit=10, user=None):
+    # Expands a recurring meeting locally and checks every occurrence against
+    # the mirrored calendar, without creating anything.
+    context = get_user_context(user)
+    event = build_event_body(details, include_meet=False, avoid_conflicts=False, user=context)
+    start, end = _event_interval(event)
+    if event.get('recurrence'):
+        intervals = [(s, s + (end - start)) for s in occurrences(event['recurrence'], start, limit=MAX_OCCURRENCES)]
+    else:
+        intervals = [(start, end)]
+
+    conflicts = []
+    if intervals:
+        refresh_event_mirror(context)
+        busy = []
+        for existing in get_mirror(context.user_id).events_between(
+            intervals[0][0].isoformat(), intervals[-1][1].isoformat(), context.calendar_id
+        ):
+            # All-day events rarely block a meeting.
+            if 'dateTime' in existing['start']:
+                busy.append((*_event_interval(existing), existing))
+        conflicts = find_conflicts(intervals, busy)
+
+    return {
+        'recurrence': event.get('recurrence'),
+        'occurrences': [s.isoformat() for s, _ in intervals[:limit]],
+        'total': len(intervals),
+        'conflicts': [
+            {'start': s.isoformat(), 'event_id': other['id'], 'summary': other.get('summary', '')}
+            for (s, _), other in conflicts
+        ]
+    }
 
-    task_reminders = []
-    for event in events:
-        summary = event.get("summary", "")
-        if summary.startswith("Reminder:"):
-            title = summary.replace("Reminder:", "").strip()
-            start_time = event['start'].get('dateTime', event['start'].get('date'))
-            task_reminders.append((title, start_time))
+def _day_bound(value, tz, end_of_day=False):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    day = resolve_datetime(value, tz=tz).replace(hour=0, minute=0, second=0, microsecond=0)
+    return day + datetime.timedelta(days=1) if end_of_day else day
+
+def select_events(start=None, end=None, weekday=None, purpose=None, attendee=None, user=None):
+    # Timed events in [start, end) matching every given filter, from the mirror.
+    # start/end may be datetimes or phrases ("next monday"), taken as whole days.
+    context = get_user_context(user)
+    tz = get_user_timezone(context.user_id)
+    start = _day_bound(start, tz) or datetime.datetime.now(tz)
+    end = _day_bound(end, tz, end_of_day=True) or start + datetime.timedelta(days=RANGE_HORIZON_DAYS)
+    day = weekday_index(weekday) if weekday else None
+    email = (extract_email(attendee or '') or '').lower()
+    purpose = (purpose or '').lower()
+
+    refresh_event_mirror(context)
+    selected = []
+    for event in get_mirror(context.user_id).events_between(start.isoformat(), end.isoformat(), context.calendar_id):
+        if 'dateTime' not in event['start']:
+            continue
+        if day is not None and _event_interval(event)[0].astimezone(tz).weekday() != day:
+            continue
+        if purpose and purpose not in event.get('summary', '').lower():
+            continue
+        if email and email not in {a.get('email', '').lower() for a in event.get('attendees', [])}:
+            continue
+        selected.append(event)
+    return selected
+
+def shift_event_changes(event, days=0, minutes=0, to_weekday=None, extend_minutes=0, tz=None):
+    # Moves on wall-clock time in the event's own timezone, so a 9:00 meeting
+    # moved across a DST change still starts at 9:00.
+    name = event['start'].get('timeZone')
+    tz = pytz.timezone(name) if name in pytz.all_timezones_set else tz or pytz.utc
+    start, end = _event_interval(event)
+    local = start.astimezone(tz)
+    if to_weekday is not None:
+        days += days_until_weekday(local.weekday(), to_weekday)
+    new_start = tz.localize(local.replace(tzinfo=None) + datetime.timedelta(days=days, minutes=minutes))
+    new_end = new_start + (end - start) + datetime.timedelta(minutes=extend_minutes)
+    if new_end <= new_start:
+        raise ValueError(f"'{event.get('summary', event['id'])}' would end before it starts")
+    return {
+        'start': {'dateTime': new_start.isoformat(), 'timeZone': tz.zone},
+        'end': {'dateTime': new_end.isoformat(), 'timeZone': tz.zone}
+    }
 
-    return task_reminders
+def apply_to_events(operation, filters=None, to_weekday=None, shift_days=0, shift_minutes=0, extend_minutes=0,
+                    preview=False, user=None):
+    # Reschedules, cancels or extends every event matching filters (see
+    # select_events) in server-side batches. preview=True only reports the plan.
+    if operation not in BULK_OPERATIONS:
+        raise ValueError(f"Unsupported bulk operation: '{operation}'")
+    context = get_user_context(user)
+    tz = get_user_timezone(context.user_id)
+    target = weekday_index(to_weekday) if to_weekday else None
+    if operation == 'reschedule' and target is None and not shift_days and not shift_minutes:
+        raise ValueError("Say where to move the meetings: a weekday or a number of days.")
+    if operation == 'extend' and not extend_minutes:
+        raise ValueError("Say how many minutes to extend the meetings by.")
+
+    events = select_events(user=context, **(filters or {}))
+    changes = {}
+    if operation != 'cancel':
+        for event in events:
+            changes[event['id']] = shift_event_changes(
+                event,
+                days=shift_days if operation == 'reschedule' else 0,
+                minutes=shift_minutes if operation == 'reschedule' else 0,
+                to_weekday=target if operation == 'reschedule' else None,
+                extend_minutes=extend_minutes if operation == 'extend' else 0,
+                tz=tz
+            )
+
+    summary = {
+        'operation': operation,
+        'matched': len(events),
+        'events': [
+            {
+                'id': event['id'],
+                'summary': event.get('summary', ''),
+                'start': event['start'].get('dateTime'),
+                'new_start': changes[event['id']]['start']['dateTime'] if event['id'] in changes else None
+            }
+            for event in events
+        ]
+    }
+    if preview or not events:
+        summary.update(applied=0, failed={})
+        return summary
+
+    results = cancel_events(events, context) if operation == 'cancel' else patch_events(events, changes, context)
+    failed = {
+        key: str(result.error) for key, result in results.items()
+        if not result.ok and not (operation == 'cancel' and isinstance(result.error, HttpError)
+                                  and result.error.resp.status in (404, 410))
+    }
+    summary.update(applied=len(events) - len(failed), failed=failed)
+    return summary
@@ -0,0 +1,85 @@
+# credential_store.py
+import hashlib
+import json
+import os
+import threading
+
+from cryptography.fernet import Fernet, InvalidToken
+
+CREDENTIAL_DIR = os.getenv("CREDENTIAL_DIR", "credentials")
+# A Fernet key (Fernet.generate_key()). Without one, a key file is created
+# next to the credentials; set this in production so the two live apart.
+CREDENTIAL_KEY = os.getenv("CREDENTIAL_KEY")
+KEY_FILE = '.key'
+
+
+def storage_key(user_id):
+    # User IDs are often emails; hash them so any ID maps to a safe, fixed-length file name.
+    return hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:32]
+
+
+def _write_private(path, data):
+    tmp = f"{path}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class CredentialStore:
+    def __init__(self, directory=CREDENTIAL_DIR, key=CREDENTIAL_KEY):
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._fernet = Fernet(key or self._load_or_create_key())
+        self._lock = threading.Lock()
+
+    def _load_or_create_key(self):
+        path = os.path.join(self.directory, KEY_FILE)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            with open(path, 'rb') as f:
+                return f.read().strip()
+        key = Fernet.generate_key()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        return key
+
+    def _path(self, user_id, name):
+        return os.path.join(self.directory, f"{storage_key(user_id)}.{name}.enc")
+
+    def load(self, user_id, name):
+        path = self._path(user_id, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            token = f.read()
+        try:
+            return json.loads(self._fernet.decrypt(token))
+        except InvalidToken:
+            raise ValueError(f"Stored '{name}' for user '{user_id}' cannot be decrypted; was CREDENTIAL_KEY changed?")
+
+    def save(self, user_id, name, data):
+        token = self._fernet.encrypt(json.dumps(data).encode('utf-8'))
+        with self._lock:
+            _write_private(self._path(user_id, name), token)
+
+    def delete(self, user_id, name):
+        with self._lock:
+            try:
+                os.remove(self._path(user_id, name))
+            except FileNotFoundError:
+                pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_credential_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CredentialStore()
+    return _store
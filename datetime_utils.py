@@ -0,0 +1,161 @@
+# datetime_utils.py
+import datetime
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import parsedatetime as pdt
+import pytz
+
+from metrics import register_gauge
+
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Kolkata")
+DEFAULT_HOUR = 10
+CACHE_SIZE = 4096
+# Words a date phrase may carry around what parsedatetime reads: "on the 5th".
+DATE_FILLER_WORDS = {'the', 'on', 'at', 'by', 'of'}
+
+_user_timezones = {}
+_thread_state = threading.local()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+cache_stats = {'hits': 0, 'misses': 0}
+
+
+def _cache_stats():
+    lookups = cache_stats['hits'] + cache_stats['misses']
+    return {**cache_stats, 'size': len(_cache), 'hit_rate': round(cache_stats['hits'] / lookups, 3) if lookups else None}
+
+
+register_gauge('datetime_cache', _cache_stats)
+
+
+def _calendar():
+    # parsedatetime.Calendar is costly to construct and not documented as
+    # thread-safe, so each thread keeps one for its lifetime.
+    calendar = getattr(_thread_state, 'calendar', None)
+    if calendar is None:
+        calendar = _thread_state.calendar = pdt.Calendar()
+    return calendar
+
+
+def set_user_timezone(user_id, timezone_name):
+    _user_timezones[user_id] = pytz.timezone(timezone_name).zone
+
+
+def get_user_timezone(user_id=None):
+    return pytz.timezone(_user_timezones.get(user_id, DEFAULT_TIMEZONE))
+
+
+def _resolve_timezone(tz=None, user_id=None):
+    if tz is None:
+        return get_user_timezone(user_id)
+    if isinstance(tz, str):
+        return pytz.timezone(tz)
+    return tz
+
+
+def timezone_name(dt):
+    return getattr(dt.tzinfo, 'zone', None) or DEFAULT_TIMEZONE
+
+
+def _parse(phrase, tz, reference):
+    time_struct, parse_status = _calendar().parse(phrase, sourceTime=reference.timetuple())
+    if not parse_status or time_struct.tm_year == 1900:
+        raise ValueError(f"Could not parse datetime: '{phrase}'")
+
+    dt = datetime.datetime(*time_struct[:6])
+
+    # If no time was provided, default to 10 AM
+    if not parse_status & 2:
+        dt = dt.replace(hour=DEFAULT_HOUR, minute=0, second=0)
+
+    return tz.localize(dt)
+
+
+def _from_isoformat(phrase, tz):
+    # Queued jobs store times already resolved; parsedatetime reads those as "now".
+    # A bare date is left to _parse, which applies DEFAULT_HOUR.
+    phrase = phrase.strip()
+    if len(phrase) <= 10:
+        return None
+    try:
+        dt = datetime.datetime.fromisoformat(phrase)
+    except ValueError:
+        return None
+    return dt.astimezone(tz) if dt.tzinfo else tz.localize(dt)
+
+
+def resolve_datetime(phrase, tz=None, reference=None, user_id=None):
+    tz = _resolve_timezone(tz, user_id)
+    resolved = _from_isoformat(phrase, tz)
+    if resolved is not None:
+        return resolved
+    if reference is None:
+        reference = datetime.datetime.now(tz)
+    elif reference.tzinfo is None:
+        reference = tz.localize(reference)
+    else:
+        reference = reference.astimezone(tz)
+    # Relative phrases only need minute precision on the reference time.
+    reference = reference.replace(second=0, microsecond=0)
+
+    key = (' '.join(phrase.lower().split()), reference.isoformat(), tz.zone)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            cache_stats['hits'] += 1
+            return cached
+        cache_stats['misses'] += 1
+
+    resolved = _parse(phrase, tz, reference)
+
+    with _cache_lock:
+        _cache[key] = resolved
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return resolved
+
+
+def resolve_many(phrases, tz=None, reference=None, user_id=None, return_exceptions=False):
+    # Bulk imports repeat a handful of phrases ("friday", "tomorrow at 3pm");
+    # each distinct phrase is parsed once, all against the same reference time.
+    tz = _resolve_timezone(tz, user_id)
+    reference = reference or datetime.datetime.now(tz)
+    resolved = {}
+    results = []
+    for phrase in phrases:
+        if phrase not in resolved:
+            try:
+                resolved[phrase] = resolve_datetime(phrase, tz, reference)
+            except ValueError as e:
+                if not return_exceptions:
+                    raise
+                resolved[phrase] = e
+        results.append(resolved[phrase])
+    return results
+
+
+def is_date_phrase(phrase, tz=None, user_id=None):
+    # True only when the whole phrase is a date. resolve_datetime reads any
+    # date it finds inside a phrase, so "friday and email the team" resolves
+    # too; here the unread words must be filler.
+    phrase = (phrase or '').strip()
+    tz = _resolve_timezone(tz, user_id)
+    if _from_isoformat(phrase, tz) is not None:
+        return True
+    matches = _calendar().nlp(phrase, sourceTime=datetime.datetime.now(tz).timetuple())
+    if not matches:
+        return False
+    leftover = phrase
+    for _, _, start, end, _ in sorted(matches, key=lambda m: m[2], reverse=True):
+        leftover = leftover[:start] + ' ' + leftover[end:]
+    return all(word in DATE_FILLER_WORDS for word in re.findall(r"\w+", leftover.lower()))
+
+
+def to_task_due(dt):
+    # The Tasks API keeps only the date part of 'due', so send the local
+    # calendar date rather than a UTC instant that may fall on another day.
+    return dt.strftime('%Y-%m-%dT00:00:00.000Z')
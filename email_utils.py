@@ -1,46 +1,281 @@
+import atexit
+import queue
+import random
 import smtplib
+import threading
+import time
+from concurrent.futures import Future
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 from dotenv import load_dotenv
+from metrics import incr, register_gauge, span
 
 load_dotenv()
 
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 EMAIL_HOST = os.getenv("EMAIL_HOST")
-EMAIL_PORT = int(os.getenv("EMAIL_PORT"))
+# Parsed when the first mail is queued so importing this module never fails.
+EMAIL_PORT = os.getenv("EMAIL_PORT", "587")
+# Local relays and test sinks often speak plain SMTP without auth.
+EMAIL_STARTTLS = os.getenv("EMAIL_STARTTLS", "true").lower() == "true"
 
-def send_confirmation_email(details, meeting_link):
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "3"))
+SMTP_TIMEOUT = 30
+# Reconnect after this many messages or seconds idle; servers drop long sessions.
+MAX_MESSAGES_PER_CONNECTION = 100
+MAX_IDLE_SECONDS = 60
+MAX_SEND_ATTEMPTS = 5
+SEND_BATCH_SIZE = 20
 
-    for recipient in details['attendees']:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_ADDRESS
-        msg['To'] = recipient
-        msg['Subject'] = f"Meeting Confirmation – {details['purpose']}"
 
-        body = f"""
-        Hello,
+class SMTPConnectionPool:
+    def __init__(self, host, port, username, password, size=SMTP_POOL_SIZE):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self._idle = []
+        self._open = 0
+        self._condition = threading.Condition()
 
-        ✅ Your meeting has been scheduled successfully!
+    def _connect(self):
+        with span('smtp.connect'):
+            server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+            server.ehlo()
+            if EMAIL_STARTTLS:
+                server.starttls()
+                server.ehlo()
+            if self.password:
+                server.login(self.username, self.password)
+        incr('smtp.connections')
+        return {'server': server, 'sent': 0, 'last_used': time.monotonic()}
 
-        📅 Purpose: {details['purpose']}
-        🕒 Date & Time: {details['date_time']}
-        👥 Attendees: {', '.join(details['attendees'])}
-        💻 Platform: {details['platform']}
-        🔗 Meeting Link: {meeting_link}
+    def acquire(self):
+        with self._condition:
+            while True:
+                while self._idle:
+                    connection = self._idle.pop()
+                    if time.monotonic() - connection['last_used'] < MAX_IDLE_SECONDS:
+                        return connection
+                    self._close(connection)
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                self._condition.wait()
+        try:
+            return self._connect()
+        except Exception:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
 
-        Please mark your calendar.
+    def release(self, connection, broken=False):
+        with self._condition:
+            if broken or connection['sent'] >= MAX_MESSAGES_PER_CONNECTION:
+                self._close(connection)
+            else:
+                connection['last_used'] = time.monotonic()
+                self._idle.append(connection)
+            self._condition.notify()
 
-        — SmartSchedulerGPT
-        """
+    def _close(self, connection):
+        self._open -= 1
+        try:
+            connection['server'].quit()
+        except Exception:
+            pass
 
-        msg.attach(MIMEText(body, 'plain'))
+    def close_all(self):
+        with self._condition:
+            while self._idle:
+                self._close(self._idle.pop())
+            self._condition.notify_all()
+
+
+def is_transient(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+class MailQueue:
+    def __init__(self, pool, workers=SMTP_POOL_SIZE, max_attempts=MAX_SEND_ATTEMPTS, backoff=2.0):
+        self.pool = pool
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._retry_timers = set()
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"mail-sender-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def enqueue(self, msg):
+        future = Future()
+        self._queue.put((msg, future, 1))
+        return future
+
+    def _drain(self, first):
+        # A worker sends whatever is already waiting over the connection it
+        # holds, so a large invite list reuses a few sessions.
+        batch = [first]
+        while len(batch) < SEND_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = self._drain(item)
+            try:
+                self._send_batch([entry for entry in batch if entry is not None])
+            finally:
+                for entry in batch:
+                    self._queue.task_done()
+                if None in batch:
+                    return
+
+    def _send_batch(self, batch):
+        try:
+            connection = self.pool.acquire()
+        except Exception as e:
+            for entry in batch:
+                self._failed(entry, e)
+            return
+
+        broken = False
+        try:
+            for entry in batch:
+                msg, future, _ = entry
+                if broken:
+                    self._failed(entry, smtplib.SMTPServerDisconnected("Connection lost earlier in batch"))
+                    continue
+                try:
+                    with span('smtp.send'):
+                        connection['server'].send_message(msg)
+                    connection['sent'] += 1
+                    incr('smtp.sent')
+                    future.set_result(msg['To'])
+                except Exception as e:
+                    broken = not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError))
+                    self._failed(entry, e)
+        finally:
+            self.pool.release(connection, broken=broken)
+
+    def _failed(self, entry, error):
+        msg, future, attempt = entry
+        if attempt >= self.max_attempts or not is_transient(error):
+            incr('smtp.failed', error=type(error).__name__)
+            future.set_exception(error)
+            return
+        incr('smtp.retries')
+        delay = self.backoff * (2 ** (attempt - 1))
+        timer = threading.Timer(delay + random.uniform(0, delay), self._requeue, ((msg, future, attempt + 1),))
+        timer.daemon = True
+        with self._lock:
+            self._retry_timers.add(timer)
+        timer.start()
+
+    def _requeue(self, entry):
+        # Queue first so pending() never sees the message as neither queued nor timed.
+        self._queue.put(entry)
+        with self._lock:
+            self._retry_timers = {
+                timer for timer in self._retry_timers
+                if timer.is_alive() and timer is not threading.current_thread()
+            }
+
+    def pending(self):
+        with self._lock:
+            timers = sum(1 for timer in self._retry_timers if timer.is_alive())
+        return self._queue.unfinished_tasks + timers
+
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def shutdown(self, timeout=30):
+        self.flush(timeout)
+        for _ in self._threads:
+            self._queue.put(None)
+        self.pool.close_all()
+
+
+_mail_queue = None
+_mail_queue_lock = threading.Lock()
+
+
+def get_mail_queue():
+    global _mail_queue
+    if _mail_queue is None:
+        with _mail_queue_lock:
+            if _mail_queue is None:
+                if not EMAIL_HOST:
+                    raise ValueError("EMAIL_HOST is not set; cannot send email.")
+                try:
+                    port = int(EMAIL_PORT)
+                except ValueError:
+                    raise ValueError(f"EMAIL_PORT must be a number, got '{EMAIL_PORT}'.")
+                pool = SMTPConnectionPool(EMAIL_HOST, port, EMAIL_ADDRESS, EMAIL_PASSWORD)
+                _mail_queue = MailQueue(pool)
+                register_gauge('mail_queue', lambda: {'pending': _mail_queue.pending()})
+                # Let queued invites go out before a one-shot CLI process exits.
+                atexit.register(_mail_queue.shutdown)
+    return _mail_queue
+
+
+def build_confirmation_email(details, meeting_link, recipient):
+    msg = MIMEMultipart()
+    msg['From'] = EMAIL_ADDRESS
+    msg['To'] = recipient
+    msg['Subject'] = f"Meeting Confirmation – {details['purpose']}"
+
+    body = f"""
+    Hello,
+
+    ✅ Your meeting has been scheduled successfully!
+
+    📅 Purpose: {details['purpose']}
+    🕒 Date & Time: {details['date_time']}
+    👥 Attendees: {', '.join(details['attendees'])}
+    💻 Platform: {details['platform']}
+    🔗 Meeting Link: {meeting_link}
+
+    Please mark your calendar.
+
+    — SmartSchedulerGPT
+    """
+
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
 
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as server:
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            server.send_message(msg)
 
+def send_confirmation_email(details, meeting_link, wait=False):
+    mail_queue = get_mail_queue()
+    futures = [
+        mail_queue.enqueue(build_confirmation_email(details, meeting_link, recipient))
+        for recipient in details['attendees']
+    ]
+    if wait:
+        for future in futures:
+            future.result()
+    return futures
@@ -0,0 +1,190 @@
+# google_clients.py
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from googleapiclient.discovery_cache.base import Cache
+
+from credential_store import get_credential_store
+from metrics import incr, span
+from user_context import DEFAULT_USER_ID
+
+CLIENT_SECRETS_FILE = 'oauth_credentials.json'
+# Users whose credentials and built clients stay in memory; the least
+# recently used are dropped and rebuilt from the store on their next request.
+MAX_CACHED_USERS = int(os.getenv("MAX_CACHED_USERS", "32"))
+
+_users = OrderedDict()
+_registry_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_thread_state = threading.local()
+_generation = 0
+# factory(user_id, api) -> httplib2.Http-compatible object, set by install_transport().
+_transport_factory = None
+
+# The discovery client, auth transports and OAuth flow are imported where they
+# are first used: together they dominate CLI start-up, and most commands need
+# only some of them (or, when answered locally, none).
+
+
+class DiscoveryDocumentCache(Cache):
+    # Only consulted when the library falls back to fetching discovery
+    # documents over the network instead of its bundled static copies.
+    def __init__(self):
+        self._documents = {}
+
+    def get(self, url):
+        return self._documents.get(url)
+
+    def set(self, url, content):
+        self._documents[url] = content
+
+
+_discovery_cache = DiscoveryDocumentCache()
+
+
+def _save_credentials(user_id, api, creds):
+    get_credential_store().save(user_id, api, json.loads(creds.to_json()))
+
+
+def authorize_user(user_id, api, scopes):
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, scopes)
+    creds = flow.run_local_server(port=0)
+    _save_credentials(user_id, api, creds)
+    return creds
+
+
+def _load_credentials(user_id, api, scopes):
+    if _transport_factory is not None:
+        from google.auth.credentials import AnonymousCredentials
+        return AnonymousCredentials()
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+
+    info = get_credential_store().load(user_id, api)
+    creds = Credentials.from_authorized_user_info(info, scopes) if info else None
+    if creds and not creds.valid and creds.expired and creds.refresh_token:
+        with span('google.refresh', api=api):
+            creds.refresh(Request())
+        _save_credentials(user_id, api, creds)
+    if not creds or not creds.valid:
+        # A shared server must never open a browser on behalf of another user.
+        if user_id != DEFAULT_USER_ID:
+            raise ValueError(f"No valid {api} credentials stored for user '{user_id}'; run `python app.py --login {user_id}`.")
+        creds = authorize_user(user_id, api, scopes)
+    return creds
+
+
+def _ensure_fresh(user_id, api, creds):
+    if creds.valid:
+        return creds
+    from google.auth.transport.requests import Request
+
+    with _refresh_lock:
+        # Another thread may have refreshed while we waited for the lock.
+        if not creds.valid:
+            if creds.expired and creds.refresh_token:
+                with span('google.refresh', api=api):
+                    creds.refresh(Request())
+                _save_credentials(user_id, api, creds)
+            else:
+                raise ValueError(f"{api} credentials for user '{user_id}' are invalid and cannot be refreshed.")
+    return creds
+
+
+def _thread_http(user_id, api, creds):
+    # httplib2.Http is not thread-safe, so each thread keeps its own
+    # authorized connection pool that shares the process-wide credentials.
+    pools = getattr(_thread_state, 'pools', None)
+    if pools is None or getattr(_thread_state, 'generation', None) != _generation:
+        pools = _thread_state.pools = OrderedDict()
+        _thread_state.generation = _generation
+    key = (user_id, api)
+    http = pools.get(key)
+    # A user evicted and reloaded gets new credentials; drop the stale pool.
+    if http is None or getattr(http, 'credentials', creds) is not creds:
+        if _transport_factory is not None:
+            http = _transport_factory(user_id, api)
+        else:
+            import google_auth_httplib2
+            import httplib2
+            http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+        pools[key] = http
+        while len(pools) > MAX_CACHED_USERS * 2:
+            pools.popitem(last=False)
+    else:
+        pools.move_to_end(key)
+    return http
+
+
+def _request_builder(user_id, api, creds):
+    from googleapiclient.http import HttpRequest
+
+    def build_request(http, *args, **kwargs):
+        request = HttpRequest(_thread_http(user_id, api, creds), *args, **kwargs)
+        # Lets the executor meter each user's calls against their own quota.
+        request.user_id = user_id
+        return request
+    return build_request
+
+
+def _user_entry(user_id):
+    with _registry_lock:
+        entry = _users.get(user_id)
+        if entry is None:
+            entry = _users[user_id] = {'lock': threading.Lock(), 'credentials': {}, 'services': {}}
+            while len(_users) > MAX_CACHED_USERS:
+                _users.popitem(last=False)
+        else:
+            _users.move_to_end(user_id)
+        return entry
+
+
+def get_service(api, version, scopes, user_id=DEFAULT_USER_ID):
+    entry = _user_entry(user_id)
+    service = entry['services'].get((api, version))
+    incr('google.client_cache', result='hit' if service is not None else 'miss')
+    if service is None:
+        # Per-user lock: one user's slow credential load never blocks another's requests.
+        with entry['lock']:
+            service = entry['services'].get((api, version))
+            if service is None:
+                if api not in entry['credentials']:
+                    entry['credentials'][api] = _load_credentials(user_id, api, scopes)
+                creds = entry['credentials'][api]
+                from googleapiclient.discovery import build
+
+                with span('google.build', api=api):
+                    service = build(
+                        api,
+                        version,
+                        http=_thread_http(user_id, api, creds),
+                        requestBuilder=_request_builder(user_id, api, creds),
+                        cache=_discovery_cache
+                    )
+                entry['services'][(api, version)] = service
+    _ensure_fresh(user_id, api, entry['credentials'][api])
+    return service
+
+
+def evict_user(user_id):
+    with _registry_lock:
+        _users.pop(user_id, None)
+
+
+def reset_services():
+    global _generation
+    with _registry_lock:
+        _users.clear()
+        _generation += 1
+
+
+def install_transport(factory):
+    # Routes every client through a stand-in transport (benchmarks, local
+    # fakes) and skips OAuth; pass None to go back to Google.
+    global _transport_factory
+    _transport_factory = factory
+    reset_services()
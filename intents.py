@@ -0,0 +1,297 @@
+# intents.py
+# Typed commands validated from the model's structured output. Each intent
+# converts to the command dict async_engine executes (meeting_details /
+# task_details / action), so cached and fast-path results stay compatible.
+
+INTENTS = (
+    'create_meeting', 'reschedule_meeting', 'add_task', 'update_task', 'complete_task',
+    'delete_task', 'show_tasks', 'daily_summary', 'bulk_update', 'unknown'
+)
+BULK_OPERATIONS = ('reschedule', 'cancel', 'extend')
+
+MEETING_MESSAGE = "Your meeting details have been saved! Looking forward to it."
+TASK_MESSAGE = "Your task has been updated successfully!"
+COMPLETED_MESSAGE = "Well done! Your task is marked as completed."
+SHOW_MESSAGE = "Here are your upcoming tasks! Stay on track."
+SUMMARY_MESSAGE = "Here’s your schedule for today! Let's get organized."
+BULK_MESSAGE = "Done! Your meetings have been updated."
+PLAN_MESSAGE = "All done! Here's what I did."
+
+# Short on purpose: it is sent with every request. The schema carries the shape.
+SYSTEM_INSTRUCTION = """Turn each scheduling sentence into commands matching the JSON schema: one per independent request, in order, with text set to the words it came from.
+intent: create_meeting, reschedule_meeting (move an existing meeting), add_task, update_task, complete_task, delete_task, show_tasks, daily_summary, bulk_update (change many meetings or tasks at once, e.g. "move all my Friday meetings to Monday") or unknown.
+Copy dates and times in the user's words ("next friday 3pm"). attendees are emails or names. Set recurrence to an RRULE only when the command repeats. Omit fields the sentence does not give."""
+
+_STRING = {'type': 'STRING'}
+_INTEGER = {'type': 'INTEGER'}
+COMMAND_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'intent': {'type': 'STRING', 'enum': list(INTENTS)},
+        'text': _STRING,
+        'meeting': {
+            'type': 'OBJECT',
+            'properties': {
+                'purpose': _STRING,
+                'description': _STRING,
+                'attendees': {'type': 'ARRAY', 'items': _STRING},
+                'date_time': _STRING,
+                'platform': _STRING,
+                'duration_minutes': _INTEGER,
+                'recurrence': _STRING
+            }
+        },
+        'task': {
+            'type': 'OBJECT',
+            'properties': {
+                'title': _STRING,
+                'due_date': _STRING,
+                'new_title': _STRING,
+                'new_due_date': _STRING,
+                'recurrence': _STRING
+            }
+        },
+        'bulk': {
+            'type': 'OBJECT',
+            'properties': {
+                'target': {'type': 'STRING', 'enum': ['events', 'tasks']},
+                'operation': {'type': 'STRING', 'enum': list(BULK_OPERATIONS)},
+                'weekday': _STRING,
+                'purpose': _STRING,
+                'attendee': _STRING,
+                'title': _STRING,
+                'from': _STRING,
+                'to': _STRING,
+                'to_weekday': _STRING,
+                'shift_days': _INTEGER,
+                'shift_minutes': _INTEGER,
+                'extend_minutes': _INTEGER
+            }
+        }
+    },
+    'required': ['intent']
+}
+RESPONSE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {'commands': {'type': 'ARRAY', 'items': COMMAND_SCHEMA}},
+    'required': ['commands']
+}
+BATCH_RESPONSE_SCHEMA = {'type': 'ARRAY', 'items': RESPONSE_SCHEMA}
+
+
+class IntentError(ValueError):
+    pass
+
+
+def _text(data, field):
+    value = data.get(field)
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        raise IntentError(f"'{field}' must be a string")
+    return value.strip() or None
+
+
+def _integer(data, field):
+    value = data.get(field)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise IntentError(f"'{field}' must be a whole number")
+
+
+def _section(data, name):
+    section = data.get(name) or {}
+    if not isinstance(section, dict):
+        raise IntentError(f"'{name}' must be an object")
+    return section
+
+
+def _compact(values):
+    return {key: value for key, value in values.items() if value is not None}
+
+
+class MeetingIntent:
+    def __init__(self, purpose=None, attendees=(), date_time=None, description=None, platform=None,
+                 duration_minutes=None, recurrence=None, reschedule=False):
+        self.purpose = purpose
+        self.attendees = list(attendees)
+        self.date_time = date_time
+        self.description = description
+        self.platform = platform
+        self.duration_minutes = duration_minutes
+        self.recurrence = recurrence
+        self.reschedule = reschedule
+
+    @classmethod
+    def from_dict(cls, data, reschedule=False):
+        attendees = data.get('attendees') or []
+        if isinstance(attendees, str):
+            attendees = [a for a in attendees.replace(';', ',').split(',')]
+        if not isinstance(attendees, list):
+            raise IntentError("'attendees' must be a list")
+        return cls(
+            purpose=_text(data, 'purpose'),
+            attendees=[str(a).strip() for a in attendees if str(a).strip()],
+            date_time=_text(data, 'date_time'),
+            description=_text(data, 'description'),
+            platform=_text(data, 'platform'),
+            duration_minutes=_integer(data, 'duration_minutes'),
+            recurrence=_text(data, 'recurrence'),
+            reschedule=reschedule
+        )
+
+    def to_command(self):
+        purpose = self.purpose or 'Meeting'
+        details = {
+            'description': self.description or purpose,
+            'attendees': self.attendees,
+            'date_time': self.date_time or '',
+            'platform': self.platform or 'Google Meet',
+            'purpose': purpose
+        }
+        details.update(_compact({
+            'duration_minutes': self.duration_minutes,
+            'recurrence': self.recurrence,
+            'reschedule': self.reschedule or None
+        }))
+        return {'meeting_details': details, 'confirmation_message': MEETING_MESSAGE}
+
+
+class TaskIntent:
+    def __init__(self, action, title=None, due_date=None, new_title=None, new_due_date=None, recurrence=None):
+        self.action = action
+        self.title = title
+        self.due_date = due_date
+        self.new_title = new_title
+        self.new_due_date = new_due_date
+        self.recurrence = recurrence
+
+    @classmethod
+    def from_dict(cls, data, action):
+        return cls(
+            action,
+            title=_text(data, 'title'),
+            due_date=_text(data, 'due_date'),
+            new_title=_text(data, 'new_title'),
+            new_due_date=_text(data, 'new_due_date'),
+            recurrence=_text(data, 'recurrence')
+        )
+
+    def to_command(self):
+        if self.action == 'complete':
+            details = {'title': self.title, 'action': 'update', 'updated_fields': {'status': 'completed'}}
+            return {'task_details': details, 'confirmation_message': COMPLETED_MESSAGE}
+        details = {'title': self.title, 'action': self.action, 'updated_fields': {}}
+        if self.action == 'add':
+            details['due_date'] = self.due_date or 'today'
+            if self.recurrence:
+                details['recurrence'] = self.recurrence
+        elif self.action == 'update':
+            details['updated_fields'] = _compact({'title': self.new_title, 'due_date': self.new_due_date})
+        return {'task_details': details, 'confirmation_message': TASK_MESSAGE}
+
+
+class QueryIntent:
+    def __init__(self, action):
+        self.action = action
+
+    def to_command(self):
+        message = SUMMARY_MESSAGE if self.action == 'daily_summary' else SHOW_MESSAGE
+        return {'action': self.action, 'confirmation_message': message}
+
+
+class BulkUpdateIntent:
+    FILTERS = ('weekday', 'purpose', 'attendee', 'title', 'from', 'to')
+
+    def __init__(self, operation, target='events', filters=None, to_weekday=None, shift_days=None,
+                 shift_minutes=None, extend_minutes=None):
+        self.operation = operation
+        self.target = target
+        self.filters = filters or {}
+        self.to_weekday = to_weekday
+        self.shift_days = shift_days
+        self.shift_minutes = shift_minutes
+        self.extend_minutes = extend_minutes
+
+    @classmethod
+    def from_dict(cls, data):
+        operation = _text(data, 'operation')
+        if operation not in BULK_OPERATIONS:
+            raise IntentError(f"Unsupported bulk operation: '{operation}'")
+        target = _text(data, 'target') or 'events'
+        if target not in ('events', 'tasks'):
+            raise IntentError(f"Unsupported bulk target: '{target}'")
+        return cls(
+            operation,
+            target,
+            _compact({name: _text(data, name) for name in cls.FILTERS}),
+            to_weekday=_text(data, 'to_weekday'),
+            shift_days=_integer(data, 'shift_days'),
+            shift_minutes=_integer(data, 'shift_minutes'),
+            extend_minutes=_integer(data, 'extend_minutes')
+        )
+
+    def to_command(self):
+        details = {'target': self.target, 'operation': self.operation, 'filter': self.filters}
+        details.update(_compact({
+            'to_weekday': self.to_weekday,
+            'shift_days': self.shift_days,
+            'shift_minutes': self.shift_minutes,
+            'extend_minutes': self.extend_minutes
+        }))
+        return {'action': 'bulk_update', 'bulk_details': details, 'confirmation_message': BULK_MESSAGE}
+
+
+TASK_ACTIONS = {'add_task': 'add', 'update_task': 'update', 'complete_task': 'complete', 'delete_task': 'delete'}
+
+
+def parse_intent(data):
+    # Validates one structured answer. Returns None for 'unknown'.
+    if not isinstance(data, dict):
+        raise IntentError("Expected a JSON object")
+    intent = data.get('intent')
+    if intent not in INTENTS:
+        raise IntentError(f"Unknown intent: {intent!r}")
+    if intent in ('create_meeting', 'reschedule_meeting'):
+        return MeetingIntent.from_dict(_section(data, 'meeting'), reschedule=intent == 'reschedule_meeting')
+    if intent in TASK_ACTIONS:
+        return TaskIntent.from_dict(_section(data, 'task'), TASK_ACTIONS[intent])
+    if intent == 'show_tasks':
+        return QueryIntent('show')
+    if intent == 'daily_summary':
+        return QueryIntent('daily_summary')
+    if intent == 'bulk_update':
+        return BulkUpdateIntent.from_dict(_section(data, 'bulk'))
+    return None
+
+
+def parse_plan(data):
+    # Validates a whole answer ({"commands": [...]}, or a bare command) into
+    # the dict the executor runs: {} when nothing was understood, a single
+    # command, or {"plan": [command, ...]} with each step's source text.
+    if isinstance(data, dict) and 'commands' in data:
+        answers = data['commands']
+        if not isinstance(answers, list):
+            raise IntentError("'commands' must be a list")
+    else:
+        answers = [data]
+    commands = []
+    for answer in answers:
+        intent = parse_intent(answer)
+        if intent is not None:
+            command = intent.to_command()
+            if _text(answer, 'text'):
+                command['text'] = _text(answer, 'text')
+            commands.append(command)
+    if not commands:
+        return {}
+    if len(commands) == 1:
+        command = commands[0]
+        command.pop('text', None)
+        return command
+    return {'plan': commands, 'confirmation_message': PLAN_MESSAGE}
@@ -0,0 +1,284 @@
+# job_queue.py
+import atexit
+import importlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from metrics import incr, register_gauge, span
+
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "scheduler_jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF = float(os.getenv("JOB_BACKOFF", "2.0"))
+# Interactive commands enqueue their side effects instead of waiting on them.
+DEFER_WRITES = os.getenv("DEFER_WRITES", "true").lower() == "true"
+# A job left running this long belongs to a process that died; it is picked up again.
+JOB_LEASE_SECONDS = 300
+# Re-enqueueing a key this soon after it finished is a duplicate, not a new request.
+JOB_DEDUPE_SECONDS = 600
+# How long a one-shot CLI process waits for its jobs before exiting.
+JOB_DRAIN_SECONDS = 30
+
+PENDING = ('queued', 'running')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at);
+"""
+
+
+def _default_retryable(error):
+    from api_executor import is_retryable
+    return is_retryable(error)
+
+
+class Step:
+    # One side effect of a job. run(job) returns a JSON-serializable result,
+    # kept in job.state[name] so a retried job skips steps that already ran.
+    # compensate(job) undoes the step when a later step fails for good. An
+    # optional step that fails for good keeps {'error': ...} as its result
+    # and the job goes on.
+    def __init__(self, name, run, compensate=None, retryable=None, optional=False):
+        self.name = name
+        self.run = run
+        self.compensate = compensate
+        self.retryable = retryable or _default_retryable
+        self.optional = optional
+
+
+class Job:
+    def __init__(self, key, kind, user_id, payload, state, attempts):
+        self.key = key
+        self.kind = kind
+        self.user_id = user_id
+        self.payload = payload
+        self.state = state
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Job({self.key!r}, {self.kind!r}, attempts={self.attempts})"
+
+
+def resolve_steps(kind):
+    # Kinds are "module:name"; the module lists its workflows in WORKFLOWS, so
+    # a job left over from an earlier run can be resumed without registration.
+    module, _, name = kind.partition(':')
+    return importlib.import_module(module).WORKFLOWS[name]
+
+
+class JobQueue:
+    def __init__(self, path=JOB_QUEUE_DB, workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS, backoff=JOB_BACKOFF):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def enqueue(self, kind, payload, key=None, user_id=None, delay=0):
+        # Returns the job key. A key that is still pending, or finished within
+        # JOB_DEDUPE_SECONDS, is not enqueued again.
+        key = key or f"{kind}:{uuid.uuid4().hex}"
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT status, updated_at FROM jobs WHERE key = ?", (key,)).fetchone()
+            if row is not None and (row[0] in PENDING or now - row[1] < JOB_DEDUPE_SECONDS):
+                incr('jobs.deduplicated', kind=kind)
+                return key
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO jobs (key, kind, user_id, payload, state, status, attempts, run_at, error, created_at, updated_at)
+                VALUES (?, ?, ?, ?, '{}', 'queued', 0, ?, NULL, ?, ?)
+                """,
+                (key, kind, user_id, json.dumps(payload), now + delay, now, now)
+            )
+        incr('jobs.enqueued', kind=kind)
+        with self._condition:
+            self._condition.notify()
+        return key
+
+    def status(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kind, user_id, status, attempts, error, state FROM jobs WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        kind, user_id, status, attempts, error, state = row
+        return {
+            'key': key, 'kind': kind, 'user_id': user_id, 'status': status,
+            'attempts': attempts, 'error': error, 'state': json.loads(state)
+        }
+
+    def wait(self, key, timeout=None):
+        # Blocks until the job is done or failed; None if it is still pending at the timeout.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            record = self.status(key)
+            if record is None or record['status'] not in PENDING:
+                return record
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+
+    def pending(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", PENDING
+            ).fetchone()[0]
+
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def shutdown(self, timeout=JOB_DRAIN_SECONDS):
+        # Unfinished jobs stay in the database and resume with the next queue.
+        self.flush(timeout)
+        self._stopping = True
+        with self._condition:
+            self._condition.notify_all()
+
+    def _claim(self):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                """
+                SELECT key, kind, user_id, payload, state, status, attempts, updated_at FROM jobs
+                WHERE (status = 'queued' AND run_at <= ?) OR (status = 'running' AND updated_at < ?)
+                ORDER BY run_at LIMIT 1
+                """,
+                (now, now - JOB_LEASE_SECONDS)
+            ).fetchone()
+            if row is None:
+                return None
+            key, kind, user_id, payload, state, status, attempts, updated_at = row
+            # Another process sharing the database may have claimed it first.
+            claimed = self._conn.execute(
+                """
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+                WHERE key = ? AND status = ? AND updated_at = ?
+                """,
+                (now, key, status, updated_at)
+            ).rowcount
+        if not claimed:
+            return None
+        return Job(key, kind, user_id, json.loads(payload), json.loads(state), attempts + 1)
+
+    def _next_run_in(self):
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(run_at) FROM jobs WHERE status = 'queued'").fetchone()
+        if row[0] is None:
+            return 1.0
+        return min(1.0, max(0.0, row[0] - time.time()))
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                with self._condition:
+                    self._condition.wait(self._next_run_in())
+                continue
+            self._run(job)
+
+    def _update(self, job, **fields):
+        fields['updated_at'] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE key = ?", (*fields.values(), job.key))
+
+    def _run(self, job):
+        with span('job', kind=job.kind, attempt=job.attempts) as s:
+            try:
+                steps = resolve_steps(job.kind)
+            except (ImportError, AttributeError, KeyError) as e:
+                self._update(job, status='failed', error=f"Unknown job kind '{job.kind}': {e}")
+                s.set(status='failed')
+                incr('jobs.failed', kind=job.kind)
+                return
+            for step in steps:
+                if step.name in job.state:
+                    continue
+                try:
+                    result = step.run(job)
+                except Exception as e:
+                    outcome = self._failed(job, steps, step, e)
+                    if outcome != 'skipped':
+                        s.set(status=outcome, step=step.name)
+                        return
+                    result = {'error': str(e)}
+                job.state[step.name] = result
+                # Saved after every step, so a crash never repeats a finished one.
+                self._update(job, state=json.dumps(job.state))
+            self._update(job, status='done', error=None)
+            s.set(status='done')
+        incr('jobs.done', kind=job.kind)
+
+    def _failed(self, job, steps, step, error):
+        if job.attempts < self.max_attempts and step.retryable(error):
+            delay = self.backoff * (2 ** (job.attempts - 1))
+            self._update(job, status='queued', run_at=time.time() + delay + random.uniform(0, delay), error=str(error))
+            incr('jobs.retries', kind=job.kind)
+            return 'retry'
+        if step.optional:
+            incr('jobs.step_errors', kind=job.kind, step=step.name)
+            return 'skipped'
+
+        # Undo the steps that did run, newest first, so nothing is left half-done.
+        errors = [f"{step.name}: {error}"]
+        for done in reversed([s for s in steps if s.name in job.state]):
+            if done.compensate is None:
+                continue
+            try:
+                done.compensate(job)
+            except Exception as e:
+                errors.append(f"undo {done.name}: {e}")
+        self._update(job, status='failed', error="; ".join(errors))
+        incr('jobs.failed', kind=job.kind)
+        return 'failed'
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue()
+                register_gauge('job_queue', lambda: {'pending': _job_queue.pending()})
+                # Let a one-shot CLI process finish its jobs before it exits.
+                atexit.register(_job_queue.shutdown)
+    return _job_queue
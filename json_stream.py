@@ -0,0 +1,88 @@
+# json_stream.py
+import json
+
+
+class IncrementalJSONParser:
+    # Feed model output as it streams in; each JSON object or array is
+    # returned as soon as its closing bracket arrives, however the text was
+    # chunked. Anything between values (markdown fences, prose) is skipped.
+    # With unwrap_array=True the elements of a top-level array come out one
+    # at a time, so a batched answer can be used before it is complete.
+    def __init__(self, unwrap_array=False):
+        self.unwrap_array = unwrap_array
+        self.done = False
+        self._buffer = ''
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._base = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        values = []
+        if self.done:
+            return values
+        self._buffer += chunk
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            c = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif self._depth > self._base:
+                if c == '"':
+                    self._in_string = True
+                elif c in '{[':
+                    self._depth += 1
+                elif c in '}]':
+                    self._depth -= 1
+                    if self._depth == self._base:
+                        try:
+                            values.append(json.loads(buffer[self._start:i + 1]))
+                        except ValueError:
+                            # A stray bracket in prose; rescan just past it.
+                            i = self._start
+                        self._start = None
+            elif c in '{[':
+                if self.unwrap_array and c == '[' and self._base == 0:
+                    self._base = self._depth = 1
+                else:
+                    self._start = i
+                    self._depth += 1
+            elif c == ']' and self._base == 1:
+                self._base = self._depth = 0
+                self.done = True
+                break
+            i += 1
+
+        if self._start is None:
+            # Nothing pending: drop what has been scanned.
+            self._buffer, self._pos = '', 0
+        else:
+            self._buffer, self._pos = buffer[self._start:], i - self._start
+            self._start = 0
+        return values
+
+    def close(self):
+        if self._start is not None or self._base:
+            raise ValueError("Model response ended in the middle of a JSON value")
+
+
+def iter_json_values(chunks, unwrap_array=False):
+    parser = IncrementalJSONParser(unwrap_array)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    parser.close()
+
+
+def first_json_value(text):
+    # Non-greedy replacement for re.search(r'{.*}', text, re.DOTALL).
+    for value in iter_json_values([text]):
+        return value
+    raise ValueError("No JSON found in model response")
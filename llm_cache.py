@@ -0,0 +1,102 @@
+# llm_cache.py
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from metrics import register_gauge
+
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "llm_cache.db")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(12 * 60 * 60)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at);
+"""
+
+
+def normalize_prompt(prompt):
+    text = re.sub(r'\s+', ' ', (prompt or '').strip().lower())
+    return text.rstrip('.!?')
+
+
+def cache_key(prompt, version=''):
+    # version names what produced the answer (mode, instructions, schema), so
+    # answers of another shape are never served after either changes.
+    return f"{version}:{normalize_prompt(prompt)}" if version else normalize_prompt(prompt)
+
+
+class PromptCache:
+    def __init__(self, path=LLM_CACHE_DB, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, prompt, version=''):
+        key = cache_key(prompt, version)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, prompt, response, version=''):
+        key = cache_key(prompt, version)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response), now, now)
+            )
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            # Least recently used entries go first once the cache is full.
+            self._conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hits / lookups, 3) if lookups else None}
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_prompt_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PromptCache()
+                register_gauge('llm_cache', _cache.stats)
+    return _cache
@@ -0,0 +1,195 @@
+# metrics.py
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+# Spans are appended here as JSON lines when set; a final snapshot is written on exit.
+METRICS_FILE = os.getenv("METRICS_FILE")
+# Recent samples kept per timer for percentiles; older ones only feed count/total/max.
+SAMPLE_SIZE = 1024
+RECENT_SPANS = 200
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    return name + '{' + ','.join(f"{k}={labels[k]}" for k in sorted(labels)) + '}'
+
+
+class Timer:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def observe(self, ms):
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.samples.append(ms)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else None
+
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count, 3) if self.count else None,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(self.max, 3)
+        }
+
+
+class Span:
+    def __init__(self, name, attrs, parent):
+        self.name = name
+        self.attrs = attrs
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.status = 'ok'
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, duration_ms):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': round(duration_ms, 3),
+            'status': self.status,
+            'attrs': self.attrs
+        }
+
+
+class Metrics:
+    def __init__(self, path=METRICS_FILE):
+        self.path = path
+        self.started_at = time.time()
+        self._counters = {}
+        self._timers = {}
+        self._gauges = {}
+        self._recent = deque(maxlen=RECENT_SPANS)
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._file = None
+
+    def incr(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, ms, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = self._timers[key] = Timer()
+            timer.observe(ms)
+
+    def register_gauge(self, name, read):
+        # read() is called at snapshot time, so sources keep their own counters.
+        self._gauges[name] = read
+
+    def _write(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._file_lock:
+            if self._file is None:
+                # Line-buffered so a crash loses at most the span being written.
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+            self._file.write(line)
+
+    def _record_span(self, span, duration_ms):
+        record = span.to_dict(duration_ms)
+        with self._lock:
+            self._recent.append(record)
+        if self.path:
+            self._write({'type': 'span', **record})
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            timers = {key: timer.summary() for key, timer in self._timers.items()}
+            recent = list(self._recent)
+        gauges = {}
+        for name, read in list(self._gauges.items()):
+            try:
+                gauges[name] = read()
+            except Exception as e:
+                gauges[name] = {'error': str(e)}
+        return {
+            'uptime_s': round(time.time() - self.started_at, 3),
+            'counters': counters,
+            'timers': timers,
+            'gauges': gauges,
+            'recent_spans': recent
+        }
+
+    def dump(self):
+        if self.path:
+            self._write({'type': 'snapshot', 'time': time.time(), **self.snapshot()})
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+            self._recent.clear()
+        self.started_at = time.time()
+
+
+metrics = Metrics()
+if METRICS_FILE:
+    atexit.register(metrics.dump)
+
+
+class span:
+    # `with span('api.execute', api='calendar') as s:` times a stage. Nested
+    # spans share a trace; errors mark the span and bump '<name>.errors'.
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self._span = Span(self.name, self.attrs, _current_span.get())
+        self._token = _current_span.set(self._span)
+        self._started = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._started) * 1000
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self._span.status = 'error'
+            self._span.attrs['error'] = f"{exc_type.__name__}: {exc}"
+            metrics.incr(f"{self.name}.errors")
+        metrics.observe(self.name, duration_ms)
+        metrics._record_span(self._span, duration_ms)
+        return False
+
+
+def incr(name, value=1, **labels):
+    metrics.incr(name, value, **labels)
+
+
+def register_gauge(name, read):
+    metrics.register_gauge(name, read)
+
+
+def snapshot():
+    return metrics.snapshot()
@@ -0,0 +1,385 @@
+# mirror.py
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from api_executor import execute
+from credential_store import storage_key
+from datetime_utils import get_user_timezone
+from metrics import span
+from pagination import EVENT_LIST_FIELDS, TASKLIST_LIST_FIELDS, TASK_LIST_FIELDS, iter_items, iter_pages
+from user_context import DEFAULT_USER_ID
+
+MIRROR_DB = os.getenv("MIRROR_DB", "scheduler_mirror.db")
+# Seconds a mirror may be served without a delta fetch; 0 syncs before every read.
+MIRROR_MAX_AGE = float(os.getenv("MIRROR_MAX_AGE", "0"))
+# Tasks deltas are keyed on our own clock, so overlap a little to absorb skew.
+TASKS_SYNC_OVERLAP = datetime.timedelta(minutes=2)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    calendar_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    summary TEXT,
+    start_utc TEXT,
+    end_utc TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (calendar_id, id)
+);
+CREATE INDEX IF NOT EXISTS events_start ON events (calendar_id, start_utc);
+CREATE TABLE IF NOT EXISTS tasks (
+    tasklist TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT,
+    status TEXT,
+    due TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (tasklist, id)
+);
+CREATE INDEX IF NOT EXISTS tasks_due ON tasks (tasklist, status, due);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def to_utc_string(value, tz=None):
+    # A bare date (an all-day event) means midnight in tz, or in UTC without
+    # one, so the event covers that calendar day where the user is.
+    if not value:
+        return None
+    if len(value) == 10:
+        day = datetime.datetime.fromisoformat(value)
+        dt = tz.localize(day) if tz else day.replace(tzinfo=datetime.timezone.utc)
+    else:
+        dt = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def utc_now_string():
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _event_time(event, field, tz=None):
+    value = event.get(field, {})
+    return to_utc_string(value.get('dateTime', value.get('date')), tz)
+
+
+class LocalMirror:
+    def __init__(self, path=MIRROR_DB, tz=None):
+        self.path = path
+        # All-day events are stored as local midnights in this timezone.
+        self.tz = tz
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._sync_locks = {}
+        self._synced_at = {}
+        # Bumped on every full resync so in-memory indexes know to rebuild.
+        self.generations = {}
+        self._listeners = []
+        self._restamp_all_day_events()
+
+    def _get_state(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def has_synced(self, key_prefix):
+        # True once a sync under this prefix ('events:primary', 'tasks:') has
+        # completed in this file, in this process or an earlier one.
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM sync_state WHERE key LIKE ? ESCAPE '\\' LIMIT 1",
+                (key_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%',)
+            ).fetchone()
+        return row is not None
+
+    def _set_state(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def _restamp_all_day_events(self):
+        # Rows written under another timezone (or before all-day events were
+        # stored in local time) would land on the wrong day.
+        zone = self.tz.zone if self.tz else 'UTC'
+        if self._get_state('all_day_timezone') == zone:
+            return
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT calendar_id, id, data FROM events WHERE json_extract(data, '$.start.date') IS NOT NULL"
+            ).fetchall()
+            updates = []
+            for calendar_id, event_id, data in rows:
+                event = json.loads(data)
+                updates.append((_event_time(event, 'start', self.tz), _event_time(event, 'end', self.tz), calendar_id, event_id))
+            self._conn.executemany("UPDATE events SET start_utc = ?, end_utc = ? WHERE calendar_id = ? AND id = ?", updates)
+        self._set_state('all_day_timezone', zone)
+
+    def _sync_lock(self, key):
+        with self._lock:
+            return self._sync_locks.setdefault(key, threading.Lock())
+
+    def _is_fresh(self, key, max_age):
+        synced_at = self._synced_at.get(key)
+        return synced_at is not None and time.monotonic() - synced_at < max_age
+
+    def add_listener(self, callback):
+        # callback(kind, container_id, changed, removed_ids) runs after every
+        # write, whether from a sync delta or a local create/patch/delete.
+        # kind is 'events', 'tasks', 'events_reset' or 'tasks_reset'.
+        self._listeners.append(callback)
+
+    def _notify(self, kind, container_id, changed=(), removed=()):
+        for callback in self._listeners:
+            callback(kind, container_id, changed, removed)
+
+    # Events
+
+    def upsert_events(self, events, calendar_id='primary'):
+        rows = [
+            (calendar_id, e['id'], e.get('summary', ''), _event_time(e, 'start', self.tz), _event_time(e, 'end', self.tz), json.dumps(e))
+            for e in events
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO events (calendar_id, id, summary, start_utc, end_utc, data) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        if rows:
+            self._notify('events', calendar_id, changed=events)
+
+    def remove_events(self, event_ids, calendar_id='primary'):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM events WHERE calendar_id = ? AND id = ?",
+                [(calendar_id, event_id) for event_id in event_ids]
+            )
+        if event_ids:
+            self._notify('events', calendar_id, removed=event_ids)
+
+    def sync_events(self, service, calendar_id='primary', max_age=MIRROR_MAX_AGE):
+        state_key = f"events:{calendar_id}"
+        with self._sync_lock(state_key), span('mirror.sync_events') as s:
+            if max_age and self._is_fresh(state_key, max_age):
+                s.set(skipped=True)
+                return [], []
+            sync_token = self._get_state(state_key)
+            try:
+                changed, removed, next_token = self._fetch_event_changes(service, calendar_id, sync_token)
+            except HttpError as e:
+                # 410 Gone: the sync token expired and a full resync is required.
+                if e.resp.status != 410:
+                    raise
+                sync_token = None
+                changed, removed, next_token = self._fetch_event_changes(service, calendar_id, None)
+            s.set(full=sync_token is None, changed=len(changed), removed=len(removed))
+
+            with self._lock, self._conn:
+                if sync_token is None:
+                    self._conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+                    self.generations[state_key] = self.generations.get(state_key, 0) + 1
+            if sync_token is None:
+                self._notify('events_reset', calendar_id)
+            self.upsert_events(changed, calendar_id)
+            self.remove_events(removed, calendar_id)
+            if next_token:
+                self._set_state(state_key, next_token)
+            self._synced_at[state_key] = time.monotonic()
+            return changed, removed
+
+    def _fetch_event_changes(self, service, calendar_id, sync_token):
+        params = {'calendarId': calendar_id, 'singleEvents': True, 'maxResults': 2500}
+        if sync_token:
+            params['syncToken'] = sync_token
+        changed, removed = [], []
+        next_token = None
+        for page in iter_pages(service.events(), EVENT_LIST_FIELDS, **params):
+            for event in page.get('items', []):
+                if event.get('status') == 'cancelled':
+                    removed.append(event['id'])
+                else:
+                    changed.append(event)
+            next_token = page.get('nextSyncToken', next_token)
+        return changed, removed, next_token
+
+    def _event_rows(self, query, params):
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_event(self, event_id, calendar_id='primary'):
+        rows = self._event_rows("SELECT data FROM events WHERE calendar_id = ? AND id = ?", (calendar_id, event_id))
+        return rows[0] if rows else None
+
+    def events_between(self, start_utc=None, end_utc=None, calendar_id='primary'):
+        query = "SELECT data FROM events WHERE calendar_id = ?"
+        params = [calendar_id]
+        if start_utc:
+            query += " AND end_utc > ?"
+            params.append(to_utc_string(start_utc))
+        if end_utc:
+            query += " AND start_utc < ?"
+            params.append(to_utc_string(end_utc))
+        query += " ORDER BY start_utc"
+        return self._event_rows(query, params)
+
+    def upcoming_events(self, calendar_id='primary', summary_prefix=None):
+        query = "SELECT data FROM events WHERE calendar_id = ? AND start_utc >= ?"
+        params = [calendar_id, utc_now_string()]
+        if summary_prefix:
+            query += " AND summary LIKE ? ESCAPE '\\'"
+            escaped = summary_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(escaped + '%')
+        query += " ORDER BY start_utc"
+        return self._event_rows(query, params)
+
+    # Tasks
+
+    def upsert_tasks(self, tasks, tasklist='@default'):
+        for t in tasks:
+            t['tasklist'] = tasklist
+        rows = [
+            (tasklist, t['id'], t.get('title', ''), t.get('status'), to_utc_string(t.get('due')), json.dumps(t))
+            for t in tasks
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tasks (tasklist, id, title, status, due, data) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        if rows:
+            self._notify('tasks', tasklist, changed=tasks)
+
+    def remove_tasks(self, task_ids, tasklist='@default'):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM tasks WHERE tasklist = ? AND id = ?",
+                [(tasklist, task_id) for task_id in task_ids]
+            )
+        if task_ids:
+            self._notify('tasks', tasklist, removed=task_ids)
+
+    def sync_tasks(self, service, tasklist='@default', max_age=MIRROR_MAX_AGE):
+        state_key = f"tasks:{tasklist}"
+        with self._sync_lock(state_key), span('mirror.sync_tasks') as s:
+            if max_age and self._is_fresh(state_key, max_age):
+                s.set(skipped=True)
+                return [], []
+            updated_min = self._get_state(state_key)
+            started_at = datetime.datetime.now(datetime.timezone.utc)
+
+            params = {'tasklist': tasklist, 'showCompleted': True, 'showHidden': True, 'maxResults': 100}
+            if updated_min:
+                params['updatedMin'] = updated_min
+                params['showDeleted'] = True
+
+            changed, removed = [], []
+            for task in iter_items(service.tasks(), TASK_LIST_FIELDS, **params):
+                if task.get('deleted'):
+                    removed.append(task['id'])
+                else:
+                    changed.append(task)
+            s.set(full=not updated_min, changed=len(changed), removed=len(removed))
+
+            with self._lock, self._conn:
+                if not updated_min:
+                    self._conn.execute("DELETE FROM tasks WHERE tasklist = ?", (tasklist,))
+                    self.generations['tasks'] = self.generations.get('tasks', 0) + 1
+            if not updated_min:
+                self._notify('tasks_reset', tasklist)
+            self.upsert_tasks(changed, tasklist)
+            self.remove_tasks(removed, tasklist)
+            self._set_state(state_key, (started_at - TASKS_SYNC_OVERLAP).strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+            self._synced_at[state_key] = time.monotonic()
+            return changed, removed
+
+    def default_tasklist_id(self, service):
+        tasklist_id = self._get_state('default_tasklist')
+        if tasklist_id is None:
+            tasklist_id = execute(service.tasklists().get(tasklist='@default'))['id']
+            self._set_state('default_tasklist', tasklist_id)
+        return tasklist_id
+
+    def sync_all_tasks(self, service, max_age=MIRROR_MAX_AGE):
+        if max_age and self._is_fresh('tasklists', max_age):
+            return [], []
+
+        tasklist_ids = [
+            item['id'] for item in iter_items(service.tasklists(), TASKLIST_LIST_FIELDS, maxResults=100)
+        ]
+
+        removed = []
+        with self._lock, self._conn:
+            placeholders = ', '.join('?' for _ in tasklist_ids)
+            stale = self._conn.execute(
+                f"SELECT tasklist, id FROM tasks WHERE tasklist NOT IN ({placeholders})",
+                tasklist_ids
+            ).fetchall()
+            if stale:
+                removed.extend(task_id for _, task_id in stale)
+                for tasklist in {row[0] for row in stale}:
+                    self._conn.execute("DELETE FROM tasks WHERE tasklist = ?", (tasklist,))
+                    self._conn.execute("DELETE FROM sync_state WHERE key = ?", (f"tasks:{tasklist}",))
+        for tasklist in {row[0] for row in stale}:
+            self._notify('tasks_reset', tasklist)
+
+        changed = []
+        for tasklist in tasklist_ids:
+            list_changed, list_removed = self.sync_tasks(service, tasklist, max_age)
+            changed.extend(list_changed)
+            removed.extend(list_removed)
+        self._synced_at['tasklists'] = time.monotonic()
+        return changed, removed
+
+    def tasks(self, tasklist=None, include_completed=False, due_min=None, due_max=None, limit=None):
+        query = "SELECT data FROM tasks WHERE 1 = 1"
+        params = []
+        if tasklist:
+            query += " AND tasklist = ?"
+            params.append(tasklist)
+        if not include_completed:
+            query += " AND status != 'completed'"
+        if due_min:
+            query += " AND due >= ?"
+            params.append(to_utc_string(due_min))
+        if due_max:
+            query += " AND due <= ?"
+            params.append(to_utc_string(due_max))
+        query += " ORDER BY due IS NULL, due"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+_mirrors = {}
+_mirror_lock = threading.Lock()
+
+
+def mirror_path(user_id):
+    if user_id == DEFAULT_USER_ID:
+        return MIRROR_DB
+    root, ext = os.path.splitext(MIRROR_DB)
+    return f"{root}.{storage_key(user_id)}{ext or '.db'}"
+
+
+def get_mirror(user_id=DEFAULT_USER_ID):
+    mirror = _mirrors.get(user_id)
+    if mirror is None:
+        with _mirror_lock:
+            mirror = _mirrors.get(user_id)
+            if mirror is None:
+                # One database per user keeps tenants' calendars and tasks apart.
+                mirror = _mirrors[user_id] = LocalMirror(mirror_path(user_id), get_user_timezone(user_id))
+    return mirror
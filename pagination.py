@@ -0,0 +1,28 @@
+# pagination.py
+from api_executor import execute
+
+# Partial-response field masks. Keep 'nextPageToken' (and 'nextSyncToken' for
+# sync requests) in every mask or paging stops after the first page.
+EVENT_ITEM_FIELDS = (
+    'id,etag,status,summary,description,location,htmlLink,hangoutLink,updated,'
+    'start,end,recurrence,recurringEventId,organizer(email),attendees(email,responseStatus)'
+)
+EVENT_LIST_FIELDS = f'nextPageToken,nextSyncToken,items({EVENT_ITEM_FIELDS})'
+TASK_ITEM_FIELDS = 'id,etag,title,notes,status,due,completed,updated,deleted,hidden,parent,position'
+TASK_LIST_FIELDS = f'nextPageToken,items({TASK_ITEM_FIELDS})'
+TASKLIST_LIST_FIELDS = 'nextPageToken,items(id,title,updated)'
+
+
+def iter_pages(collection, fields=None, **params):
+    if fields:
+        params['fields'] = fields
+    request = collection.list(**params)
+    while request is not None:
+        response = execute(request)
+        yield response
+        request = collection.list_next(request, response)
+
+
+def iter_items(collection, fields=None, **params):
+    for page in iter_pages(collection, fields, **params):
+        yield from page.get('items', [])
@@ -1,17 +1,199 @@
 # extractor.py
+import hashlib
 import os
 import json
 import re
-import google.generativeai as genai
+import threading
 from dotenv import load_dotenv
+from intents import BATCH_RESPONSE_SCHEMA, PLAN_MESSAGE, RESPONSE_SCHEMA, SYSTEM_INSTRUCTION, parse_plan
+from json_stream import IncrementalJSONParser, first_json_value, iter_json_values
+from llm_cache import get_prompt_cache
+from metrics import incr, span
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = genai.GenerativeModel(model_name="models/gemini-2.0-flash")
+MODEL_NAME = "models/gemini-2.0-flash"
+# 'structured': short system instruction plus schema-constrained JSON, read
+# as it streams. 'legacy': the full instruction block in every request.
+EXTRACTOR_MODE = os.getenv("EXTRACTOR_MODE", "structured").lower()
+# Structured answers that still fail validation are asked for again this often.
+STRUCTURED_RETRIES = 1
 
-def extract_meeting_details(prompt): 
-    response = model.generate_content(
-        f"""
+# The Gemini SDK takes seconds to import, so it loads on the first model call;
+# commands answered by fast_parse or the prompt cache never pay for it.
+model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                with span('llm.load'):
+                    import google.generativeai as genai
+                    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                    if EXTRACTOR_MODE == 'structured':
+                        # Built once; each request then carries only the sentences.
+                        model = genai.GenerativeModel(model_name=MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION)
+                    else:
+                        model = genai.GenerativeModel(model_name=MODEL_NAME)
+    return model
+
+SHOW_TASKS_PATTERNS = [
+    re.compile(r"^(?:please\s+)?(?:show|list|view|display|get)(?:\s+me)?(?:\s+(?:my|all|the))*(?:\s+upcoming|\s+pending|\s+open)?\s+tasks?$"),
+    re.compile(r"^(?:what|which) tasks?(?: do i have| are (?:pending|upcoming|due))?$"),
+    re.compile(r"^what do i (?:need|have) to do$"),
+]
+DAILY_SUMMARY_PATTERNS = [
+    re.compile(r"^(?:show\s+(?:me\s+)?)?(?:my\s+)?(?:today'?s|todays)\s+(?:schedule|agenda|summary|plan)$"),
+    re.compile(r"^(?:show\s+(?:me\s+)?)?(?:my\s+)?(?:schedule|agenda|plan)\s+(?:for\s+)?today$"),
+    re.compile(r"^(?:daily|day)\s+summary$"),
+    re.compile(r"^what'?s?\s+(?:is\s+)?(?:on\s+)?my\s+(?:day|schedule|agenda)(?:\s+today)?$"),
+    re.compile(r"^what do i have (?:on\s+)?today$"),
+]
+MARK_DONE_PATTERNS = [
+    re.compile(r"^(?:mark|set)\s+(?:the\s+)?(?:task\s+)?(?P<title>.+?)\s+(?:as\s+)?(?:done|complete|completed|finished)$"),
+    re.compile(r"^(?:complete|finish)\s+(?:the\s+)?task\s+(?P<title>.+)$"),
+    re.compile(r"^i\s+(?:have\s+|'ve\s+)?(?:finished|completed|done)\s+(?:the\s+)?(?:task\s+)?(?P<title>.+)$"),
+]
+# The title is greedy, so "work on the slides by friday" splits at the last "by".
+ADD_TASK_PATTERNS = [
+    re.compile(r"^(?:add|create|new)\s+(?:a\s+)?task\s+(?:to\s+)?(?P<title>.+)\s+(?:by|on|due|before)\s+(?P<due>.+)$"),
+    re.compile(r"^remind me to\s+(?P<title>.+)\s+(?:by|on|at|before)\s+(?P<due>.+)$"),
+]
+
+_WEEKDAY = r"(?:mon|tues|wednes|thurs|fri|satur|sun)day"
+BULK_EVENT_PATTERNS = [
+    ('cancel', re.compile(rf"^(?:cancel|delete|clear)\s+(?:all\s+)?(?:of\s+)?my\s+(?P<weekday>{_WEEKDAY})s?\s+(?:meetings|events)$")),
+    ('reschedule', re.compile(
+        rf"^(?:move|reschedule|shift|push)\s+(?:all\s+)?(?:of\s+)?my\s+(?P<weekday>{_WEEKDAY})s?\s+(?:meetings|events)\s+to\s+(?P<to_weekday>{_WEEKDAY})s?$"
+    )),
+    ('extend', re.compile(
+        rf"^extend\s+(?:all\s+)?(?:of\s+)?my\s+(?P<weekday>{_WEEKDAY})s?\s+(?:meetings|events)\s+by\s+(?P<minutes>\d+)\s+min(?:ute)?s?$"
+    )),
+]
+
+def _is_date_phrase(phrase):
+    # A due date that is not wholly a date means the split was wrong; let the model decide.
+    from datetime_utils import is_date_phrase
+    return is_date_phrase(_clean_phrase(phrase))
+
+def _clean_phrase(text):
+    return text.strip().strip('"\'').strip()
+
+def fast_parse(prompt):
+    # Compound prompts are split first, or the last pattern would swallow the
+    # rest as a due date. One that cannot be answered locally as a whole goes
+    # to the model rather than being parsed as a single command.
+    if len(_plan_parts(prompt)) > 1:
+        return _fast_parse_plan(prompt)
+    return _fast_parse_command(prompt)
+
+def _fast_parse_command(prompt):
+    text = re.sub(r'\s+', ' ', (prompt or '').strip().lower()).rstrip('.!?').replace('’', "'")
+
+    if any(pattern.match(text) for pattern in SHOW_TASKS_PATTERNS):
+        return {
+            "action": "show",
+            "confirmation_message": "Here are your upcoming tasks! Stay on track."
+        }
+
+    if any(pattern.match(text) for pattern in DAILY_SUMMARY_PATTERNS):
+        return {
+            "action": "daily_summary",
+            "confirmation_message": "Here’s your schedule for today! Let's get organized."
+        }
+
+    for operation, pattern in BULK_EVENT_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            details = {
+                "target": "events",
+                "operation": operation,
+                "filter": {"weekday": match.group('weekday')}
+            }
+            if operation == 'reschedule':
+                details["to_weekday"] = match.group('to_weekday')
+            elif operation == 'extend':
+                details["extend_minutes"] = int(match.group('minutes'))
+            return {
+                "action": "bulk_update",
+                "bulk_details": details,
+                "confirmation_message": "Done! Your meetings have been updated."
+            }
+
+    # Titles are taken from the original prompt so their casing survives.
+    original = re.sub(r'\s+', ' ', prompt.strip()).rstrip('.!?')
+
+    for pattern in MARK_DONE_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            title = _clean_phrase(original[match.start('title'):match.end('title')])
+            return {
+                "task_details": {
+                    "title": title,
+                    "action": "update",
+                    "updated_fields": {"status": "completed"}
+                },
+                "confirmation_message": "Well done! Your task is marked as completed."
+            }
+
+    for pattern in ADD_TASK_PATTERNS:
+        match = pattern.match(text)
+        if match and _is_date_phrase(match.group('due')):
+            return {
+                "task_details": {
+                    "title": _clean_phrase(original[match.start('title'):match.end('title')]),
+                    "due_date": _clean_phrase(match.group('due')),
+                    "action": "add",
+                    "updated_fields": {}
+                },
+                "confirmation_message": "Your task has been updated successfully!"
+            }
+
+    return None
+
+# Only unambiguous separators; "and" is too common inside a single request.
+PLAN_SEPARATOR = re.compile(
+    r"\s*(?:;|,?\s+and then\s+|,?\s+then\s+|\.\s+(?:(?:and\s+)?then\s+)?(?=\S))\s*", re.IGNORECASE
+)
+
+def _plan_parts(prompt):
+    return [part for part in PLAN_SEPARATOR.split((prompt or '').strip().rstrip('.!?')) if part.strip()]
+
+def _fast_parse_plan(prompt):
+    # "add task report by friday; show my tasks" -> a plan, if every part is a local command.
+    parts = _plan_parts(prompt)
+    if len(parts) < 2:
+        return None
+    steps = []
+    for part in parts:
+        parsed = _fast_parse_command(part)
+        if not parsed:
+            return None
+        steps.append({**parsed, 'text': part})
+    return {'plan': steps, 'confirmation_message': PLAN_MESSAGE}
+
+def extract_meeting_details(prompt, use_cache=True):
+    with span('parse') as s:
+        parsed = fast_parse(prompt)
+        if parsed:
+            s.set(source='fast')
+            return parsed
+
+        cache = get_prompt_cache() if use_cache else None
+        if cache:
+            cached = cache.get(prompt, cache_version())
+            if cached is not None:
+                s.set(source='cache')
+                return cached
+
+        s.set(source='model')
+        parsed = _extract_with_model(prompt)
+        if cache and parsed:
+            cache.set(prompt, parsed, cache_version())
+        return parsed
+
+EXTRACTION_INSTRUCTIONS = """
         You are SmartSchedulerGPT – an AI assistant that understands natural language requests and identifies whether the user is talking about a MEETING, a TASK, or a DAILY SUMMARY.
         Extract the user input accurately, including date and time, and return a JSON object with the relevant details.
 
@@ -22,43 +204,68 @@ def extract_meeting_details(prompt):
         - "confirmation_message" (a friendly message confirming the action)
 
         👥 For MEETING requests, include:
-        "meeting_details": {{
+        "meeting_details": {
             "description": string,
             "attendees": [list of names or emails],
             "date_time": string,
             "platform": string (e.g., Zoom, Google Meet),
-            "purpose": string
-        }}
+            "purpose": string,
+            "recurrence": string (optional, an RRULE such as "RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR" for repeating meetings)
+        }
         After completing a meeting request, add:
         "confirmation_message": "Your meeting details have been saved! Looking forward to it."
 
         ✅ For TASK requests, include:
-        "task_details": {{
+        "task_details": {
             "title": string,
             "due_date": string,
             "category": "work" or "personal",
             "action": "add", "update", "delete", or "show",
             "task_id": string (optional),
-            "updated_fields": {{
+            "recurrence": string (optional, an RRULE for repeating tasks, e.g. "RRULE:FREQ=WEEKLY;COUNT=4"),
+            "updated_fields": {
                 "title": string (optional),
                 "due_date": string (optional),
                 "status": string (optional)
-            }}
-        }}
+            }
+        }
         After completing a task request, add:
         "confirmation_message": "Your task has been updated successfully!"
 
         🗓️ If the user asks for today’s schedule or summary, return:
-        {{
+        {
             "action": "daily_summary",
             "confirmation_message": "Here’s your schedule for today! Let's get organized."
-        }}
+        }
 
         📋 If the user asks to see tasks (e.g., "show tasks", "list upcoming tasks", "what do I need to do"), return:
-        {{
+        {
             "action": "show",
             "confirmation_message": "Here are your upcoming tasks! Stay on track."
-        }}
+        }
+
+        🔁 If the user wants to reschedule, cancel or extend MANY meetings or tasks at once
+        (e.g., "move all my Friday meetings to Monday", "cancel every meeting with bob@x.com next week",
+        "push all report tasks back 2 days"), return:
+        {
+            "action": "bulk_update",
+            "bulk_details": {
+                "target": "events" or "tasks",
+                "operation": "reschedule", "cancel" or "extend",
+                "filter": {
+                    "weekday": string (optional),
+                    "purpose": string (optional, events: words in the title),
+                    "attendee": string (optional, events: an email),
+                    "title": string (optional, tasks: words in the title),
+                    "from": string (optional, first day of the range),
+                    "to": string (optional, last day of the range)
+                },
+                "to_weekday": string (optional, the weekday to move to),
+                "shift_days": number (optional, days to move by; negative moves earlier),
+                "extend_minutes": number (optional, events only)
+            },
+            "confirmation_message": "Done! Your meetings have been updated."
+        }
 
         ⚠️ If the user says a task is done or complete:
         - Set action to "update"
@@ -67,24 +274,152 @@ def extract_meeting_details(prompt):
         After completing a task request, add:
         "confirmation_message": "Well done! Your task is marked as completed."
 
+        🧩 If the sentence holds several independent requests (e.g., "schedule sync with a@x.com Friday and add task to prep slides by Thursday"), return:
+        {
+            "plan": [one object per request, in order, each in the format above plus "text": the words it came from],
+            "confirmation_message": "All done! Here's what I did."
+        }
+
         Always respond with a valid JSON object. No markdown, no extra explanation.
+"""
 
-        Sentence: "{prompt}"
-        """
-    )
+BATCH_INSTRUCTIONS = """
+        You will receive several numbered sentences. Treat each one independently and
+        return a JSON array with exactly one object per sentence, in the same order.
+        No markdown, no extra explanation.
+"""
 
+_cache_versions = {}
 
+def cache_version():
+    # Cached answers are only valid for the mode, model, instructions and schema that produced them.
+    version = _cache_versions.get(EXTRACTOR_MODE)
+    if version is None:
+        if EXTRACTOR_MODE == 'structured':
+            source = SYSTEM_INSTRUCTION + json.dumps([RESPONSE_SCHEMA, BATCH_RESPONSE_SCHEMA], sort_keys=True)
+        else:
+            source = EXTRACTION_INSTRUCTIONS + BATCH_INSTRUCTIONS
+        digest = hashlib.sha256(f"{MODEL_NAME}\n{source}".encode('utf-8')).hexdigest()[:16]
+        version = _cache_versions[EXTRACTOR_MODE] = f"{EXTRACTOR_MODE}:{digest}"
+    return version
 
-    try:
-        text = response.text.strip()
-        match = re.search(r'{.*}', text, re.DOTALL)
-        if not match:
-            raise ValueError("No JSON found in Gemini response")
+def _generate(request_text, sentences=1):
+    with span('llm.generate', sentences=sentences):
+        incr('llm.calls')
+        incr('llm.bytes_out', len(request_text.encode('utf-8')))
+        response = get_model().generate_content(request_text)
+        incr('llm.bytes_in', len(response.text.encode('utf-8')))
+        return response
 
-        parsed = json.loads(match.group())
-        return parsed
+def _stream_json(request_text, schema, sentences=1, unwrap_array=False):
+    # Schema-constrained answer, parsed chunk by chunk as it streams in.
+    config = {'response_mime_type': 'application/json', 'response_schema': schema, 'temperature': 0}
+    parser = IncrementalJSONParser(unwrap_array)
+    values = []
+    with span('llm.generate', sentences=sentences, mode='structured'):
+        incr('llm.calls')
+        incr('llm.bytes_out', len(request_text.encode('utf-8')))
+        for chunk in get_model().generate_content(request_text, generation_config=config, stream=True):
+            try:
+                text = chunk.text or ''
+            except ValueError:
+                # The closing chunk may carry only a finish reason.
+                text = ''
+            incr('llm.bytes_in', len(text.encode('utf-8')))
+            values.extend(parser.feed(text))
+        parser.close()
+    return values
+
+def _to_command(answer):
+    return parse_plan(answer)
+
+def _extract_structured(prompt):
+    for attempt in range(STRUCTURED_RETRIES + 1):
+        try:
+            answers = _stream_json(f"Sentence: {json.dumps(prompt)}", RESPONSE_SCHEMA)
+            if not answers:
+                raise ValueError("No JSON found in Gemini response")
+            return _to_command(answers[0])
+        except ValueError as e:
+            incr('llm.parse_errors', mode='structured')
+            if attempt == STRUCTURED_RETRIES:
+                raise
+            print("⚠️ Retrying malformed Gemini response:", e)
+
+def _extract_with_model(prompt):
+    if EXTRACTOR_MODE == 'structured':
+        return _extract_structured(prompt)
 
+    response = _generate(f"{EXTRACTION_INSTRUCTIONS}\n        Sentence: \"{prompt}\"\n")
+    try:
+        return first_json_value(response.text)
     except Exception as e:
+        incr('llm.parse_errors')
         print("❌ Error parsing Gemini response:", e)
         print("Raw response:", response.text)
         raise
+
+def _extract_batch_structured(prompts):
+    # Each element is validated on its own; one that fails becomes None and
+    # is retried as a single sentence by the caller.
+    sentences = "\n".join(f"{i}. {json.dumps(prompt)}" for i, prompt in enumerate(prompts, 1))
+    request = f"Return one command per numbered sentence, in order.\n{sentences}"
+    results = []
+    for answer in _stream_json(request, BATCH_RESPONSE_SCHEMA, len(prompts), unwrap_array=True):
+        try:
+            results.append(_to_command(answer))
+        except ValueError as e:
+            incr('llm.parse_errors', mode='structured')
+            print("⚠️ Invalid command in batched Gemini response:", e)
+            results.append(None)
+    if len(results) != len(prompts):
+        raise ValueError(f"Expected {len(prompts)} results from Gemini, got {len(results)}")
+    return results
+
+def _extract_batch_with_model(prompts):
+    if EXTRACTOR_MODE == 'structured':
+        return _extract_batch_structured(prompts)
+
+    sentences = "\n".join(f"        {i}. {json.dumps(prompt)}" for i, prompt in enumerate(prompts, 1))
+    response = _generate(f"{EXTRACTION_INSTRUCTIONS}{BATCH_INSTRUCTIONS}\n{sentences}\n", len(prompts))
+
+    parsed = list(iter_json_values([response.text], unwrap_array=True))
+    if len(parsed) != len(prompts):
+        raise ValueError(f"Expected {len(prompts)} results from Gemini, got {len(parsed)}")
+    return parsed
+
+def extract_meeting_details_batch(prompts, use_cache=True):
+    # Returns one parsed dict (or the exception raised for it) per prompt, in order.
+    results = [None] * len(prompts)
+    cache = get_prompt_cache() if use_cache else None
+    pending = []
+    for i, prompt in enumerate(prompts):
+        parsed = fast_parse(prompt)
+        if parsed is None and cache:
+            parsed = cache.get(prompt, cache_version())
+        if parsed is None:
+            pending.append(i)
+        results[i] = parsed
+
+    if not pending:
+        return results
+
+    try:
+        batch = _extract_batch_with_model([prompts[i] for i in pending])
+    except Exception as e:
+        incr('llm.batch_fallbacks')
+        print("⚠️ Batched extraction failed, falling back to one call per sentence:", e)
+        batch = None
+
+    for position, i in enumerate(pending):
+        parsed = batch[position] if batch and isinstance(batch[position], dict) else None
+        if parsed is None:
+            try:
+                parsed = _extract_with_model(prompts[i])
+            except Exception as e:
+                results[i] = e
+                continue
+        if cache and parsed:
+            cache.set(prompts[i], parsed, cache_version())
+        results[i] = parsed
+    return results
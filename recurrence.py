@@ -0,0 +1,202 @@
+# recurrence.py
+import datetime
+import functools
+import heapq
+import re
+
+import pytz
+from dateutil.rrule import rrulestr
+
+from datetime_utils import resolve_datetime, timezone_name
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+RRULE_DAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+# Series without COUNT or UNTIL are expanded this far for previews and conflict checks.
+DEFAULT_HORIZON_DAYS = 90
+MAX_OCCURRENCES = 500
+
+_DAY = r"(?:mon|tues|wednes|thurs|fri|satur|sun)day"
+_DAY_LIST = rf"{_DAY}s?(?:(?:\s*,\s*|\s+and\s+|\s*&\s*|\s*,\s*and\s+){_DAY}s?)*"
+# Only explicit phrases count: "weekly report" or "monthly review" name a
+# thing, not a schedule, so bare frequency adjectives are left alone.
+_EVERY = r"\b(?:every|each)\s+(?P<other>other\s+)?"
+FREQUENCY_PATTERNS = [
+    (re.compile(rf"{_EVERY}weekdays?\b|\bon\s+weekdays\b"), 'WEEKLY', 'MO,TU,WE,TH,FR'),
+    (re.compile(rf"{_EVERY}(?P<days>{_DAY_LIST})\b|\bon\s+(?P<plural>{_DAY_LIST})\b"), 'WEEKLY', None),
+    (re.compile(rf"{_EVERY}day\b"), 'DAILY', None),
+    (re.compile(rf"{_EVERY}week\b"), 'WEEKLY', None),
+    (re.compile(rf"{_EVERY}month\b"), 'MONTHLY', None),
+    (re.compile(rf"{_EVERY}year\b"), 'YEARLY', None),
+]
+COUNT_PATTERN = re.compile(r"\bfor\s+(?:the\s+next\s+)?(?P<count>\d+)\s+(?P<unit>times|occurrences|sessions|days|weeks|months|years)\b")
+UNTIL_PATTERN = re.compile(r"\buntil\s+(?P<until>.+?)(?=\s+(?:at|from)\s|$)")
+UNITS = {'days': 'DAILY', 'weeks': 'WEEKLY', 'months': 'MONTHLY', 'years': 'YEARLY'}
+
+
+def _days_in(text):
+    return [RRULE_DAYS[WEEKDAYS.index(day)] for day in WEEKDAYS if day in text]
+
+
+def parse_recurrence(text, user_id=None):
+    # "standup every weekday at 9am for 4 weeks" -> "RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR;COUNT=20".
+    # Returns None when the text does not describe a repeating schedule.
+    text = (text or '').lower()
+    for pattern, freq, byday in FREQUENCY_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        groups = match.groupdict()
+        if freq == 'WEEKLY' and byday is None and (groups.get('days') or groups.get('plural')):
+            # "on mondays" repeats; "on monday" is a single date.
+            if groups.get('plural') and not re.search(rf"{_DAY}s\b", groups['plural']):
+                continue
+            byday = ','.join(_days_in(groups.get('days') or groups['plural']))
+        parts = [f"FREQ={freq}"]
+        if groups.get('other'):
+            parts.append("INTERVAL=2")
+        if byday:
+            parts.append(f"BYDAY={byday}")
+
+        count = COUNT_PATTERN.search(text)
+        until = UNTIL_PATTERN.search(text)
+        if count:
+            n, unit = int(count.group('count')), count.group('unit')
+            if UNITS.get(unit) == freq:
+                n *= len(byday.split(',')) if byday else 1
+            elif unit not in ('times', 'occurrences', 'sessions'):
+                n = None
+            if n:
+                parts.append(f"COUNT={n}")
+        elif until:
+            try:
+                last_day = resolve_datetime(until.group('until'), user_id=user_id)
+            except ValueError:
+                last_day = None
+            if last_day:
+                end_of_day = last_day.replace(hour=23, minute=59, second=59)
+                parts.append(f"UNTIL={end_of_day.astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')}")
+        return "RRULE:" + ';'.join(parts)
+    return None
+
+
+def strip_recurrence(text):
+    # Leaves the part parsedatetime understands: "every weekday at 9am" -> "at 9am".
+    text = text or ''
+    for pattern in [p for p, _, _ in FREQUENCY_PATTERNS] + [COUNT_PATTERN, UNTIL_PATTERN]:
+        text = pattern.sub(' ', text.lower())
+    return ' '.join(text.split())
+
+
+def weekday_index(name):
+    # "fri", "Friday", "fridays" -> 4
+    name = (name or '').strip().lower()
+    for i, day in enumerate(WEEKDAYS):
+        if len(name) >= 3 and (day.startswith(name) or name == day + 's'):
+            return i
+    raise ValueError(f"Unknown weekday: '{name}'")
+
+
+def days_until_weekday(current, target):
+    # Always moves forward: Friday -> Monday is 3 days, Monday -> Monday a week.
+    return (target - current) % 7 or 7
+
+
+def to_rules(recurrence, user_id=None):
+    # Accepts an RRULE string, a list of them, or a phrase like "every weekday".
+    values = [recurrence] if isinstance(recurrence, str) else list(recurrence or [])
+    rules = []
+    for value in values:
+        if '=' in value:
+            rules.append(normalize_rrule(value))
+        else:
+            rule = parse_recurrence(value, user_id)
+            if rule is None:
+                raise ValueError(f"Could not understand recurrence: '{value}'")
+            rules.append(rule)
+    if not rules:
+        raise ValueError("Empty recurrence rule")
+    return rules
+
+
+def normalize_rrule(rule):
+    rule = (rule or '').strip()
+    if not rule:
+        raise ValueError("Empty recurrence rule")
+    if ':' not in rule:
+        rule = "RRULE:" + rule
+    name, _, value = rule.partition(':')
+    if name.upper() in ('RRULE', 'EXRULE'):
+        rule = f"{name.upper()}:{value.upper()}"
+    # Validates the rule; dateutil raises ValueError on anything malformed.
+    _rule_set((rule,), datetime.datetime(2000, 1, 1), 'UTC')
+    return rule
+
+
+def _localize_until(rule, tz):
+    # Google wants UNTIL in UTC, while dateutil wants it in the same naive
+    # terms as DTSTART, which here is local wall-clock time.
+    def local(match):
+        value = match.group(1)
+        if len(value) == 8:
+            return match.group(0)
+        until = pytz.utc.localize(datetime.datetime.strptime(value[:15], '%Y%m%dT%H%M%S'))
+        return f"UNTIL={until.astimezone(tz).strftime('%Y%m%dT%H%M%S')}"
+
+    return re.sub(r"UNTIL=(\d{8}(?:T\d{6}Z)?)", local, rule)
+
+
+@functools.lru_cache(maxsize=256)
+def _rule_set(rules, dtstart, tz_name):
+    tz = pytz.timezone(tz_name)
+    return rrulestr('\n'.join(_localize_until(rule, tz) for rule in rules), dtstart=dtstart, forceset=True, cache=True)
+
+
+def occurrences(rules, start, window_start=None, window_end=None, limit=MAX_OCCURRENCES):
+    # Aware start datetimes of a series beginning at `start`, in its timezone.
+    # Expansion runs on local wall-clock time, like Google, so a 9:00 meeting
+    # stays at 9:00 across DST changes.
+    if isinstance(rules, str):
+        rules = [rules]
+    tz = pytz.timezone(timezone_name(start))
+    local_start = start.astimezone(tz)
+    rule_set = _rule_set(tuple(normalize_rrule(r) for r in rules), local_start.replace(tzinfo=None), tz.zone)
+    window_start = window_start or local_start
+    window_end = window_end or local_start + datetime.timedelta(days=DEFAULT_HORIZON_DAYS)
+
+    # Pad the naive window by a day so DST offsets cannot clip its edges.
+    after = window_start.astimezone(tz).replace(tzinfo=None) - datetime.timedelta(days=1)
+    result = []
+    for naive in rule_set.xafter(after, inc=True):
+        occurrence = tz.localize(naive)
+        if occurrence > window_end:
+            break
+        if occurrence >= window_start:
+            result.append(occurrence)
+            if len(result) >= limit:
+                break
+    return result
+
+
+def first_occurrence(rules, start):
+    # Google counts DTSTART as an instance even when the rule would skip it,
+    # so a series should start on its first real occurrence.
+    found = occurrences(rules, start, window_end=start + datetime.timedelta(days=366), limit=1)
+    return found[0] if found else start
+
+
+def find_conflicts(intervals, busy):
+    # intervals: sorted (start, end) occurrences; busy: (start, end, item)
+    # sorted by start. Returns [(interval, item)] for every overlap in one sweep.
+    conflicts = []
+    active = []
+    j = 0
+    for start, end in intervals:
+        while j < len(busy) and busy[j][0] < end:
+            heapq.heappush(active, (busy[j][1], j))
+            j += 1
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for busy_end, index in active:
+            if busy[index][0] < end:
+                conflicts.append(((start, end), busy[index][2]))
+    return conflicts
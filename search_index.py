@@ -0,0 +1,200 @@
+# search_index.py
+import re
+import threading
+
+from mirror import to_utc_string
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+MIN_TOKEN_SIMILARITY = 0.4
+
+
+def normalize_tokens(text):
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TokenIndex:
+    def __init__(self):
+        self._postings = {}
+        self._trigrams = {}
+        self._trigram_counts = {}
+        self._doc_tokens = {}
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def add(self, doc_id, text):
+        self.remove(doc_id)
+        tokens = set(normalize_tokens(text))
+        self._doc_tokens[doc_id] = tokens
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                grams = trigrams(token)
+                self._trigram_counts[token] = len(grams)
+                for gram in grams:
+                    self._trigrams.setdefault(gram, set()).add(token)
+            postings.add(doc_id)
+
+    def remove(self, doc_id):
+        for token in self._doc_tokens.pop(doc_id, ()):
+            postings = self._postings[token]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[token]
+                del self._trigram_counts[token]
+                for gram in trigrams(token):
+                    tokens = self._trigrams[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigrams[gram]
+
+    def similar_tokens(self, token, min_similarity=MIN_TOKEN_SIMILARITY):
+        grams = trigrams(token)
+        shared = {}
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        similar = {}
+        for candidate, count in shared.items():
+            if candidate == token:
+                similarity = 1.0
+            elif candidate.startswith(token) or token.startswith(candidate):
+                # Prefixes ("sync" / "syncs", "mtg" typed partially) rank just below exact hits.
+                similarity = max(0.85, count / (len(grams) + self._trigram_counts[candidate] - count))
+            else:
+                similarity = count / (len(grams) + self._trigram_counts[candidate] - count)
+            if similarity >= min_similarity:
+                similar[candidate] = similarity
+        return similar
+
+    def score(self, query, candidates=None):
+        query_tokens = list(dict.fromkeys(normalize_tokens(query)))
+        if not query_tokens:
+            return {}
+
+        best = {}
+        for position, query_token in enumerate(query_tokens):
+            for token, similarity in self.similar_tokens(query_token).items():
+                for doc_id in self._postings[token]:
+                    if candidates is not None and doc_id not in candidates:
+                        continue
+                    matches = best.setdefault(doc_id, [0.0] * len(query_tokens))
+                    if similarity > matches[position]:
+                        matches[position] = similarity
+
+        # Mostly how much of the query matched, with a small preference for
+        # documents that have few tokens left unmatched.
+        scores = {}
+        for doc_id, matches in best.items():
+            query_coverage = sum(matches) / len(query_tokens)
+            doc_coverage = min(1.0, sum(1 for m in matches if m) / len(self._doc_tokens[doc_id]))
+            scores[doc_id] = 0.85 * query_coverage + 0.15 * doc_coverage
+        return scores
+
+
+class EventIndex:
+    def __init__(self):
+        self._events = {}
+        self._starts = {}
+        self._by_email = {}
+        self._summaries = TokenIndex()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._events)
+
+    def _add(self, event):
+        event_id = event['id']
+        self._remove(event_id)
+        self._events[event_id] = event
+        start = event.get('start', {})
+        self._starts[event_id] = to_utc_string(start.get('dateTime', start.get('date'))) or ''
+        for attendee in event.get('attendees', []):
+            email = (attendee.get('email') or '').lower()
+            if email:
+                self._by_email.setdefault(email, set()).add(event_id)
+        self._summaries.add(event_id, event.get('summary', ''))
+
+    def _remove(self, event_id):
+        event = self._events.pop(event_id, None)
+        if event is None:
+            return
+        del self._starts[event_id]
+        for attendee in event.get('attendees', []):
+            email = (attendee.get('email') or '').lower()
+            ids = self._by_email.get(email)
+            if ids is not None:
+                ids.discard(event_id)
+                if not ids:
+                    del self._by_email[email]
+        self._summaries.remove(event_id)
+
+    def apply(self, changed=(), removed=()):
+        with self._lock:
+            for event in changed:
+                self._add(event)
+            for event_id in removed:
+                self._remove(event_id)
+
+    def search(self, attendee_email=None, purpose=None, after=None, limit=5, min_score=0.5):
+        with self._lock:
+            if attendee_email:
+                candidates = self._by_email.get(attendee_email.lower(), set())
+            else:
+                candidates = None
+
+            if purpose:
+                scores = self._summaries.score(purpose, candidates)
+            else:
+                scores = dict.fromkeys(candidates if candidates is not None else self._events, 1.0)
+
+            after = to_utc_string(after) if after else None
+            ranked = [
+                (score, self._starts[event_id], event_id)
+                for event_id, score in scores.items()
+                if score >= min_score and (after is None or self._starts[event_id] >= after)
+            ]
+            ranked.sort(key=lambda item: (-item[0], item[1]))
+            return [(score, self._events[event_id]) for score, _, event_id in ranked[:limit]]
+
+
+class TaskIndex:
+    def __init__(self):
+        self._tasks = {}
+        self._titles = TokenIndex()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def apply(self, changed=(), removed=()):
+        with self._lock:
+            for task in changed:
+                self._tasks[task['id']] = task
+                self._titles.add(task['id'], task.get('title', ''))
+            for task_id in removed:
+                if self._tasks.pop(task_id, None) is not None:
+                    self._titles.remove(task_id)
+
+    def search(self, query, include_completed=False, limit=5, min_score=0.5):
+        with self._lock:
+            normalized = ' '.join(normalize_tokens(query))
+            ranked = []
+            for task_id, score in self._titles.score(query).items():
+                task = self._tasks[task_id]
+                if not include_completed and task.get('status') == 'completed':
+                    continue
+                if score < min_score:
+                    continue
+                # Whole-title matches beat titles that merely contain every query token.
+                exact = ' '.join(normalize_tokens(task.get('title', ''))) == normalized
+                ranked.append((score, exact, task.get('due') or '9999-12-31', task))
+            ranked.sort(key=lambda item: (-item[0], not item[1], item[2]))
+            return [(score, task) for score, _, _, task in ranked[:limit]]
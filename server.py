@@ -0,0 +1,239 @@
+# server.py
+import datetime
+import hmac
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from api_executor import quota_status
+from async_engine import execute_command, parse_command, run, warm_clients_async
+from job_queue import get_job_queue
+from metrics import snapshot
+from user_context import DEFAULT_USER_ID
+
+SERVER_HOST = os.getenv("SCHEDULER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SCHEDULER_PORT", "8080"))
+MAX_BODY_BYTES = 64 * 1024
+MAX_SLOTS = 20
+# Comma-separated "user_id:token" pairs; a request acts as the user whose token
+# it sends as "Authorization: Bearer <token>". Without any, the server only
+# acts as DEFAULT_USER_ID.
+SCHEDULER_API_TOKENS = os.getenv("SCHEDULER_API_TOKENS", "")
+
+
+def parse_api_tokens(value):
+    tokens = {}
+    for pair in value.split(','):
+        user_id, _, token = pair.strip().rpartition(':')
+        if user_id and token:
+            tokens[token] = user_id
+    return tokens
+
+
+API_TOKENS = parse_api_tokens(SCHEDULER_API_TOKENS)
+
+
+class SchedulerRequestHandler(BaseHTTPRequestHandler):
+    server_version = "SmartScheduler/1.0"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        return payload
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+            return
+        # Everything else reports on users or their jobs, so it needs a token.
+        try:
+            user = self._authenticated_user()
+        except PermissionError as e:
+            self._send_json(403, {'error': str(e)})
+            return
+        if self.path == '/quota':
+            self._send_json(200, quota_status(user))
+        elif self.path == '/metrics':
+            self._send_json(200, snapshot())
+        elif urlsplit(self.path).path == '/agenda/week':
+            self._handle_week(user)
+        elif self.path.startswith('/jobs/'):
+            record = get_job_queue().status(unquote(self.path[len('/jobs/'):]))
+            # Another user's job is reported as missing, not as forbidden.
+            if record is None or record['user_id'] != user:
+                self._send_json(404, {'error': "Unknown job"})
+            else:
+                self._send_json(200, record)
+        else:
+            self._send_json(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path == '/notifications/calendar':
+            self._handle_calendar_notification()
+            return
+        handlers = {
+            '/command': self._handle_command,
+            '/parse': self._handle_parse,
+            '/execute': self._handle_execute,
+            '/slots': self._handle_slots,
+        }
+        handler = handlers.get(self.path)
+        if handler is None:
+            self._send_json(404, {'error': f"Unknown path: {self.path}"})
+            return
+        try:
+            payload = self._read_json()
+            user = self._user(payload)
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except PermissionError as e:
+            self._send_json(403, {'error': str(e)})
+            return
+        try:
+            self._send_json(200, handler(payload, user))
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+
+    def _handle_calendar_notification(self):
+        # Google sends the change in headers; the body is empty or ignorable.
+        from agenda import handle_calendar_notification
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(min(length, MAX_BODY_BYTES))
+        accepted = handle_calendar_notification(self.headers)
+        self._send_json(200 if accepted else 403, {'accepted': accepted})
+
+    def _handle_week(self, user):
+        from agenda import get_agenda
+
+        start = parse_qs(urlsplit(self.path).query).get('start', [None])[0]
+        try:
+            start = datetime.date.fromisoformat(start) if start else None
+        except ValueError:
+            self._send_json(400, {'error': "'start' must be a YYYY-MM-DD date"})
+            return
+        try:
+            self._send_json(200, {'days': get_agenda(user).week(start)})
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+
+    def _prompt(self, payload):
+        prompt = (payload.get('prompt') or '').strip()
+        if not prompt:
+            raise ValueError("Missing 'prompt'")
+        return prompt
+
+    def _authenticated_user(self):
+        if not API_TOKENS:
+            return DEFAULT_USER_ID
+        scheme, _, token = (self.headers.get('Authorization') or '').partition(' ')
+        if scheme.lower() == 'bearer':
+            token = token.strip()
+            for known, user_id in API_TOKENS.items():
+                if hmac.compare_digest(known, token):
+                    return user_id
+        raise PermissionError("Missing or invalid API token")
+
+    def _user(self, payload):
+        # A named user must match the token; it is never taken on trust.
+        requested = payload.get('user') or self.headers.get('X-Scheduler-User')
+        if requested is not None and not isinstance(requested, str):
+            raise ValueError("'user' must be a string")
+        user = self._authenticated_user()
+        if requested and requested != user:
+            raise PermissionError(f"Not authorized to act as '{requested}'")
+        return user
+
+    def _handle_parse(self, payload, user):
+        return {'parsed': parse_command(self._prompt(payload), user)}
+
+    def _handle_command(self, payload, user):
+        prompt = self._prompt(payload)
+        parsed = parse_command(prompt, user)
+        if not parsed:
+            return {'parsed': parsed, 'result': {'status': 'invalid', 'error': "Failed to parse input."}}
+        return {'parsed': parsed, 'result': execute_command(parsed, prompt, user)}
+
+    def _handle_execute(self, payload, user):
+        parsed = payload.get('parsed')
+        if not isinstance(parsed, dict):
+            raise ValueError("Missing 'parsed' object")
+        return {'result': execute_command(parsed, payload.get('prompt', ''), user)}
+
+    def _handle_slots(self, payload, user):
+        from calendar_utils import DEFAULT_DURATION_MINUTES, find_meeting_slots
+        from datetime_utils import resolve_datetime
+
+        attendees = payload.get('attendees')
+        if not isinstance(attendees, list) or not all(isinstance(a, str) for a in attendees):
+            raise ValueError("'attendees' must be a list of email addresses")
+        duration = payload.get('duration_minutes', DEFAULT_DURATION_MINUTES)
+        limit = payload.get('limit', 3)
+        if not isinstance(duration, int) or not 0 < duration <= 24 * 60:
+            raise ValueError("'duration_minutes' must be between 1 and 1440")
+        if not isinstance(limit, int) or not 0 < limit <= MAX_SLOTS:
+            raise ValueError(f"'limit' must be between 1 and {MAX_SLOTS}")
+        earliest = payload.get('earliest')
+        if earliest is not None:
+            earliest = resolve_datetime(str(earliest), user_id=user)
+        slots = find_meeting_slots(attendees, duration, earliest, limit, user)
+        return {'slots': [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in slots]}
+
+    def log_message(self, format, *args):
+        print(f"[server] {self.address_string()} - {format % args}")
+
+
+def warm_up():
+    # Pay the SDK imports, model setup, client builds, mirror syncs and the
+    # first week of agenda views once at startup.
+    from agenda import CALENDAR_WEBHOOK_URL, get_agenda
+
+    run(warm_clients_async())
+    # Starts the workers, which resume jobs an earlier process left unfinished.
+    get_job_queue()
+    agenda = get_agenda()
+    try:
+        agenda.refresh()
+    except Exception as e:
+        print(f"⚠️ Warm-up failed for the agenda: {e}")
+    if CALENDAR_WEBHOOK_URL:
+        try:
+            agenda.watch()
+        except Exception as e:
+            print(f"⚠️ Could not register for calendar notifications: {e}")
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT):
+    warm_up()
+    httpd = ThreadingHTTPServer((host, port), SchedulerRequestHandler)
+    httpd.daemon_threads = True
+    print(f"🚀 SmartScheduler API listening on http://{host}:{port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    serve()
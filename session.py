@@ -0,0 +1,218 @@
+# session.py
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from async_engine import execute_command, parse_command, plan_steps, run, warm_clients_async
+from intents import COMPLETED_MESSAGE, MEETING_MESSAGE, TASK_MESSAGE
+from user_context import get_user_context
+
+# Prefetched reads are served while younger than this and nothing was written since.
+SESSION_PREFETCH_SECONDS = float(os.getenv("SESSION_PREFETCH_SECONDS", "30"))
+# How long a follow-up on a just-queued task waits for the task to exist.
+FOLLOW_UP_JOB_WAIT = 10
+READ_INTENTS = ('show', 'daily_summary')
+
+_REF = r"(?:it|that|this)(?:\s+(?:one|task|meeting|event))?"
+FOLLOW_UP_PATTERNS = [
+    ('complete', re.compile(
+        rf"^(?:mark\s+{_REF}\s+(?:as\s+)?(?:done|complete|completed|finished)|(?:complete|finish)\s+{_REF}|(?:it's|that's)\s+done)$"
+    )),
+    ('delete', re.compile(rf"^(?:delete|remove)\s+{_REF}$")),
+    ('move', re.compile(rf"^(?:move|reschedule|push|shift|postpone)\s+{_REF}\s+(?:to|until|till)\s+(?P<when>.+)$")),
+    ('rename', re.compile(rf"^rename\s+{_REF}\s+(?:to|as)\s+(?P<title>.+)$")),
+]
+
+
+class Session:
+    # Keeps one user's clients, model and recent reads warm across commands,
+    # and remembers the last task and meeting so "mark it done" or "move that
+    # to 3pm" need no search.
+    def __init__(self, user=None):
+        self.user = get_user_context(user)
+        self.last_task = None
+        self.last_event = None
+        self.last_kind = None
+        self._reads = {}
+        self._pending = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=4)
+
+    def _warm(self):
+        from prompt_parser import get_model
+
+        run(warm_clients_async(self.user))
+        get_model()
+
+    def _reminders(self):
+        from calendar_utils import get_task_reminder_events
+        return get_task_reminder_events(self.user)
+
+    def _upcoming(self):
+        # Also keeps the task mirror current, so task commands sync only a small delta.
+        from task_utils import get_upcoming_tasks
+        return get_upcoming_tasks(user=self.user)
+
+    def _agenda(self):
+        from agenda import get_agenda
+        return get_agenda(self.user).day()
+
+    def prefetch(self):
+        # Likely next reads, fetched while the user is typing.
+        self._submit('warm', self._warm)
+        self._submit('reminders', self._reminders)
+        self._submit('upcoming', self._upcoming)
+        self._submit('agenda', self._agenda)
+
+    def _submit(self, name, fetch):
+        with self._lock:
+            if name in self._pending:
+                return
+            generation = self._generation
+            self._pending[name] = self._pool.submit(self._fetch, name, fetch, generation)
+
+    def _fetch(self, name, fetch, generation):
+        try:
+            value = fetch()
+        except Exception:
+            # A failed prefetch only means the next read goes to the API.
+            value = None
+        with self._lock:
+            self._pending.pop(name, None)
+            # A write landed while this was in flight; the value may be stale.
+            if value is not None and generation == self._generation:
+                self._reads[name] = (time.monotonic(), value)
+
+    def cached(self, name):
+        with self._lock:
+            entry = self._reads.get(name)
+        if entry is None or time.monotonic() - entry[0] > SESSION_PREFETCH_SECONDS:
+            return None
+        return entry[1]
+
+    def _invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._reads.clear()
+
+    def _task_target(self):
+        task = self.last_task
+        if task is None:
+            return None
+        if task.get('id') is None and task.get('job'):
+            # Queued a moment ago: wait briefly for the job to create it.
+            from job_queue import get_job_queue
+            record = get_job_queue().wait(task['job'], FOLLOW_UP_JOB_WAIT)
+            if record is None or record['status'] != 'done':
+                return None
+            task['id'] = record['state'].get('task')
+        return task if task.get('id') else None
+
+    def follow_up(self, prompt):
+        # Returns a command for "it"/"that" when the session knows what it
+        # refers to, otherwise None and the prompt goes to the parser.
+        text = re.sub(r'\s+', ' ', prompt.strip().lower()).rstrip('.!?').replace('’', "'")
+        # Captures are sliced from the prompt as typed, so titles keep their case.
+        original = re.sub(r'\s+', ' ', prompt.strip()).rstrip('.!?')
+        for operation, pattern in FOLLOW_UP_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                break
+        else:
+            return None
+
+        kind = self.last_kind
+        if 'task' in text:
+            kind = 'task'
+        elif 'meeting' in text or 'event' in text:
+            kind = 'event'
+
+        if kind == 'event' and self.last_event and operation == 'move':
+            event = self.last_event
+            return {
+                'meeting_details': {
+                    'event_id': event['id'],
+                    'reschedule': True,
+                    'date_time': original[match.start('when'):match.end('when')],
+                    'purpose': event.get('purpose') or '',
+                    'attendees': []
+                },
+                'confirmation_message': MEETING_MESSAGE
+            }
+        if kind != 'task':
+            return None
+        task = self._task_target()
+        if task is None:
+            return None
+
+        details = {'title': task['title'], 'task_id': task['id'], 'tasklist': task.get('tasklist') or '@default'}
+        if operation == 'complete':
+            details.update(action='update', updated_fields={'status': 'completed'})
+            return {'task_details': details, 'confirmation_message': COMPLETED_MESSAGE}
+        if operation == 'delete':
+            details.update(action='delete', updated_fields={})
+        elif operation == 'move':
+            details.update(action='update', updated_fields={'due_date': original[match.start('when'):match.end('when')]})
+        else:
+            details.update(action='update', updated_fields={'title': original[match.start('title'):match.end('title')]})
+        return {'task_details': details, 'confirmation_message': TASK_MESSAGE}
+
+    def _cached_read(self, parsed, prompt):
+        # "show my tasks" right after a prefetch is answered without the API.
+        if parsed.get('meeting_details') or parsed.get('task_details'):
+            return None
+        text = prompt.lower()
+        if parsed.get('action') == 'show' or (not parsed.get('action') and 'show' in text and 'task' in text):
+            reminders = self.cached('reminders')
+            if reminders is not None:
+                return {
+                    'intent': 'show',
+                    'status': 'ok',
+                    'reminders': reminders,
+                    'confirmation_message': parsed.get('confirmation_message', "Here are your upcoming tasks!")
+                }
+        return None
+
+    def _remember(self, parsed, result):
+        intent = result.get('intent')
+        if intent == 'plan':
+            steps = plan_steps(parsed)
+            for step, outcome in zip(steps, result['steps']):
+                self._remember(step, outcome)
+            return
+        if result.get('status') not in ('ok', 'queued'):
+            return
+
+        if intent == 'add_task':
+            self.last_task = {'id': result.get('task_id'), 'job': result.get('job'), 'title': result.get('title')}
+            self.last_kind = 'task'
+        elif intent in ('update_task', 'complete_task') and result.get('task'):
+            task = result['task']
+            self.last_task = {'id': task.get('id'), 'title': task.get('title'), 'tasklist': task.get('tasklist')}
+            self.last_kind = 'task'
+        elif intent == 'delete_task':
+            self.last_task = None
+            if self.last_kind == 'task':
+                self.last_kind = None
+        elif intent in ('create_meeting', 'reschedule_meeting') and result.get('event_id'):
+            purpose = (parsed.get('meeting_details') or {}).get('purpose')
+            self.last_event = {'id': result['event_id'], 'purpose': purpose}
+            self.last_kind = 'event'
+
+    def handle(self, prompt):
+        # Returns (parsed, result) like run_command.
+        parsed = self.follow_up(prompt) or parse_command(prompt, self.user)
+        if not parsed:
+            return parsed, {'intent': None, 'status': 'invalid', 'error': "Failed to parse input. Please try again."}
+        result = self._cached_read(parsed, prompt) or execute_command(parsed, prompt, self.user)
+        if result.get('status') != 'invalid' and result.get('intent') not in READ_INTENTS:
+            self._invalidate()
+        self._remember(parsed, result)
+        self.prefetch()
+        return parsed, result
+
+    def close(self):
+        self._pool.shutdown(wait=False)
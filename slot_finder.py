@@ -0,0 +1,124 @@
+# slot_finder.py
+import bisect
+import datetime
+import os
+
+import pytz
+
+from api_executor import execute
+from datetime_utils import get_user_timezone, timezone_name
+
+WORKDAY_START_HOUR = int(os.getenv("WORKDAY_START_HOUR", "9"))
+WORKDAY_END_HOUR = int(os.getenv("WORKDAY_END_HOUR", "18"))
+SEARCH_HORIZON_DAYS = 14
+# freeBusy accepts at most 50 calendars per query.
+FREEBUSY_MAX_ITEMS = 50
+
+
+def _parse_time(value):
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def query_busy(service, emails, time_min, time_max, exclude=()):
+    calendars = list(dict.fromkeys(['primary'] + [e for e in emails if e]))
+    busy = []
+    for i in range(0, len(calendars), FREEBUSY_MAX_ITEMS):
+        response = execute(service.freebusy().query(body={
+            'timeMin': time_min.isoformat(),
+            'timeMax': time_max.isoformat(),
+            'items': [{'id': calendar} for calendar in calendars[i:i + FREEBUSY_MAX_ITEMS]]
+        }))
+        for calendar in response.get('calendars', {}).values():
+            # Calendars we cannot see (external attendees) report errors and count as free.
+            for block in calendar.get('busy', []):
+                interval = (_parse_time(block['start']), _parse_time(block['end']))
+                if interval not in exclude:
+                    busy.append(interval)
+    return busy
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class BusyTimeline:
+    def __init__(self, intervals):
+        self.intervals = merge_intervals(intervals)
+        self._ends = [end for _, end in self.intervals]
+
+    def is_free(self, start, end):
+        i = bisect.bisect_right(self._ends, start)
+        return i == len(self.intervals) or self.intervals[i][0] >= end
+
+    def free_slots(self, window_start, window_end, duration):
+        # Walk only the busy blocks that overlap this window.
+        i = bisect.bisect_right(self._ends, window_start)
+        cursor = window_start
+        while cursor + duration <= window_end:
+            if i < len(self.intervals) and self.intervals[i][0] < cursor + duration:
+                cursor = max(cursor, self.intervals[i][1])
+                i += 1
+                continue
+            yield cursor, cursor + duration
+            cursor += duration
+
+
+def _working_windows(start, horizon_end, tz, workday_start, workday_end, weekdays_only):
+    day = start.astimezone(tz).date()
+    while True:
+        window_start = tz.localize(datetime.datetime.combine(day, datetime.time(workday_start)))
+        window_end = tz.localize(datetime.datetime.combine(day, datetime.time(workday_end)))
+        if window_start >= horizon_end:
+            return
+        if not weekdays_only or day.weekday() < 5:
+            yield max(window_start, start), min(window_end, horizon_end)
+        day += datetime.timedelta(days=1)
+
+
+def _round_up(dt, minutes=15):
+    dt = dt.replace(second=0, microsecond=0)
+    remainder = dt.minute % minutes
+    return dt + datetime.timedelta(minutes=minutes - remainder) if remainder else dt
+
+
+def find_free_slots(timeline, duration, earliest, horizon_end, tz, limit=3,
+                    workday_start=WORKDAY_START_HOUR, workday_end=WORKDAY_END_HOUR, weekdays_only=True):
+    slots = []
+    for window_start, window_end in _working_windows(_round_up(earliest), horizon_end, tz,
+                                                     workday_start, workday_end, weekdays_only):
+        for slot in timeline.free_slots(window_start, window_end, duration):
+            slots.append(slot)
+            if len(slots) >= limit:
+                return slots
+    return slots
+
+
+def find_slots(service, attendee_emails, duration_minutes=60, earliest=None, horizon_days=SEARCH_HORIZON_DAYS,
+               limit=3, tz=None, exclude=()):
+    tz = tz or get_user_timezone()
+    earliest = earliest or datetime.datetime.now(tz)
+    horizon_end = earliest + datetime.timedelta(days=horizon_days)
+    timeline = BusyTimeline(query_busy(service, attendee_emails, earliest, horizon_end, exclude))
+    duration = datetime.timedelta(minutes=duration_minutes)
+    return find_free_slots(timeline, duration, earliest, horizon_end, tz, limit)
+
+
+def first_available_start(service, attendee_emails, requested_start, duration_minutes=60,
+                          horizon_days=SEARCH_HORIZON_DAYS, exclude=()):
+    duration = datetime.timedelta(minutes=duration_minutes)
+    horizon_end = requested_start + datetime.timedelta(days=horizon_days)
+    timeline = BusyTimeline(query_busy(service, attendee_emails, requested_start, horizon_end, exclude))
+    if timeline.is_free(requested_start, requested_start + duration):
+        return requested_start
+    tz = pytz.timezone(timezone_name(requested_start))
+    slots = find_free_slots(timeline, duration, requested_start, horizon_end, tz, limit=1)
+    if not slots:
+        raise ValueError(f"No free {duration_minutes}-minute slot for all attendees in the next {horizon_days} days.")
+    return slots[0][0]
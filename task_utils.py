@@ -1,119 +1,315 @@
 # task_utils.py
 import datetime
-import parsedatetime as pdt
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
 import os
-import pickle
-from dotenv import load_dotenv
+import uuid
 
-load_dotenv()
+from datetime_utils import resolve_datetime, to_task_due
+from api_executor import execute
+from google_clients import get_service
+from job_queue import Step, get_job_queue
+from mirror import get_mirror, to_utc_string, utc_now_string
+from pagination import TASKLIST_LIST_FIELDS, TASK_LIST_FIELDS, iter_items
+from recurrence import days_until_weekday, first_occurrence, occurrences, strip_recurrence, to_rules, weekday_index
+from search_index import TaskIndex
+from user_context import get_user_context
 
 SCOPES = ['https://www.googleapis.com/auth/tasks']
-DEFAULT_ATTENDEE = os.getenv("EMAIL_ADDRESS")
-
-def get_tasks_service():
-    creds = None
-    if os.path.exists('token_tasks.pkl'):
-        with open('token_tasks.pkl', 'rb') as token:
-            creds = pickle.load(token)
-    if not creds or not creds.valid:
-        flow = InstalledAppFlow.from_client_secrets_file('oauth_credentials.json', SCOPES)
-        creds = flow.run_local_server(port=0)
-        with open('token_tasks.pkl', 'wb') as token:
-            pickle.dump(creds, token)
-    return build('tasks', 'v1', credentials=creds)
-
-def parse_datetime(natural_datetime):
-    cal = pdt.Calendar()
-    time_struct, _ = cal.parse(natural_datetime)
-    dt = datetime.datetime(*time_struct[:6])
-    
-    # Default time if none is provided
-    if time_struct.tm_hour == 0 and time_struct.tm_min == 0 and 'at' not in natural_datetime.lower():
-        dt = dt.replace(hour=10, minute=0)
-    
-    return dt
-
-
-def create_google_task(title, due_date):
-    service = get_tasks_service()
-    task_time = parse_datetime(due_date)
-    iso_due = task_time.isoformat() + 'Z'
-
-    task = {
+# Top candidates closer than this are reported as ambiguous instead of guessed.
+AMBIGUITY_MARGIN = 0.1
+# Tasks cannot repeat natively, so a series becomes this many tasks at most.
+MAX_RECURRING_TASKS = int(os.getenv("MAX_RECURRING_TASKS", "52"))
+
+# user_id -> (TaskIndex, mirror generation it was built from)
+_task_indexes = {}
+
+def get_tasks_service(user=None):
+    return get_service('tasks', 'v1', SCOPES, get_user_context(user).user_id)
+
+def iter_tasks(tasklist='@default', fields=TASK_LIST_FIELDS, user=None, **params):
+    params.setdefault('maxResults', 100)
+    return iter_items(get_tasks_service(user).tasks(), fields, tasklist=tasklist, **params)
+
+def refresh_task_mirror(user=None):
+    context = get_user_context(user)
+    return get_mirror(context.user_id).sync_all_tasks(get_tasks_service(context))
+
+def get_default_tasklist_id(user=None):
+    context = get_user_context(user)
+    return get_mirror(context.user_id).default_tasklist_id(get_tasks_service(context))
+
+def _resolve_tasklist(tasklist, user=None):
+    return get_default_tasklist_id(user) if tasklist == '@default' else tasklist
+
+def get_task_index(user=None):
+    context = get_user_context(user)
+    mirror = get_mirror(context.user_id)
+    changed, removed = refresh_task_mirror(context)
+    generation = mirror.generations.get('tasks')
+    index, index_generation = _task_indexes.get(context.user_id, (None, None))
+    if index is None or generation != index_generation:
+        index = TaskIndex()
+        index.apply(mirror.tasks(include_completed=True))
+        _task_indexes[context.user_id] = (index, generation)
+    else:
+        index.apply(changed, removed)
+    return index
+
+def build_task_body(title, due_date, user=None):
+    return {
         'title': title,
-        'due': iso_due,
+        'due': to_task_due(resolve_datetime(due_date, user_id=get_user_context(user).user_id)),
         'status': 'needsAction'
     }
 
-    result = service.tasks().insert(tasklist='@default', body=task).execute()
+def build_reminder_details(title, due_date, user=None):
+    return {
+        'purpose': f"Reminder: {title}",
+        'description': f"Reminder to complete: {title}",
+        'date_time': due_date,
+        'attendees': [get_user_context(user).email or ''],
+        'platform': "Google Calendar"
+    }
+
+def insert_task_request(service, task):
+    return service.tasks().insert(tasklist='@default', body=task)
+
+def patch_task_request(service, task_id, new_title=None, new_due_date=None, tasklist='@default', user=None):
+    changes = {}
+    if new_title:
+        changes['title'] = new_title
+    if new_due_date:
+        changes['due'] = to_task_due(resolve_datetime(new_due_date, user_id=get_user_context(user).user_id))
+    return task_changes_request(service, task_id, changes, tasklist)
+
+def task_changes_request(service, task_id, changes, tasklist='@default'):
+    return service.tasks().patch(tasklist=tasklist, task=task_id, body=changes)
+
+def delete_task_request(service, task_id, tasklist='@default'):
+    return service.tasks().delete(tasklist=tasklist, task=task_id)
+
+def create_google_task(title, due_date, add_reminder=True, user=None):
+    context = get_user_context(user)
+    service = get_tasks_service(context)
+    task = build_task_body(title, due_date, context)
+
+    # Tasks has no client-chosen IDs, so inserts are only retried when rejected outright.
+    result = execute(insert_task_request(service, task), idempotent=False)
+    get_mirror(context.user_id).upsert_tasks([result], get_default_tasklist_id(context))
 
     # ✅ Also schedule on calendar as a reminder
-    add_task_reminder(title, due_date)
+    if add_reminder:
+        add_task_reminder(title, due_date, context)
 
     return result.get('id')
 
-def add_task_reminder(title, due_date):
+def add_task_reminder(title, due_date, user=None):
     from calendar_utils import create_event
-    details = {
-        'purpose': f"Reminder: {title}",
-        'description': f"Reminder to complete: {title}",
-        'date_time': due_date,
-        'attendees': [DEFAULT_ATTENDEE],
-        'platform': "Google Calendar"
-    }
-    return create_event(details, include_meet=False)
+    return create_event(build_reminder_details(title, due_date, user), include_meet=False, user=user)
+
+def enqueue_task(title, due_date, add_reminder=True, user=None):
+    # Returns the job key. The task and its reminder are created in the
+    # background; a reminder that cannot be made leaves the task in place
+    # and its error in the job's state.
+    context = get_user_context(user)
+    task = build_task_body(title, due_date, context)
+    payload = {'task': task}
+    if add_reminder:
+        reminder = build_reminder_details(title, due_date, context)
+        # Resolved now, so a retry tomorrow still means the same "friday".
+        reminder['date_time'] = resolve_datetime(due_date, user_id=context.user_id).isoformat()
+        reminder['event_id'] = uuid.uuid4().hex
+        payload['reminder'] = reminder
+    key = f"add_task:{context.user_id}:{title.strip().lower()}:{task['due']}"
+    return get_job_queue().enqueue('task_utils:add_task', payload, key=key, user_id=context.user_id)
+
+def _insert_task_job(job):
+    context = get_user_context(job.user_id)
+    task = job.payload['task']
+    if job.attempts > 1:
+        # An earlier attempt may have landed before failing; Tasks has no client-chosen IDs.
+        refresh_task_mirror(context)
+        for existing in get_mirror(context.user_id).tasks():
+            if existing.get('title') == task['title'] and to_utc_string(existing.get('due')) == to_utc_string(task['due']):
+                return existing['id']
+    result = execute(insert_task_request(get_tasks_service(context), task), idempotent=False)
+    get_mirror(context.user_id).upsert_tasks([result], get_default_tasklist_id(context))
+    return result.get('id')
+
+def _insert_reminder_job(job):
+    from calendar_utils import create_event
+    if 'reminder' not in job.payload:
+        return None
+    # The payload carries the event ID, so a retried insert cannot duplicate it.
+    return create_event(job.payload['reminder'], include_meet=False, user=job.user_id)
 
-def get_upcoming_tasks():
-    service = get_tasks_service()
-    now = datetime.datetime.utcnow().isoformat() + 'Z'
+WORKFLOWS = {
+    'add_task': [
+        Step('task', _insert_task_job),
+        Step('reminder', _insert_reminder_job, optional=True)
+    ]
+}
 
-    results = service.tasks().list(
-        tasklist='@default',
-        showCompleted=False,
-        maxResults=10,
-        dueMin=now
-    ).execute()
+def _upcoming_tasks(context, limit):
+    mirror = get_mirror(context.user_id)
+    if mirror.has_synced("tasks:"):
+        refresh_task_mirror(context)
+        return mirror.tasks(due_min=utc_now_string(), limit=limit)
+    # Not mirrored yet: page through only the open tasks due from now on.
+    now = utc_now_string()
+    tasklists = iter_items(get_tasks_service(context).tasklists(), TASKLIST_LIST_FIELDS, maxResults=100)
+    tasks = [
+        task
+        for tasklist in tasklists
+        for task in iter_tasks(tasklist['id'], user=context, dueMin=now, showCompleted=False)
+        if task.get('status') != 'completed' and task.get('due') and to_utc_string(task['due']) >= now
+    ]
+    return sorted(tasks, key=lambda t: t['due'])[:limit]
 
-    tasks = results.get('items', [])
-    tasks.sort(key=lambda t: t.get('due', '9999-12-31'))
+def get_upcoming_tasks(limit=10, user=None):
+    context = get_user_context(user)
+    tasks = _upcoming_tasks(context, limit)
     return [(t['title'], t.get('due', 'No Due Date')) for t in tasks]
 
-def delete_task(task_id):
-    service = get_tasks_service()
-    service.tasks().delete(tasklist='@default', task=task_id).execute()
+def delete_task(task_id, tasklist='@default', user=None):
+    context = get_user_context(user)
+    service = get_tasks_service(context)
+    execute(delete_task_request(service, task_id, tasklist))
+    get_mirror(context.user_id).remove_tasks([task_id], _resolve_tasklist(tasklist, context))
     return f"Task {task_id} deleted."
 
-def update_task(task_id, new_title=None, new_due_date=None):
-    service = get_tasks_service()
-    task = service.tasks().get(tasklist='@default', task=task_id).execute()
+def update_task(task_id, new_title=None, new_due_date=None, tasklist='@default', user=None):
+    context = get_user_context(user)
+    service = get_tasks_service(context)
+    updated_task = execute(patch_task_request(service, task_id, new_title, new_due_date, tasklist, context))
+    get_mirror(context.user_id).upsert_tasks([updated_task], _resolve_tasklist(tasklist, context))
+    return updated_task
 
-    if new_title:
-        task['title'] = new_title
-    if new_due_date:
-        task['due'] = parse_datetime(new_due_date).isoformat() + 'Z'
+def find_task_candidates(title_query, include_completed=False, limit=5, user=None):
+    if not title_query:
+        return []
+    return get_task_index(user).search(title_query, include_completed=include_completed, limit=limit)
 
-    updated_task = service.tasks().update(tasklist='@default', task=task_id, body=task).execute()
-    return updated_task
+def is_ambiguous(candidates):
+    return len(candidates) > 1 and candidates[0][0] - candidates[1][0] < AMBIGUITY_MARGIN
 
-def find_task_id_by_title(title_query):
-    service = get_tasks_service()
-    results = service.tasks().list(tasklist='@default').execute()
-    tasks = results.get('items', [])
+def find_task_by_title(title_query, include_completed=True, user=None):
+    candidates = find_task_candidates(title_query, include_completed=include_completed, user=user)
+    return candidates[0][1] if candidates else None
 
-    for task in tasks:
-        if title_query.lower() in task.get('title', '').lower():
-            return task['id']
-    return None
+def find_task_id_by_title(title_query, user=None):
+    task = find_task_by_title(title_query, user=user)
+    return task['id'] if task else None
+
+def complete_task(task_id, tasklist='@default', user=None):
+    context = get_user_context(user)
+    service = get_tasks_service(context)
+    updated = execute(task_changes_request(service, task_id, {'status': 'completed'}, tasklist))
+    get_mirror(context.user_id).upsert_tasks([updated], _resolve_tasklist(tasklist, context))
+    return updated
 
-def mark_task_complete_by_title(title_query):
-    service = get_tasks_service()
-    tasks = service.tasks().list(tasklist='@default').execute().get('items', [])
+def create_recurring_tasks(title, due_date, recurrence, add_reminder=True, limit=MAX_RECURRING_TASKS, user=None):
+    # One task per occurrence, inserted in batches, plus a single recurring
+    # calendar reminder instead of one reminder event per task.
+    from batch_utils import BatchPipeline
+
+    context = get_user_context(user)
+    rules = to_rules(recurrence, context.user_id)
+    start = first_occurrence(rules, resolve_datetime(strip_recurrence(due_date) or 'today', user_id=context.user_id))
+    pipeline = BatchPipeline(user=context)
+    for due in occurrences(rules, start, limit=limit):
+        task = {'title': title, 'due': to_task_due(due), 'status': 'needsAction'}
+        pipeline.add('tasks', lambda service, task=task: insert_task_request(service, task))
+    results = pipeline.execute()
+
+    created = [result.response for result in results.values() if result.ok]
+    get_mirror(context.user_id).upsert_tasks(created, get_default_tasklist_id(context))
+    reminder_link = None
+    if add_reminder and created:
+        from calendar_utils import create_event
+        details = {**build_reminder_details(title, due_date, context), 'recurrence': rules}
+        reminder_link = create_event(details, include_meet=False, user=context)
+    return {
+        'task_ids': [task['id'] for task in created],
+        'failed': len(results) - len(created),
+        'recurrence': rules,
+        'reminder_link': reminder_link
+    }
+
+def _due_date(task):
+    return datetime.date.fromisoformat(task['due'][:10])
+
+def select_tasks(title=None, due_from=None, due_to=None, weekday=None, user=None):
+    # Open tasks matching every given filter, from the mirror. Dates may be
+    # phrases; due dates are whole days, so both ends are inclusive.
+    context = get_user_context(user)
+    refresh_task_mirror(context)
+    due_min = to_task_due(resolve_datetime(due_from, user_id=context.user_id)) if due_from else None
+    due_max = to_task_due(resolve_datetime(due_to, user_id=context.user_id)) if due_to else None
+    day = weekday_index(weekday) if weekday else None
+    title = (title or '').lower()
+    selected = []
+    for task in get_mirror(context.user_id).tasks(due_min=due_min, due_max=due_max):
+        if title and title not in task.get('title', '').lower():
+            continue
+        if day is not None and (not task.get('due') or _due_date(task).weekday() != day):
+            continue
+        selected.append(task)
+    return selected
+
+def apply_to_tasks(operation, filters=None, to_weekday=None, shift_days=0, preview=False, user=None):
+    # 'reschedule' and 'extend' move due dates (to a weekday or by shift_days);
+    # 'cancel' deletes. Runs as server-side batches; preview only reports.
+    from batch_utils import BatchPipeline
+
+    if operation not in ('reschedule', 'cancel', 'extend'):
+        raise ValueError(f"Unsupported bulk operation: '{operation}'")
+    target = weekday_index(to_weekday) if to_weekday else None
+    if operation != 'cancel' and target is None and not shift_days:
+        raise ValueError("Say where to move the tasks: a weekday or a number of days.")
+
+    context = get_user_context(user)
+    tasks = select_tasks(user=context, **(filters or {}))
+    changes = {}
+    if operation != 'cancel':
+        for task in tasks:
+            if not task.get('due'):
+                continue
+            due = _due_date(task)
+            days = days_until_weekday(due.weekday(), target) if target is not None else shift_days
+            changes[task['id']] = {'due': f"{(due + datetime.timedelta(days=days)).isoformat()}T00:00:00.000Z"}
+        tasks = [task for task in tasks if task['id'] in changes]
+
+    summary = {
+        'operation': operation,
+        'matched': len(tasks),
+        'tasks': [
+            {'id': t['id'], 'title': t.get('title', ''), 'due': t.get('due'), 'new_due': changes.get(t['id'], {}).get('due')}
+            for t in tasks
+        ]
+    }
+    if preview or not tasks:
+        summary.update(applied=0, failed={})
+        return summary
+
+    pipeline = BatchPipeline(user=context)
+    for task in tasks:
+        tasklist = task.get('tasklist', '@default')
+        if operation == 'cancel':
+            pipeline.delete_task(task['id'], tasklist=tasklist, key=task['id'])
+        else:
+            pipeline.patch_task(task['id'], changes[task['id']], tasklist=tasklist, key=task['id'])
+    results = pipeline.execute()
 
+    mirror = get_mirror(context.user_id)
+    by_tasklist = {}
     for task in tasks:
-        if title_query.lower() in task.get('title', '').lower():
-            task['status'] = 'completed'
-            updated = service.tasks().update(tasklist='@default', task=task['id'], body=task).execute()
-            return updated
-    return None
\ No newline at end of file
+        if results[task['id']].ok:
+            by_tasklist.setdefault(task.get('tasklist', '@default'), []).append(task['id'])
+    for tasklist, task_ids in by_tasklist.items():
+        if operation == 'cancel':
+            mirror.remove_tasks(task_ids, tasklist)
+        else:
+            mirror.upsert_tasks([results[task_id].response for task_id in task_ids], tasklist)
+    failed = {key: str(result.error) for key, result in results.items() if not result.ok}
+    summary.update(applied=len(tasks) - len(failed), failed=failed)
+    return summary
@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='scheduler-tests-')
+
+# Module-level settings are read at import time, so point every store at a
+# scratch directory before any app module is imported.
+os.environ.update({
+    'MIRROR_DB': os.path.join(WORKDIR, 'mirror.db'),
+    'LLM_CACHE_DB': os.path.join(WORKDIR, 'llm_cache.db'),
+    'JOB_QUEUE_DB': os.path.join(WORKDIR, 'jobs.db'),
+    'CREDENTIAL_DIR': os.path.join(WORKDIR, 'credentials'),
+    'GOOGLE_API_KEY': os.environ.get('GOOGLE_API_KEY', 'offline'),
+    'EMAIL_ADDRESS': 'scheduler@example.com',
+    'JOB_BACKOFF': '0',
+})
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def backend():
+    # A fresh in-memory Google backend, with empty mirrors and no cached clients.
+    import agenda
+    import calendar_utils
+    import google_clients
+    import mirror
+    import task_utils
+    from fakes import FakeGoogleBackend
+
+    fake = FakeGoogleBackend()
+    google_clients.install_transport(fake.transport)
+    google_clients.reset_services()
+    mirror._mirrors.clear()
+    agenda._agendas.clear()
+    calendar_utils._event_indexes.clear()
+    task_utils._task_indexes.clear()
+    for name in os.listdir(WORKDIR):
+        if name.startswith('mirror'):
+            os.remove(os.path.join(WORKDIR, name))
+    return fake
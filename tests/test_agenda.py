@@ -0,0 +1,20 @@
+import agenda
+from agenda import get_agenda
+
+
+def test_channel_renewal_is_scheduled_and_replaces_the_channel(backend):
+    store = get_agenda()
+    first = store.watch('https://127.0.0.1:9/notifications/calendar')
+    timer = store._renewal
+    assert timer.interval > agenda.CHANNEL_TTL_SECONDS - agenda.CHANNEL_RENEW_SECONDS - 60
+
+    store._renew_channel(first['id'])
+    second = store.channel
+    assert second['id'] != first['id']
+    assert agenda._channels.get(second['id']) is store and first['id'] not in agenda._channels
+    assert timer.finished.is_set() and store._renewal is not timer
+
+    # A renewal scheduled for a channel that was replaced does nothing.
+    store._renew_channel(first['id'])
+    assert store.channel is second
+    store._renewal.cancel()
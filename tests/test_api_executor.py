@@ -0,0 +1,23 @@
+import pytest
+
+import api_executor
+from user_context import DEFAULT_USER_ID
+
+
+def test_unknown_user_gets_no_bucket():
+    with pytest.raises(ValueError):
+        api_executor._limits('calendar', 'nobody@example.com')
+    assert ('calendar', 'nobody@example.com') not in api_executor._buckets
+
+
+def test_default_user_gets_a_bucket():
+    api_executor._limits('calendar', DEFAULT_USER_ID)
+    assert ('calendar', DEFAULT_USER_ID) in api_executor._buckets
+
+
+def test_registered_user_gets_a_bucket():
+    from user_context import register_user
+
+    register_user('carol@example.com', email='carol@example.com')
+    api_executor._limits('tasks', 'carol@example.com')
+    assert ('tasks', 'carol@example.com') in api_executor._buckets
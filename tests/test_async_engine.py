@@ -0,0 +1,21 @@
+import async_engine
+from async_engine import parse_command, services_for
+
+
+def test_services_follow_the_intent():
+    assert services_for({'meeting_details': {'purpose': "Sync"}}) == ['calendar']
+    assert services_for({'task_details': {'action': 'delete', 'title': "Report"}}) == ['tasks']
+    assert services_for({'task_details': {'action': 'add', 'title': "Report"}}) == ['calendar', 'tasks']
+    assert services_for({'action': 'bulk_update', 'bulk_details': {'target': 'tasks'}}) == ['tasks']
+    assert services_for({'plan': [{'action': 'show'}, {'task_details': {'action': 'update'}}]}) == ['calendar', 'tasks']
+
+
+def test_parse_warms_only_the_clients_the_command_needs(monkeypatch):
+    warmed = []
+    monkeypatch.setattr(async_engine, 'WARMERS', {
+        'calendar': lambda user: warmed.append('calendar'),
+        'tasks': lambda user: warmed.append('tasks'),
+    })
+    parsed = parse_command("mark Report as done")
+    assert parsed['task_details']['action'] == 'update'
+    assert warmed == ['tasks']
@@ -0,0 +1,69 @@
+from batch_utils import create_batched
+from mirror import get_mirror
+from user_context import DEFAULT_USER_ID
+
+
+def test_create_batched_meeting_and_task(backend):
+    outcomes = create_batched({
+        'meeting': {'meeting_details': {
+            'purpose': 'Design review', 'description': '', 'date_time': 'tomorrow at 3pm',
+            'attendees': ['ana@example.com'], 'platform': 'Google Meet'
+        }},
+        'task': {'task_details': {'title': 'Send notes', 'due_date': 'friday'}},
+    })
+    meeting, task = outcomes['meeting'], outcomes['task']
+    assert meeting['intent'] == 'create_meeting' and meeting['status'] == 'ok'
+    assert task['intent'] == 'add_task' and task['status'] == 'ok' and task['reminder_link']
+    assert backend.calls['batch'] == 2
+
+    mirror = get_mirror(DEFAULT_USER_ID)
+    assert mirror.get_event(meeting['event_id']) is not None
+    assert [t['id'] for t in mirror.tasks()] == [task['task_id']]
+
+
+def test_create_batched_reports_unbuildable_commands(backend):
+    outcomes = create_batched({'bad': {'meeting_details': {'purpose': 'x', 'date_time': 'tomorrow', 'attendees': []}}})
+    assert outcomes['bad']['status'] == 'error'
+    assert backend.http_requests == 0
+
+
+def test_chunk_builds_each_resource_once(backend, monkeypatch):
+    import batch_utils
+    from batch_utils import BatchPipeline
+
+    built = []
+    get_tasks_service = batch_utils.SERVICES['tasks']
+
+    class CountingService:
+        def __init__(self, service):
+            self._service = service
+
+        def tasks(self):
+            built.append('tasks')
+            return self._service.tasks()
+
+        def __getattr__(self, name):
+            return getattr(self._service, name)
+
+    monkeypatch.setitem(batch_utils.SERVICES, 'tasks', lambda user: CountingService(get_tasks_service(user)))
+    pipeline = BatchPipeline()
+    for i in range(3):
+        pipeline.create_google_task(f"Task {i}", 'friday', add_reminder=False)
+    results = pipeline.execute()
+    assert all(result.ok for result in results.values()) and len(results) == 3
+    assert built == ['tasks']
+
+
+def test_create_batched_resolves_each_phrase_once(backend, monkeypatch):
+    import datetime_utils
+
+    parsed = []
+    parse = datetime_utils._parse
+    monkeypatch.setattr(datetime_utils, '_parse', lambda phrase, *args: parsed.append(phrase) or parse(phrase, *args))
+    datetime_utils._cache.clear()
+    outcomes = create_batched({
+        i: {'task_details': {'title': f"Expense report {i}", 'due_date': due}}
+        for i, due in enumerate(['next friday', 'next friday', 'not a date'])
+    })
+    assert [outcomes[i]['status'] for i in range(3)] == ['ok', 'ok', 'error']
+    assert parsed.count('next friday') == 1
@@ -0,0 +1,33 @@
+import io
+import threading
+
+import bulk
+from bulk import apply_window, read_commands
+
+
+def test_non_string_prompt_is_a_line_error():
+    lines = io.StringIO('{"prompt": 5, "id": "a"}\n{"prompt": "add task Report by Monday"}\n')
+    commands = list(read_commands(lines))
+    assert commands[0] == (1, None, {'prompt': 5, 'id': 'a', '_error': "'prompt' must be a string"})
+    assert commands[1][:2] == (2, "add task Report by Monday")
+
+    statuses = list(apply_window(commands[:1], {}))
+    assert statuses == [{'line': 1, 'prompt': None, 'id': 'a', 'status': 'invalid', 'error': "'prompt' must be a string"}]
+
+
+def test_statuses_stream_as_commands_finish(monkeypatch):
+    release = threading.Event()
+
+    def execute(parsed, prompt, user=None):
+        if prompt == 'slow':
+            assert release.wait(5)
+        return {'status': 'ok'}
+
+    monkeypatch.setattr(bulk, 'execute_command', execute)
+    monkeypatch.setattr(bulk, 'is_batchable', lambda parsed, prompt: False)
+    window = [(1, 'slow', {}), (2, 'fast', {})]
+    statuses = apply_window(window, {1: {'action': 'show'}, 2: {'action': 'show'}})
+    # The fast line is reported while the slow one is still running.
+    assert next(statuses)['line'] == 2
+    release.set()
+    assert next(statuses)['line'] == 1
@@ -0,0 +1,50 @@
+import datetime
+
+import pytest
+
+from calendar_utils import AmbiguousEventError, create_event, is_ambiguous, reschedule_event_by_email_and_purpose
+
+
+def _meeting(purpose, when):
+    return {
+        'purpose': purpose, 'description': '', 'date_time': when,
+        'attendees': ['ana@example.com'], 'platform': 'Google Meet'
+    }
+
+
+def test_reschedule_patches_the_event_in_place(backend):
+    create_event(_meeting("Design review", "tomorrow at 3pm"))
+    backend.reset_counters()
+    reschedule_event_by_email_and_purpose('ana@example.com', "design review", "tomorrow at 5pm")
+    assert backend.calls['events.patch'] == 1
+    assert backend.calls['events.insert'] == 0 and backend.calls['events.delete'] == 0
+
+
+def test_ambiguous_match_is_reported_not_guessed(backend):
+    create_event(_meeting("Design review", "tomorrow at 3pm"))
+    create_event(_meeting("Design review", "tomorrow at 4pm"))
+    backend.reset_counters()
+    with pytest.raises(AmbiguousEventError) as e:
+        reschedule_event_by_email_and_purpose('ana@example.com', "design review", "tomorrow at 5pm")
+    assert len(e.value.candidates) == 2
+    assert backend.calls['events.patch'] == 0
+
+
+def test_instances_of_one_series_are_not_ambiguous():
+    first = {'id': 'a_1', 'recurringEventId': 'a'}
+    second = {'id': 'a_2', 'recurringEventId': 'a'}
+    assert not is_ambiguous([(1.0, first), (1.0, second)])
+    assert is_ambiguous([(1.0, first), (0.95, {'id': 'b'})])
+    assert not is_ambiguous([(1.0, first), (0.5, {'id': 'b'})])
+
+
+def test_reminders_are_read_lazily_until_the_mirror_is_synced(backend):
+    from calendar_utils import get_task_reminder_events, refresh_event_mirror
+    from mirror import get_mirror
+
+    backend.seed_events(3, datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1))
+    create_event(_meeting("Reminder: Send notes", "tomorrow at 3pm"))
+    cold = get_task_reminder_events()
+    assert not get_mirror().has_synced("events:")
+    refresh_event_mirror()
+    assert get_task_reminder_events() == cold == [("Send notes", cold[0][1])]
@@ -0,0 +1,49 @@
+import smtplib
+from email.mime.text import MIMEText
+
+import pytest
+
+import email_utils
+from email_utils import MailQueue, SMTPConnectionPool
+from fakes import SMTPSink
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    monkeypatch.setattr(email_utils, 'EMAIL_STARTTLS', False)
+    sink = SMTPSink().start()
+    yield sink
+    sink.stop()
+
+
+def _message(recipient):
+    msg = MIMEText("hello")
+    msg['From'] = 'scheduler@example.com'
+    msg['To'] = recipient
+    return msg
+
+
+def test_connection_is_reused_after_a_refused_recipient(sink):
+    sink.refused.add('NOBODY@EXAMPLE.COM')
+    pool = SMTPConnectionPool(sink.host, sink.port, 'scheduler@example.com', None, size=1)
+    mail = MailQueue(pool, workers=1, backoff=0)
+    try:
+        refused = mail.enqueue(_message('nobody@example.com'))
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            refused.result(10)
+        assert mail.enqueue(_message('ana@example.com')).result(10) == 'ana@example.com'
+    finally:
+        mail.shutdown(10)
+    assert sink.connections == 1 and sink.messages == 1
+
+
+def test_broken_connection_is_replaced(sink):
+    pool = SMTPConnectionPool(sink.host, sink.port, 'scheduler@example.com', None, size=1)
+    connection = pool.acquire()
+    pool.release(connection, broken=True)
+    replacement = pool.acquire()
+    assert replacement is not connection and sink.connections == 2
+    pool.release(replacement)
+    assert pool.acquire() is replacement and sink.connections == 2
+    pool.release(replacement)
+    pool.close_all()
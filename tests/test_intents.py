@@ -0,0 +1,43 @@
+import pytest
+
+from async_engine import plan_steps
+from intents import PLAN_MESSAGE, IntentError, parse_plan
+
+MEETING = {
+    'intent': 'create_meeting', 'text': "sync with ana@example.com friday 3pm",
+    'meeting': {'purpose': "Sync", 'attendees': ['ana@example.com'], 'date_time': "friday 3pm"}
+}
+TASK = {'intent': 'add_task', 'text': "prep slides by thursday", 'task': {'title': "Prep slides", 'due_date': "thursday"}}
+
+
+def test_several_commands_become_a_plan_in_order():
+    plan = parse_plan({'commands': [MEETING, {'intent': 'unknown'}, TASK, {'intent': 'show_tasks'}]})
+    assert plan['confirmation_message'] == PLAN_MESSAGE
+    steps = plan['plan']
+    assert [step['text'] for step in steps[:2]] == [MEETING['text'], TASK['text']]
+    assert steps[0]['meeting_details']['purpose'] == "Sync"
+    assert steps[1]['task_details'] == {'title': "Prep slides", 'action': 'add', 'updated_fields': {}, 'due_date': "thursday"}
+    assert steps[2]['action'] == 'show' and 'text' not in steps[2]
+    assert plan_steps(plan) == steps
+
+
+def test_one_command_is_not_a_plan():
+    command = parse_plan({'commands': [TASK, {'intent': 'unknown'}]})
+    assert 'plan' not in command and 'text' not in command
+    assert command['task_details']['title'] == "Prep slides"
+    # A bare command (the legacy shape) is read the same way.
+    assert parse_plan(TASK) == command
+
+
+def test_nothing_understood_is_empty():
+    assert parse_plan({'commands': []}) == {}
+    assert parse_plan({'commands': [{'intent': 'unknown'}]}) == {}
+
+
+def test_malformed_answers_are_rejected():
+    with pytest.raises(IntentError):
+        parse_plan({'commands': MEETING})
+    with pytest.raises(IntentError):
+        parse_plan({'commands': [MEETING, {'intent': 'launch_rocket'}]})
+    with pytest.raises(IntentError):
+        parse_plan({'commands': [{'intent': 'add_task', 'task': ["Prep"]}]})
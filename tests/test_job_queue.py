@@ -0,0 +1,65 @@
+import os
+
+from conftest import WORKDIR
+from job_queue import JobQueue, Step
+
+calls = []
+
+
+def _record(name):
+    def run(job):
+        calls.append(name)
+        return name
+    return run
+
+
+def _unavailable(name):
+    def run(job):
+        calls.append(name)
+        raise ConnectionError("upstream unavailable")
+    return run
+
+
+WORKFLOWS = {
+    'book': [
+        Step('hold', _record('hold'), compensate=_record('undo hold')),
+        Step('notify', _record('notify'), optional=True),
+        Step('invite', _record('invite'), compensate=_record('undo invite')),
+        Step('charge', _unavailable('charge'), retryable=lambda error: isinstance(error, ConnectionError)),
+    ],
+    'optional': [
+        Step('hold', _record('hold'), compensate=_record('undo hold')),
+        Step('notify', _unavailable('notify'), optional=True, retryable=lambda error: False),
+    ],
+}
+
+
+def _queue(name):
+    path = os.path.join(WORKDIR, f"{name}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    return JobQueue(path=path, workers=1, max_attempts=3, backoff=0)
+
+
+def test_final_failure_undoes_completed_steps_newest_first():
+    calls.clear()
+    queue = _queue('jobs-compensate')
+    record = queue.wait(queue.enqueue(f"{__name__}:book", {}), 10)
+    queue.shutdown(0)
+
+    assert record['status'] == 'failed' and record['attempts'] == 3
+    # Finished steps ran once; retries only repeated the failing one.
+    assert calls == ['hold', 'notify', 'invite', 'charge', 'charge', 'charge', 'undo invite', 'undo hold']
+    assert record['error'] == "charge: upstream unavailable"
+    assert set(record['state']) == {'hold', 'notify', 'invite'}
+
+
+def test_optional_step_failure_keeps_the_job():
+    calls.clear()
+    queue = _queue('jobs-optional')
+    record = queue.wait(queue.enqueue(f"{__name__}:optional", {}), 10)
+    queue.shutdown(0)
+
+    assert record['status'] == 'done' and record['attempts'] == 1
+    assert record['state'] == {'hold': 'hold', 'notify': {'error': "upstream unavailable"}}
+    assert calls == ['hold', 'notify']
@@ -0,0 +1,41 @@
+import pytest
+
+from json_stream import IncrementalJSONParser, first_json_value, iter_json_values
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_values_survive_any_chunking():
+    text = '```json\n{"title": "a } b", "q": "say \\"hi\\" {"}\n```\nthen [1, {"x": [2]}]'
+    for size in range(1, len(text) + 1):
+        assert list(iter_json_values(_chunks(text, size))) == [{'title': "a } b", 'q': 'say "hi" {'}, [1, {'x': [2]}]]
+
+
+def test_array_elements_come_out_as_they_close():
+    parser = IncrementalJSONParser(unwrap_array=True)
+    assert parser.feed('[{"a": 1}, {"b"') == [{'a': 1}]
+    assert parser.feed(': 2}') == [{'b': 2}]
+    assert parser.feed(', {"c": 3}]') == [{'c': 3}]
+    assert parser.done
+    assert parser.feed('{"ignored": true}') == []
+    parser.close()
+
+
+def test_truncated_output_is_an_error():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"title": "Report", "due": "fri') == []
+    with pytest.raises(ValueError):
+        parser.close()
+
+    parser = IncrementalJSONParser(unwrap_array=True)
+    assert parser.feed('[{"a": 1},') == [{'a': 1}]
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_stray_brackets_in_prose_are_skipped():
+    assert first_json_value('Sure {here you go}: {"ok": true}') == {'ok': True}
+    with pytest.raises(ValueError):
+        first_json_value("no json here")
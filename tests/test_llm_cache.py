@@ -0,0 +1,20 @@
+import os
+
+import prompt_parser
+from conftest import WORKDIR
+from llm_cache import PromptCache
+
+
+def test_answers_are_kept_apart_by_version():
+    cache = PromptCache(os.path.join(WORKDIR, 'versions.db'))
+    cache.set("Sync with Ana friday", {'shape': 'structured'}, 'structured:a')
+    assert cache.get("sync with ana friday.", 'structured:a') == {'shape': 'structured'}
+    assert cache.get("sync with ana friday", 'legacy:b') is None
+    assert cache.get("sync with ana friday", 'structured:c') is None
+
+
+def test_cache_version_follows_extractor_mode(monkeypatch):
+    structured = prompt_parser.cache_version()
+    monkeypatch.setattr(prompt_parser, 'EXTRACTOR_MODE', 'legacy')
+    legacy = prompt_parser.cache_version()
+    assert structured != legacy and legacy.startswith('legacy:')
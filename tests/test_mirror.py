@@ -0,0 +1,32 @@
+import datetime
+import os
+
+import pytz
+
+from conftest import WORKDIR
+from mirror import LocalMirror
+
+KOLKATA = pytz.timezone('Asia/Kolkata')
+ALL_DAY = {'id': 'offsite', 'summary': 'Offsite', 'start': {'date': '2026-03-10'}, 'end': {'date': '2026-03-11'}}
+
+
+def _day_bounds(day):
+    start = KOLKATA.localize(datetime.datetime.combine(day, datetime.time.min))
+    return start.isoformat(), (start + datetime.timedelta(days=1)).isoformat()
+
+
+def _days_shown(mirror):
+    days = [datetime.date(2026, 3, 9) + datetime.timedelta(days=i) for i in range(3)]
+    return [day for day in days if mirror.events_between(*_day_bounds(day))]
+
+
+def test_all_day_event_shows_on_its_local_day_only():
+    mirror = LocalMirror(os.path.join(WORKDIR, 'all-day.db'), KOLKATA)
+    mirror.upsert_events([ALL_DAY])
+    assert _days_shown(mirror) == [datetime.date(2026, 3, 10)]
+
+
+def test_all_day_rows_are_restamped_for_a_new_timezone():
+    path = os.path.join(WORKDIR, 'all-day-utc.db')
+    LocalMirror(path).upsert_events([ALL_DAY])
+    assert _days_shown(LocalMirror(path, KOLKATA)) == [datetime.date(2026, 3, 10)]
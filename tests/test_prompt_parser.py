@@ -0,0 +1,40 @@
+from prompt_parser import fast_parse
+
+
+def _task(prompt):
+    return (fast_parse(prompt) or {}).get('task_details')
+
+
+def test_add_task_title_keeps_inner_separators():
+    task = _task("add task to work on the slides by friday")
+    assert task['title'] == 'work on the slides'
+    assert task['due_date'] == 'friday'
+
+
+def test_add_task_simple():
+    task = _task("Add task Report by Monday")
+    assert task == {'title': 'Report', 'due_date': 'monday', 'action': 'add', 'updated_fields': {}}
+
+
+def test_add_task_with_unreadable_due_date_goes_to_model():
+    assert fast_parse("add task to finish report by the slides") is None
+
+
+def test_compound_request_with_unlocal_part_goes_to_model():
+    assert fast_parse("add task pay rent by the 1st, also schedule meeting with bob@x.com tomorrow") is None
+    assert fast_parse("add task to send deck by friday and email the team about it") is None
+    assert fast_parse("add task call bank by tomorrow at 3pm. Then email the team") is None
+
+
+def test_then_after_a_sentence_starts_a_new_step():
+    plan = fast_parse("add task call bank by tomorrow at 3pm. Then show tasks")['plan']
+    assert plan[0]['task_details']['due_date'] == 'tomorrow at 3pm'
+    assert plan[1]['action'] == 'show'
+
+
+def test_date_phrase_must_be_wholly_a_date():
+    from datetime_utils import is_date_phrase
+
+    assert is_date_phrase("next monday 5pm")
+    assert is_date_phrase("on friday at 5pm")
+    assert not is_date_phrase("friday and email the team about it")
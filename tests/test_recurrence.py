@@ -0,0 +1,26 @@
+from recurrence import parse_recurrence, strip_recurrence
+
+
+def test_weekly_report_is_not_a_series():
+    assert parse_recurrence("add task to submit weekly report by friday") is None
+
+
+def test_monthly_review_is_not_a_series():
+    assert parse_recurrence("schedule monthly review with ana@example.com tomorrow at 3pm") is None
+
+
+def test_every_weekday_for_weeks():
+    assert parse_recurrence("standup every weekday at 9am for 4 weeks") == "RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR;COUNT=20"
+
+
+def test_each_other_week():
+    assert parse_recurrence("sync each other week") == "RRULE:FREQ=WEEKLY;INTERVAL=2"
+
+
+def test_plural_weekday_repeats_but_single_day_does_not():
+    assert parse_recurrence("gym on mondays and thursdays at 7am") == "RRULE:FREQ=WEEKLY;BYDAY=MO,TH"
+    assert parse_recurrence("gym on monday at 7am") is None
+
+
+def test_strip_keeps_the_time():
+    assert strip_recurrence("every weekday at 9am") == "at 9am"
@@ -0,0 +1,42 @@
+from search_index import TaskIndex, TokenIndex
+
+
+def test_add_and_remove_keep_postings_and_trigrams_in_step():
+    index = TokenIndex()
+    index.add('a', "Weekly sync")
+    index.add('b', "Sync with design")
+    assert set(index.score("sync")) == {'a', 'b'}
+
+    # Re-adding replaces the old text rather than merging with it.
+    index.add('a', "Budget review")
+    assert set(index.score("weekly")) == set()
+    assert set(index.score("budget")) == {'a'}
+
+    index.remove('b')
+    index.remove('b')
+    assert set(index.score("sync")) == set()
+    assert len(index) == 1
+
+    index.remove('a')
+    assert len(index) == 0
+    assert index._postings == {} and index._trigrams == {} and index._trigram_counts == {}
+
+
+def test_close_spellings_and_prefixes_still_match():
+    index = TokenIndex()
+    index.add('a', "Quarterly report")
+    scores = index.score("quartely reprt")
+    assert scores['a'] > 0.5
+    assert index.score("quarter")['a'] > 0.5
+
+
+def test_task_index_prefers_whole_title_matches():
+    index = TaskIndex()
+    index.apply(changed=[
+        {'id': '1', 'title': "Report", 'due': '2030-01-02T00:00:00.000Z'},
+        {'id': '2', 'title': "Report draft", 'due': '2030-01-01T00:00:00.000Z'},
+        {'id': '3', 'title': "Report", 'status': 'completed'},
+    ])
+    assert [task['id'] for _, task in index.search("report")] == ['1', '2']
+    index.apply(removed=['1'])
+    assert [task['id'] for _, task in index.search("report")] == ['2']
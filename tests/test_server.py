@@ -0,0 +1,98 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def url(monkeypatch):
+    monkeypatch.setattr(server, 'API_TOKENS', server.parse_api_tokens("alice@example.com:secret-a"))
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), server.SchedulerRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _post(url, payload, headers=None):
+    request = urllib.request.Request(
+        f"{url}/parse", data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json', **(headers or {})}
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_request_without_token_is_rejected(url):
+    assert _post(url, {'prompt': "add task Report by Monday", 'user': 'alice@example.com'}) == 403
+
+
+def test_token_cannot_act_as_another_user(url):
+    headers = {'Authorization': 'Bearer secret-a', 'X-Scheduler-User': 'bob@example.com'}
+    assert _post(url, {'prompt': "add task Report by Monday"}, headers) == 403
+
+
+def test_token_acts_as_its_user(url):
+    headers = {'Authorization': 'Bearer secret-a'}
+    assert _post(url, {'prompt': "add task Report by Monday", 'user': 'alice@example.com'}, headers) == 200
+
+
+def test_parse_api_tokens():
+    assert server.parse_api_tokens(" a@example.com:t1, b:t2 ,bad") == {'t1': 'a@example.com', 't2': 'b'}
+
+
+def _get(url, path, headers=None):
+    request = urllib.request.Request(f"{url}{path}", headers=headers or {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_week_view_requires_a_token_and_covers_seven_days(url, backend):
+    from user_context import register_user
+
+    register_user('alice@example.com', 'alice@example.com')
+    assert _get(url, '/agenda/week')[0] == 403
+    status, body = _get(url, '/agenda/week?start=2030-01-07', {'Authorization': 'Bearer secret-a'})
+    assert status == 200
+    assert [day['date'] for day in body['days']] == [f"2030-01-{d:02d}" for d in range(7, 14)]
+    assert _get(url, '/agenda/week?start=soon', {'Authorization': 'Bearer secret-a'})[0] == 400
+
+
+def test_quota_and_metrics_require_a_token(url):
+    assert _get(url, '/health')[0] == 200
+    assert _get(url, '/quota')[0] == 403
+    assert _get(url, '/metrics')[0] == 403
+    assert _get(url, '/metrics', {'Authorization': 'Bearer secret-a'})[0] == 200
+
+
+def test_quota_reports_only_the_callers_buckets(url, monkeypatch):
+    from api_executor import TokenBucket, _buckets
+
+    monkeypatch.setitem(_buckets, ('calendar', 'bob@example.com'), TokenBucket(1, 1))
+    status, body = _get(url, '/quota', {'Authorization': 'Bearer secret-a'})
+    assert status == 200
+    assert all(key.endswith(':alice@example.com') for key in body)
+
+
+def test_slots_validate_their_input(url):
+    request = urllib.request.Request(
+        f"{url}/slots", data=json.dumps({'attendees': 'ana@example.com'}).encode(),
+        headers={'Content-Type': 'application/json', 'Authorization': 'Bearer secret-a'}
+    )
+    try:
+        urllib.request.urlopen(request)
+    except urllib.error.HTTPError as e:
+        assert e.code == 400
+    else:
+        pytest.fail("expected 400")
@@ -0,0 +1,23 @@
+from session import Session
+
+
+def _session():
+    session = Session()
+    session.last_task = {'id': 't1', 'title': "report", 'tasklist': '@default'}
+    session.last_event = {'id': 'e1', 'purpose': "Sync"}
+    session.last_kind = 'task'
+    return session
+
+
+def test_rename_keeps_the_title_as_typed():
+    command = _session().follow_up("Rename it to Q3 Report for ACME.")
+    assert command['task_details']['updated_fields'] == {'title': "Q3 Report for ACME"}
+
+
+def test_move_keeps_the_time_as_typed():
+    session = _session()
+    session.last_kind = 'event'
+    command = session.follow_up("Move that meeting to  Friday 3PM")
+    assert command['meeting_details']['date_time'] == "Friday 3PM"
+    command = session.follow_up("push that task to Next Monday")
+    assert command['task_details']['updated_fields'] == {'due_date': "Next Monday"}
@@ -0,0 +1,34 @@
+import datetime
+
+import pytz
+
+from calendar_utils import create_event, find_meeting_slots
+from datetime_utils import get_user_timezone
+from slot_finder import BusyTimeline, merge_intervals
+
+
+def _at(hour, minute=0):
+    return datetime.datetime(2030, 1, 7, hour, minute, tzinfo=pytz.UTC)
+
+
+def test_overlapping_busy_intervals_merge():
+    busy = [(_at(9), _at(10)), (_at(9, 30), _at(11)), (_at(11), _at(11, 30)), (_at(14), _at(15)), (_at(14, 15), _at(14, 45))]
+    assert merge_intervals(busy) == [(_at(9), _at(11, 30)), (_at(14), _at(15))]
+
+    timeline = BusyTimeline(busy)
+    assert not timeline.is_free(_at(10, 30), _at(11))
+    assert not timeline.is_free(_at(11, 15), _at(12))
+    assert timeline.is_free(_at(11, 30), _at(14))
+    slots = list(timeline.free_slots(_at(9), _at(16), datetime.timedelta(hours=1)))
+    assert slots == [(_at(11, 30), _at(12, 30)), (_at(12, 30), _at(13, 30)), (_at(15), _at(16))]
+
+
+def test_meeting_slots_skip_busy_time(backend):
+    tz = get_user_timezone()
+    monday = tz.localize(datetime.datetime(2030, 1, 7, 9))
+    create_event({
+        'purpose': "Standup", 'description': '', 'date_time': monday.isoformat(),
+        'attendees': ['ana@example.com'], 'platform': 'Google Meet'
+    })
+    slots = find_meeting_slots(['ana@example.com'], 60, earliest=monday, limit=2)
+    assert [start.hour for start, _ in slots] == [10, 11]
@@ -0,0 +1,45 @@
+import datetime
+
+from datetime_utils import resolve_datetime
+from job_queue import get_job_queue
+from task_utils import enqueue_task
+
+
+def _reminders(backend):
+    return [event for _, event in backend.events.get('primary', {}).values()]
+
+
+def test_queued_task_reminder_keeps_its_time(backend):
+    expected = resolve_datetime("friday at 5pm")
+    record = get_job_queue().wait(enqueue_task("Submit slides", "friday at 5pm"), 10)
+    assert record['status'] == 'done'
+    [event] = _reminders(backend)
+    assert datetime.datetime.fromisoformat(event['start']['dateTime']) == expected
+
+
+def test_failed_reminder_keeps_the_task(backend, monkeypatch):
+    import calendar_utils
+
+    def fail(*args, **kwargs):
+        raise ValueError("No valid attendee emails found.")
+
+    monkeypatch.setattr(calendar_utils, 'create_event', fail)
+    record = get_job_queue().wait(enqueue_task("Book venue", "saturday at 11am"), 10)
+    assert record['status'] == 'done'
+    assert record['state']['reminder'] == {'error': "No valid attendee emails found."}
+    assert any(record['state']['task'] in tasks for tasks in backend.tasks.values())
+    assert not _reminders(backend)
+
+
+def test_upcoming_tasks_page_lazily_until_the_mirror_is_synced(backend):
+    from mirror import get_mirror
+    from task_utils import get_upcoming_tasks, refresh_task_mirror
+
+    backend.seed_tasks(250, datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1))
+    cold = get_upcoming_tasks(limit=5)
+    assert not get_mirror().has_synced("tasks:")
+    assert backend.calls['tasks.list'] == 3
+
+    refresh_task_mirror()
+    warm = get_upcoming_tasks(limit=5)
+    assert [due for _, due in cold] == [due for _, due in warm]
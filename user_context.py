@@ -0,0 +1,73 @@
+# user_context.py
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from credential_store import get_credential_store
+from datetime_utils import set_user_timezone
+
+load_dotenv()
+
+DEFAULT_USER_ID = os.getenv("DEFAULT_USER_ID", "default")
+PROFILE = 'profile'
+
+_users = {}
+_registered = set()
+_users_lock = threading.Lock()
+
+
+class UserContext:
+    def __init__(self, user_id=DEFAULT_USER_ID, email=None, calendar_id='primary', timezone=None):
+        self.user_id = user_id
+        # Attendee for reminders and sender identity; the default user falls back to EMAIL_ADDRESS.
+        self.email = email
+        self.calendar_id = calendar_id
+        self.timezone = timezone
+
+    def to_dict(self):
+        return {'email': self.email, 'calendar_id': self.calendar_id, 'timezone': self.timezone}
+
+    def __repr__(self):
+        return f"UserContext({self.user_id!r}, email={self.email!r}, calendar_id={self.calendar_id!r})"
+
+
+def _remember(context):
+    if context.timezone:
+        set_user_timezone(context.user_id, context.timezone)
+    _users[context.user_id] = context
+    return context
+
+
+def register_user(user_id, email=None, calendar_id='primary', timezone=None):
+    context = UserContext(user_id, email, calendar_id, timezone)
+    get_credential_store().save(user_id, PROFILE, context.to_dict())
+    _registered.add(user_id)
+    with _users_lock:
+        return _remember(context)
+
+
+def is_registered(user_id):
+    # The default user needs no profile; anyone else must have logged in.
+    if user_id in (None, DEFAULT_USER_ID) or user_id in _registered:
+        return True
+    if get_credential_store().load(user_id, PROFILE) is None:
+        return False
+    _registered.add(user_id)
+    return True
+
+
+def get_user_context(user=None):
+    if isinstance(user, UserContext):
+        return user
+    user_id = user or DEFAULT_USER_ID
+    context = _users.get(user_id)
+    if context is None:
+        with _users_lock:
+            context = _users.get(user_id)
+            if context is None:
+                profile = get_credential_store().load(user_id, PROFILE) or {}
+                if user_id == DEFAULT_USER_ID and not profile.get('email'):
+                    profile['email'] = os.getenv("EMAIL_ADDRESS")
+                context = _remember(UserContext(user_id, **profile))
+    return context